@@ -0,0 +1,235 @@
+"""
+End-to-end benchmark of get_snowboard_assistant_response against the local fakes.
+
+Drives the assistant over the prompt corpus in fixtures/prompts.json with a
+pool of concurrent sessions and reports throughput, end-to-end and per-stage
+p50/p95/p99 latency (from the tracing spans), and allocations (tracemalloc,
+measured in a separate pass so it doesn't skew the timings). No network needed.
+
+    python benchmarks/bench_assistant.py --iterations 3 --concurrency 8
+    python benchmarks/bench_assistant.py --stream --cold --latency-scale 0 --json out.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import fakes  # noqa: E402
+
+fakes.configure_environment()
+
+
+def percentile(samples, q):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q / 100.0 * len(ordered)))]
+
+
+def summarize(samples_seconds):
+    return {
+        "count": len(samples_seconds),
+        "mean_ms": round(1000 * sum(samples_seconds) / len(samples_seconds), 3) if samples_seconds else 0.0,
+        "p50_ms": round(1000 * percentile(samples_seconds, 50), 3),
+        "p95_ms": round(1000 * percentile(samples_seconds, 95), 3),
+        "p99_ms": round(1000 * percentile(samples_seconds, 99), 3),
+    }
+
+
+class SpanCollector:
+    """Tracing exporter that keeps every span's duration by stage name."""
+
+    def __init__(self):
+        self.durations = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def export(self, trace):
+        with self._lock:
+            for span in trace.spans:
+                self.durations[span.name].append(span.duration)
+
+    def reset(self):
+        with self._lock:
+            self.durations.clear()
+
+
+def clear_caches():
+    """Drop every process-wide cache so each pass starts cold."""
+    from action_classifier import classifier_cache
+    from reverse_geocoder import geocode_cache
+    from semantic_cache import response_cache
+    from web_search_tool import search_cache
+
+    for cache in (classifier_cache, geocode_cache, response_cache, search_cache):
+        cache.clear()
+
+
+def run_turn(prompt, location, stream):
+    """One session turn: resolve the user's address, then ask the assistant."""
+    import main
+    from reverse_geocoder import reverse_geocode
+    from tracing import span
+
+    lat, lon = location["coordinates"]
+    with span("reverse_geocode"):
+        reverse_geocode(lat, lon)
+    history = [{"role": "user", "content": prompt}]
+    if stream:
+        return "".join(main.stream_snowboard_assistant_response(prompt, history))
+    return main.get_snowboard_assistant_response(prompt, history)
+
+
+def run_pass(corpus, locations, iterations, concurrency, stream, cold):
+    """Run the corpus iterations times; returns (wall seconds, per-turn latencies, failures)."""
+    latencies = []
+    failures = []
+    lock = threading.Lock()
+
+    def task(index):
+        entry = corpus[index % len(corpus)]
+        location = locations[index % len(locations)]
+        started = time.perf_counter()
+        reply = run_turn(entry["prompt"], location, stream)
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            if reply.startswith("Sorry, I encountered an error"):
+                failures.append(reply)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="bench-session") as pool:
+        for iteration in range(iterations):
+            if cold:
+                clear_caches()
+            base = iteration * len(corpus)
+            list(pool.map(task, range(base, base + len(corpus))))
+    return time.perf_counter() - started, latencies, failures
+
+
+def measure_allocations(corpus, locations, stream, top):
+    """One sequential pass over the corpus under tracemalloc."""
+    repo_root = os.path.dirname(fakes.BENCHMARKS_DIR)
+    tracemalloc.start(10)
+    before = tracemalloc.take_snapshot()
+    for index, entry in enumerate(corpus):
+        run_turn(entry["prompt"], locations[index % len(locations)], stream)
+    after = tracemalloc.take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    app_filter = [tracemalloc.Filter(True, os.path.join(repo_root, "*"))]
+    diff = after.filter_traces(app_filter).compare_to(before.filter_traces(app_filter), "lineno")
+    sites = [
+        {
+            "site": f"{os.path.relpath(stat.traceback[0].filename, repo_root)}:{stat.traceback[0].lineno}",
+            "size_kb": round(stat.size_diff / 1024, 1),
+            "count": stat.count_diff,
+        }
+        for stat in diff[:top]
+    ]
+    return {
+        "turns": len(corpus),
+        "retained_kb": round(sum(stat.size_diff for stat in diff) / 1024, 1),
+        "traced_current_kb": round(current / 1024, 1),
+        "traced_peak_kb": round(peak / 1024, 1),
+        "top_sites": sites,
+    }
+
+
+def print_report(report):
+    print(f"\nTurns: {report['turns']} ({report['failures']} failed) in {report['wall_seconds']:.2f}s "
+          f"with {report['concurrency']} sessions -> {report['throughput_turns_per_second']:.2f} turns/s")
+    print(f"\n{'stage':<22}{'count':>7}{'mean ms':>11}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}")
+    rows = [("end_to_end", report["end_to_end"])] + sorted(report["stages"].items())
+    for name, stats in rows:
+        print(f"{name:<22}{stats['count']:>7}{stats['mean_ms']:>11.1f}{stats['p50_ms']:>11.1f}"
+              f"{stats['p95_ms']:>11.1f}{stats['p99_ms']:>11.1f}")
+    print(f"\nBackend calls: {report['backend_calls']}")
+    allocations = report.get("allocations")
+    if allocations:
+        print(f"\nAllocations over {allocations['turns']} turns: retained {allocations['retained_kb']} KiB, "
+              f"peak traced {allocations['traced_peak_kb']} KiB")
+        for site in allocations["top_sites"]:
+            print(f"  {site['size_kb']:>9.1f} KiB {site['count']:>7} blocks  {site['site']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=3, help="passes over the prompt corpus")
+    parser.add_argument("--concurrency", type=int, default=4, help="concurrent sessions")
+    parser.add_argument("--stream", action="store_true", help="use the streaming response path")
+    parser.add_argument("--cold", action="store_true", help="clear the caches before every pass")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="multiplier for injected latency (0 = none)")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--no-allocations", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--top", type=int, default=10, help="allocation sites to report")
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.add_argument("--verbose", action="store_true", help="keep the app's logging and tool prints")
+    args = parser.parse_args()
+
+    fixtures = fakes.load_fixture("prompts.json")
+    corpus, locations = fixtures["prompts"], fixtures["locations"]
+
+    with contextlib.redirect_stdout(io.StringIO()) if not args.verbose else contextlib.nullcontext():
+        import streamlit as st
+        import tracing
+
+        backends = fakes.install_fakes(fakes.Latency(scale=args.latency_scale, seed=args.seed))
+    if not args.verbose:
+        logging.disable(logging.WARNING)
+
+    collector = SpanCollector()
+    tracing.tracer.exporter = collector
+    # The geolocation tool reads the location from session state, which is shared outside a Streamlit run
+    st.session_state.user_location = {
+        "coordinates": tuple(locations[0]["coordinates"]),
+        "address": locations[0]["address"],
+    }
+
+    with contextlib.redirect_stdout(io.StringIO()) if not args.verbose else contextlib.nullcontext():
+        wall, latencies, failures = run_pass(
+            corpus, locations, args.iterations, args.concurrency, args.stream, args.cold
+        )
+        stages = {name: summarize(samples) for name, samples in collector.durations.items()}
+        allocations = None
+        if not args.no_allocations:
+            if args.cold:
+                clear_caches()
+            allocations = measure_allocations(corpus, locations, args.stream, args.top)
+
+    report = {
+        "turns": len(latencies),
+        "failures": len(failures),
+        "concurrency": args.concurrency,
+        "stream": args.stream,
+        "cold": args.cold,
+        "latency_scale": args.latency_scale,
+        "wall_seconds": round(wall, 3),
+        "throughput_turns_per_second": round(len(latencies) / wall, 3) if wall else 0.0,
+        "end_to_end": summarize(latencies),
+        "stages": stages,
+        "backend_calls": {
+            "groq": backends.async_groq.chat.completions.calls,
+            "tavily": backends.tavily.calls,
+            "nominatim": backends.nominatim.calls,
+        },
+        "allocations": allocations,
+    }
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
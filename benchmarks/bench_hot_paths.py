@@ -0,0 +1,352 @@
+"""
+Micro-benchmarks for the CPU-bound hot paths, with a stored baseline and a
+regression gate.
+
+Each benchmark is timed pytest-benchmark style: the loop count is grown until
+one round takes at least --min-time, then --rounds rounds are timed. The best
+round (the one least disturbed by other work on the machine) is compared;
+median and stddev are stored alongside. Catalog-dependent benchmarks run on
+synthetic catalogs of every size in --sizes (90 is the size of the bundled CSV).
+
+When a calibration workload shows a clearly faster or slower machine than the
+one that recorded the baseline, the baseline is scaled by that ratio, so a
+slower CI runner doesn't read as a regression. A benchmark regresses when its
+best round is slower than the baseline by more than --threshold and its median
+is also above the baseline median by more than --noise-k standard deviations,
+or, whatever the noise, when it is slower than --max-ratio times the baseline.
+Suspected regressions are timed again with twice the rounds and min-time before
+they count. The script exits 1 if any benchmark regressed or has no baseline.
+
+    python benchmarks/bench_hot_paths.py                  # compare with the baseline
+    python benchmarks/bench_hot_paths.py --save           # record a new baseline
+    python benchmarks/bench_hot_paths.py --sizes 90,1000 --filter proximity
+"""
+import argparse
+import csv
+import gc
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import fakes  # noqa: E402
+
+fakes.configure_environment()
+
+DEFAULT_BASELINE = os.path.join(fakes.BENCHMARKS_DIR, "baselines", "hot_paths.json")
+DEFAULT_SIZES = "90,1000,10000,100000"
+# Baselines are only rescaled when the calibration differs by more than this (a different machine)
+CALIBRATION_TOLERANCE = 0.3
+# Suspected regressions are re-timed with this many times the rounds and min-time
+RETRY_FACTOR = 2
+
+REGIONS = ["Rocky Mountains", "Sierra Nevada", "Cascades", "Northeast", "Alps", "Coast Mountains"]
+COUNTRIES = ["United States", "Canada", "France", "Switzerland", "Austria"]
+
+
+def write_synthetic_catalog(path, size, seed=7):
+    """A resort CSV with the bundled file's columns and size rows of random northern-hemisphere points."""
+    rng = random.Random(seed + size)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["resort_name", "latitude", "longitude", "region", "country"])
+        for i in range(size):
+            writer.writerow([
+                f"Resort {i}",
+                f"{rng.uniform(25.0, 70.0):.4f}",
+                f"{rng.uniform(-160.0, 30.0):.4f}",
+                rng.choice(REGIONS),
+                rng.choice(COUNTRIES),
+            ])
+
+
+def time_call(fn, min_time, rounds):
+    """
+    Per-call seconds for fn: median, min and stddev over rounds after auto-ranging
+    the loop count (which doubles as warmup). The GC is off while timing, as in timeit.
+    """
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time or loops >= 1 << 20:
+            break
+        loops *= 2 if elapsed <= 0 else max(2, min(10, int(min_time / elapsed) + 1))
+    samples = []
+    gc_was_enabled = gc.isenabled()
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(rounds):
+            started = time.perf_counter()
+            for _ in range(loops):
+                fn()
+            samples.append((time.perf_counter() - started) / loops)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return {
+        "median": statistics.median(samples),
+        "min": min(samples),
+        "stddev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "loops": loops,
+        "rounds": rounds,
+    }
+
+
+def calibrate(rounds=5):
+    """Seconds for a fixed mixed Python/NumPy workload; baselines are scaled by the ratio between machines."""
+    import numpy as np
+
+    values = np.random.default_rng(0).random(200_000)
+
+    def workload():
+        total = 0
+        for i in range(20_000):
+            total += i * i % 7
+        np.sort(values)
+        return "".join(str(i) for i in range(2_000))
+
+    return time_call(workload, 0.05, rounds)["min"]
+
+
+def tokenizer_kind():
+    from history_packer import get_encoding
+
+    return "tiktoken" if get_encoding() is not None else "estimate"
+
+
+def build_benchmarks(sizes, workdir):
+    """Return [(name, fn)]. Setup (catalog files, indexes, fixtures) happens here, outside the timing."""
+    import streamlit as st
+
+    import assistant_engine
+    import geolocation_tool
+    import resort_catalog
+    import spatial_index
+    from history_packer import pack_messages
+
+    benchmarks = []
+    for size in sizes:
+        path = os.path.join(workdir, f"resorts_{size}.csv")
+        write_synthetic_catalog(path, size)
+        catalog = resort_catalog.ResortCatalog.from_csv(path)
+        index = spatial_index.ResortIndex(catalog)
+
+        def load_catalog_csv(path=path):
+            resort_catalog.load_resort_catalog(path).as_dict()
+
+        def load_ski_resorts_data(catalog=catalog):
+            resort_catalog._catalog = catalog
+            geolocation_tool.load_ski_resorts_data()
+
+        def build_resort_index(catalog=catalog):
+            spatial_index.ResortIndex(catalog)
+
+        def resort_proximity(index=index):
+            spatial_index._index = index
+            geolocation_tool.get_resort_proximity_info("")
+
+        benchmarks += [
+            (f"load_catalog_csv[{size}]", load_catalog_csv),
+            (f"load_ski_resorts_data[{size}]", load_ski_resorts_data),
+            (f"build_resort_index[{size}]", build_resort_index),
+            (f"get_resort_proximity_info[{size}]", resort_proximity),
+        ]
+
+    location = {"coordinates": (39.7392, -104.9903), "address": "Denver, Colorado, United States"}
+    st.session_state.user_location = location
+    location_info = {
+        "address": location["address"],
+        "closest_resorts": {
+            "Loveland": 53.1, "Arapahoe Basin": 57.9, "Keystone": 62.4, "Winter Park": 64.0, "Breckenridge": 71.2,
+        },
+    }
+    benchmarks.append(("format_location_context", lambda: assistant_engine.format_location_context(location_info)))
+
+    links = [
+        "https://www.onthesnow.com/colorado/skireport",
+        "https://www.google.com/search?q=ski+conditions",
+        "https://www.snow-forecast.com/resorts/Vail/6day/mid",
+        "https://www.evo.com/guides/best-all-mountain-snowboards",
+        "https://www.liftopia.com/deals",
+    ]
+    benchmarks.append(("build_sources_suffix", lambda: assistant_engine.build_sources_suffix(links, True)))
+
+    # A full-budget request: system prompt, eight history turns and tool context
+    history = []
+    for i in range(4):
+        history.append({"role": "user", "content": f"Question {i} about resorts near Denver and what to ride there? " * 4})
+        history.append({"role": "assistant", "content": "Here is a detailed answer about terrain and conditions. " * 40})
+    context = [{"role": "system", "content": "Search results:\n" + "- result summary with a URL and content\n" * 60}]
+    messages = pack_messages(
+        "llama-3.1-8b-instant", assistant_engine.build_system_context(), history=history,
+        context_messages=context, user_prompt="Where should I ride this weekend?",
+    )
+    def validate():
+        assistant_engine.validate_groq_request(messages, "llama-3.1-8b-instant", 0.7)
+
+    # Both token counters are gated: the estimate always, tiktoken where its encoding loads
+    benchmarks.append(("validate_groq_request[estimate]", with_estimated_tokens(validate)))
+    if tokenizer_kind() == "tiktoken":
+        benchmarks.append(("validate_groq_request[tiktoken]", validate))
+    return benchmarks
+
+
+def with_estimated_tokens(fn):
+    """fn run with token counts estimated from length, as when the tiktoken encoding can't load."""
+    import history_packer
+
+    def run():
+        saved = history_packer._encoding, history_packer._encoding_failed
+        history_packer._encoding, history_packer._encoding_failed = None, True
+        try:
+            fn()
+        finally:
+            history_packer._encoding, history_packer._encoding_failed = saved
+
+    return run
+
+
+def compare(results, baseline, scale, threshold, noise_k, max_ratio):
+    """
+    Return rows of (name, current, expected, ratio, status). Over the threshold but
+    within noise_k stddevs of the baseline median is "noisy", not a regression;
+    above max_ratio is always a regression.
+    """
+    rows = []
+    for name, result in results.items():
+        previous = baseline.get("benchmarks", {}).get(name)
+        if previous is None:
+            rows.append((name, result["min"], None, None, "NO BASELINE"))
+            continue
+        expected = previous["min"] * scale
+        ratio = result["min"] / expected if expected > 0 else 1.0
+        if ratio > max_ratio:
+            status = "REGRESSED"
+        elif ratio > 1.0 + threshold:
+            # Noise as recorded with the baseline, so a disturbed run can't excuse itself
+            limit = (previous.get("median", previous["min"]) + noise_k * previous.get("stddev", 0.0)) * scale
+            status = "REGRESSED" if result["median"] > limit else "noisy"
+        else:
+            status = "faster" if ratio < 1.0 - threshold else "ok"
+        rows.append((name, result["min"], expected, ratio, status))
+    return rows
+
+
+def baseline_scale(baseline, calibration):
+    """Factor that turns the baseline's timings into this machine's."""
+    scale = calibration / baseline["calibration_seconds"] if baseline.get("calibration_seconds") else 1.0
+    if abs(scale - 1.0) < CALIBRATION_TOLERANCE:
+        # Same class of machine: the calibration's own jitter would only add noise
+        scale = 1.0
+    return scale
+
+
+def format_seconds(seconds):
+    if seconds is None:
+        return "-"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.3f} ms"
+    return f"{seconds * 1e6:.2f} us"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma-separated synthetic catalog sizes")
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--min-time", type=float, default=0.05, help="minimum seconds per timed round")
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--threshold", type=float, default=0.3, help="allowed slowdown before failing (0.3 = 30%%)")
+    parser.add_argument("--noise-k", type=float, default=3.0,
+                        help="a slowdown also has to clear the baseline median by this many stddevs")
+    parser.add_argument("--max-ratio", type=float, default=1.5,
+                        help="slowdown that fails regardless of noise (1.5 = 50%%)")
+    parser.add_argument("--save", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    logging.disable(logging.WARNING)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        benchmarks = dict(build_benchmarks(sizes, workdir))
+        calibration = calibrate()
+        results = {}
+        for name, fn in benchmarks.items():
+            if args.filter and args.filter not in name:
+                continue
+            results[name] = time_call(fn, args.min_time, args.rounds)
+        # Calibrate on both sides of the run so a burst of load at either end doesn't skew the scale
+        calibration = min(calibration, calibrate())
+        scale = baseline_scale(baseline, calibration)
+        if not args.save:
+            # A burst of load during one benchmark reads as a regression; time suspects again
+            # with longer rounds and keep the better of the two runs
+            for name, *_, status in compare(results, baseline, scale, args.threshold, args.noise_k, args.max_ratio):
+                if status != "REGRESSED":
+                    continue
+                retry = time_call(benchmarks[name], args.min_time * RETRY_FACTOR, args.rounds * RETRY_FACTOR)
+                if retry["min"] < results[name]["min"]:
+                    results[name] = retry
+
+    current = {
+        "calibration_seconds": calibration,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "benchmarks": results,
+    }
+
+    rows = compare(results, baseline, scale, args.threshold, args.noise_k, args.max_ratio)
+    print(f"Calibration {calibration * 1e3:.2f} ms (baseline scaled by {scale:.2f}x), "
+          f"threshold {args.threshold:.0%} and {args.noise_k:g} stddev, ceiling {args.max_ratio:g}x\n")
+    print(f"{'benchmark':<38}{'best':>14}{'baseline':>14}{'ratio':>8}  status")
+    for name, best, expected, ratio, status in rows:
+        ratio_text = f"{ratio:.2f}" if ratio is not None else "-"
+        print(f"{name:<38}{format_seconds(best):>14}{format_seconds(expected):>14}{ratio_text:>8}  {status}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2)
+    if args.save:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        if baseline and args.filter:
+            # Partial run: keep the other benchmarks' baselines and their calibration, and
+            # store the new timings in that calibration's terms
+            for name, result in results.items():
+                baseline["benchmarks"][name] = {
+                    key: value / scale if key in ("median", "min", "stddev") else value
+                    for key, value in result.items()
+                }
+            current = baseline
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2, sort_keys=True)
+        print(f"\nSaved baseline to {args.baseline}")
+        return 0
+
+    regressions = [row for row in rows if row[4] == "REGRESSED"]
+    missing = [row[0] for row in rows if row[4] == "NO BASELINE"]
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%} and "
+              f"{args.noise_k:g} stddev, or by more than {args.max_ratio:g}x")
+    if missing:
+        print(f"\nNo baseline for {', '.join(missing)}; record it with --save --filter")
+    return 1 if regressions or missing else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
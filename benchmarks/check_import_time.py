@@ -0,0 +1,111 @@
+"""
+Import-time budget for the app's cold start.
+
+Runs `python -X importtime -c "import streamlit; import main"` in fresh
+interpreters. Streamlit is imported first because the server has it loaded
+before it runs the app script, so main's cumulative time is the app's own cost.
+The check fails (exit 1) when main, taking the best of --runs, exceeds
+--budget-ms, or when any of the modules that are meant to load on first use
+(LangChain, the Groq and Tavily SDKs, pandas, geopy) is imported at startup.
+
+    python benchmarks/check_import_time.py
+    python benchmarks/check_import_time.py --budget-ms 300 --top 15
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import fakes  # noqa: E402
+
+DEFAULT_BUDGET_MS = 500
+# Imported lazily by the code that needs them; none should load with main
+DEFERRED_MODULES = ("langchain", "langchain_core", "langsmith", "groq", "tavily", "pandas", "geopy", "httpx", "requests")
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def parse_importtime(stderr):
+    """Return [(module, self_us, cumulative_us, depth)] in the order Python reports them (children first)."""
+    entries = []
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            entries.append((module, int(self_us), int(cumulative_us), len(indent) // 2))
+    return entries
+
+
+def importer_chain(entries, index):
+    """Module names from the one at index up to its top-level import."""
+    chain = [entries[index][0]]
+    depth = entries[index][3]
+    for module, _, _, entry_depth in entries[index + 1:]:
+        if entry_depth < depth:
+            chain.append(module)
+            depth = entry_depth
+    return chain
+
+
+def measure(statement):
+    env = dict(os.environ)
+    # Without keys config renders a Streamlit error at import, which a deployment never hits
+    env.setdefault("GROQ_API_KEY", "import-time-check")
+    env.setdefault("TAVILY_API_KEY", "import-time-check")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=fakes.APP_DIR, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"{statement!r} failed:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main", help="app module whose import is budgeted")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters to take the best of")
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list")
+    args = parser.parse_args()
+
+    best = None
+    for _ in range(max(1, args.runs)):
+        entries = measure(f"import streamlit; import {args.module}")
+        totals = {module: cumulative for module, _, cumulative, depth in entries if depth == 0}
+        if args.module not in totals:
+            raise RuntimeError(f"{args.module} missing from the -X importtime output")
+        if best is None or totals[args.module] < best[1][args.module]:
+            best = (entries, totals)
+    entries, totals = best
+
+    # Entries after streamlit's top-level line and up to the app module's belong to the app
+    start = next(i for i, entry in enumerate(entries) if entry[3] == 0 and entry[0] == "streamlit") + 1
+    end = next(i for i, entry in enumerate(entries) if entry[3] == 0 and entry[0] == args.module) + 1
+    app_entries = entries[start:end]
+    app_ms = totals[args.module] / 1000.0
+
+    print(f"import streamlit: {totals['streamlit'] / 1000.0:.1f} ms (already loaded by the server)")
+    print(f"import {args.module}: {app_ms:.1f} ms (best of {args.runs}), budget {args.budget_ms:.0f} ms\n")
+    print(f"{'cumulative ms':>14}{'self ms':>10}  module")
+    for module, self_us, cumulative_us, depth in sorted(app_entries, key=lambda entry: -entry[2])[:args.top]:
+        print(f"{cumulative_us / 1000.0:>14.1f}{self_us / 1000.0:>10.1f}  {'  ' * depth}{module}")
+
+    failed = False
+    deferred = [
+        (index, module) for index, (module, _, _, _) in enumerate(app_entries)
+        if module.split(".")[0] in DEFERRED_MODULES and "." not in module
+    ]
+    for index, module in deferred:
+        failed = True
+        print(f"\nFAIL: {module} is imported at startup via {' <- '.join(importer_chain(app_entries, index))}")
+    if app_ms > args.budget_ms:
+        failed = True
+        print(f"\nFAIL: import {args.module} took {app_ms:.1f} ms, over the {args.budget_ms:.0f} ms budget")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
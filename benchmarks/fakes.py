@@ -0,0 +1,323 @@
+"""
+Local stand-ins for Groq, Tavily and Nominatim that replay the recorded
+responses in fixtures/ with injected latency, so the assistant can be
+benchmarked with no network and no API keys.
+
+configure_environment() must run before any app module is imported (the app
+reads its settings from the environment at import time); install_fakes()
+then swaps the fakes in behind the app's process-wide clients and the clients
+every AssistantEngine builds.
+"""
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+import zlib
+from types import SimpleNamespace
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(BENCHMARKS_DIR, "fixtures")
+APP_DIR = os.path.join(os.path.dirname(BENCHMARKS_DIR), "snowboarding-assistant")
+
+# Median seconds and log-normal spread per backend call, roughly what the live services show
+DEFAULT_LATENCY = {
+    "groq": (0.35, 0.35),  # time to first token / full non-streamed reply
+    "groq_chunk": (0.01, 0.5),  # gap between streamed chunks
+    "tavily": (0.9, 0.4),
+    "tavily_usage": (0.25, 0.3),
+    "nominatim": (0.4, 0.3),
+}
+
+
+def configure_environment(extra=None):
+    """
+    Point the app at the fakes: dummy keys, no prompt watcher, no on-disk cache
+    and Groq quotas high enough that the in-process rate limiter never queues.
+    Values already set in the environment win, so a run can opt back in.
+    """
+    settings = {
+        "GROQ_API_KEY": "benchmark-fake-key",
+        "TAVILY_API_KEY": "benchmark-fake-key",
+        "ENABLE_PROMPT_HOT_RELOAD": "false",
+        "ENABLE_PERSISTENT_CACHE": "false",
+        "GROQ_DEFAULT_RPM": "1000000",
+        "GROQ_DEFAULT_TPM": "1000000000",
+        "GROQ_RPM_LLAMA_3_1_8B": "1000000",
+        "GROQ_TPM_LLAMA_3_1_8B": "1000000000",
+        "GROQ_RPM_LLAMA_3_3_70B": "1000000",
+        "GROQ_TPM_LLAMA_3_3_70B": "1000000000",
+        "NOMINATIM_MIN_INTERVAL_SECONDS": "0",
+    }
+    settings.update(extra or {})
+    for key, value in settings.items():
+        os.environ.setdefault(key, value)
+    if APP_DIR not in sys.path:
+        sys.path.insert(0, APP_DIR)
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as f:
+        return json.load(f)
+
+
+class Latency:
+    """Injected delays: log-normal around each backend's median, scaled by scale (0 disables)."""
+
+    def __init__(self, scale=1.0, overrides=None, seed=1234):
+        self.scale = scale
+        self.profile = dict(DEFAULT_LATENCY)
+        self.profile.update(overrides or {})
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self, backend):
+        median, spread = self.profile[backend]
+        if self.scale <= 0 or median <= 0:
+            return 0.0
+        with self._lock:
+            noise = self._random.gauss(0.0, spread)
+        return self.scale * median * math.exp(noise)
+
+    def sleep(self, backend):
+        delay = self.sample(backend)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def async_sleep(self, backend):
+        delay = self.sample(backend)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def _pick(items, key):
+    """Deterministic choice of a fixture for a prompt or query."""
+    return items[zlib.crc32(key.lower().encode("utf-8")) % len(items)]
+
+
+def _estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+
+def _usage(messages, reply):
+    prompt_tokens = sum(_estimate_tokens(m["content"]) + 4 for m in messages)
+    completion_tokens = _estimate_tokens(reply)
+    return SimpleNamespace(
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        total_tokens=prompt_tokens + completion_tokens,
+        prompt_tokens_details=None,
+    )
+
+
+class FakeStream:
+    """Iterable of Groq-shaped stream chunks; the last carries x_groq.usage like the real API."""
+
+    def __init__(self, reply, usage, latency, words_per_chunk):
+        self.reply = reply
+        self.usage = usage
+        self.latency = latency
+        self.words_per_chunk = words_per_chunk
+        self.closed = False
+
+    def _chunks(self):
+        words = self.reply.split(" ")
+        for i in range(0, len(words), self.words_per_chunk):
+            text = " ".join(words[i:i + self.words_per_chunk])
+            if i + self.words_per_chunk < len(words):
+                text += " "
+            yield i > 0, SimpleNamespace(
+                choices=[SimpleNamespace(delta=SimpleNamespace(content=text), finish_reason=None)],
+                x_groq=None,
+            )
+
+    def __iter__(self):
+        for delayed, chunk in self._chunks():
+            if self.closed:
+                return
+            if delayed:
+                self.latency.sleep("groq_chunk")
+            yield chunk
+        yield SimpleNamespace(choices=[], x_groq=SimpleNamespace(usage=self.usage))
+
+    def close(self):
+        self.closed = True
+
+
+class FakeAsyncStream(FakeStream):
+    """FakeStream for AsyncGroq: async iteration and an awaitable close()."""
+
+    async def __aiter__(self):
+        for delayed, chunk in self._chunks():
+            if self.closed:
+                return
+            if delayed:
+                await self.latency.async_sleep("groq_chunk")
+            yield chunk
+        yield SimpleNamespace(choices=[], x_groq=SimpleNamespace(usage=self.usage))
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeCompletions:
+    def __init__(self, fixtures, prompts, latency, classifier_prompt):
+        self.answers = fixtures["answers"]
+        self.default_classifier_reply = fixtures["default_classifier_reply"]
+        self.words_per_chunk = fixtures.get("stream_chunk_words", 4)
+        self.classifier_replies = {
+            entry["prompt"].lower(): json.dumps(entry["classifier"])
+            for entry in prompts if entry.get("classifier") is not None
+        }
+        self.latency = latency
+        self.classifier_prompt = classifier_prompt
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _reply(self, messages):
+        with self._lock:
+            self.calls += 1
+        user_prompt = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        if messages[0]["content"] == self.classifier_prompt:
+            reply = self.classifier_replies.get(user_prompt.lower(), self.default_classifier_reply)
+        else:
+            reply = _pick(self.answers, user_prompt)
+        return reply, _usage(messages, reply)
+
+    @staticmethod
+    def _completion(reply, usage):
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=reply), finish_reason="stop")],
+            usage=usage,
+        )
+
+    def create(self, messages, model, temperature=0.7, max_tokens=None, stream=False, timeout=None, **kwargs):
+        reply, usage = self._reply(messages)
+        self.latency.sleep("groq")
+        if stream:
+            return FakeStream(reply, usage, self.latency, self.words_per_chunk)
+        return self._completion(reply, usage)
+
+
+class FakeAsyncCompletions(FakeCompletions):
+    async def create(self, messages, model, temperature=0.7, max_tokens=None, stream=False, timeout=None, **kwargs):
+        reply, usage = self._reply(messages)
+        await self.latency.async_sleep("groq")
+        if stream:
+            return FakeAsyncStream(reply, usage, self.latency, self.words_per_chunk)
+        return self._completion(reply, usage)
+
+
+class FakeGroq:
+    """Enough of groq.Groq for the assistant: chat.completions.create, streamed or not."""
+
+    def __init__(self, fixtures, prompts, latency, classifier_prompt, completions_class=FakeCompletions):
+        self.chat = SimpleNamespace(completions=completions_class(fixtures, prompts, latency, classifier_prompt))
+
+    def close(self):
+        pass
+
+
+class FakeAsyncGroq(FakeGroq):
+    """FakeGroq for AsyncGroq callers, sharing one FakeAsyncCompletions (and its call count) across engines."""
+
+    async def close(self):
+        pass
+
+
+class FakeTavilyClient:
+    """Replays a recorded Tavily result set per query."""
+
+    def __init__(self, fixtures, latency):
+        self.result_sets = fixtures["result_sets"]
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _results(self, query, max_results):
+        with self._lock:
+            self.calls += 1
+        results = _pick(self.result_sets, query)["results"][:max_results]
+        return {"query": query, "results": [dict(result) for result in results]}
+
+    def http_transport(self):
+        """An httpx transport answering Tavily's search endpoint, for the engine's async client."""
+        import httpx
+
+        async def handle(request):
+            await self.latency.async_sleep("tavily")
+            body = json.loads(request.content)
+            return httpx.Response(200, json=self._results(body["query"], body.get("max_results", 3)))
+
+        return httpx.MockTransport(handle)
+
+
+def make_fake_nominatim(fixtures, latency):
+    """A geopy Nominatim replacement class answering from the nearest recorded place."""
+    places = fixtures["places"]
+
+    class FakeNominatim:
+        calls = 0
+
+        def __init__(self, user_agent=None, timeout=None, **kwargs):
+            pass
+
+        def reverse(self, query, **kwargs):
+            FakeNominatim.calls += 1
+            latency.sleep("nominatim")
+            lat, lon = query
+            place = min(
+                places,
+                key=lambda p: (p["coordinates"][0] - lat) ** 2 + (p["coordinates"][1] - lon) ** 2,
+            )
+            return SimpleNamespace(address=place["address"], latitude=lat, longitude=lon)
+
+    return FakeNominatim
+
+
+def install_fakes(latency=None):
+    """
+    Swap the fakes in behind the app's shared clients. Returns them as a
+    namespace (async_groq, tavily, nominatim, latency) so callers can read call counts.
+    Must run after configure_environment().
+    """
+    latency = latency or Latency()
+    prompts = load_fixture("prompts.json")["prompts"]
+    tavily_fixtures = load_fixture("tavily.json")
+
+    import assistant_engine
+    import reverse_geocoder
+    import tavily_quota
+    import web_search_tool
+    from prompts import get_prompt
+
+    fake_tavily = FakeTavilyClient(tavily_fixtures, latency)
+
+    # Engines build their clients through these factories when they first need one
+    fake_async_groq = FakeAsyncGroq(
+        load_fixture("groq.json"), prompts, latency, get_prompt("action_classifier"), FakeAsyncCompletions
+    )
+    assistant_engine.build_async_groq_client = lambda: fake_async_groq
+
+    def fake_search_client():
+        import httpx
+
+        return web_search_tool.AsyncTavilySearch(http_client=httpx.AsyncClient(transport=fake_tavily.http_transport()))
+
+    assistant_engine.AsyncTavilySearch = fake_search_client
+
+    def fake_monthly_usage():
+        latency.sleep("tavily_usage")
+        return tavily_fixtures["usage"]["monthly"]
+
+    tavily_quota.tavily_quota.fetch_monthly_usage = fake_monthly_usage
+
+    fake_nominatim = make_fake_nominatim(load_fixture("nominatim.json"), latency)
+    reverse_geocoder._make_geolocator = fake_nominatim
+
+    return SimpleNamespace(
+        async_groq=fake_async_groq, tavily=fake_tavily, nominatim=fake_nominatim, latency=latency
+    )
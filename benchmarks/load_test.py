@@ -0,0 +1,346 @@
+"""
+Load test: many concurrent Streamlit sessions on one app instance, against the local fakes.
+
+Each simulated user is a headless Streamlit session (streamlit.testing.v1.AppTest)
+running streamlit_app.py on its own thread, like the server's per-session script
+thread. The user opens the page with location sharing on, then sends --turns chat
+messages. The number of concurrent sessions is ramped through --levels. Each
+level reports:
+
+- turn throughput and latency (the script reruns a message triggers);
+- queueing delay: time spent waiting for the Groq rate limiter and for the
+  assistant engine's event loop to start the turn, read from the tracing spans;
+- peak process RSS.
+
+The saturation point is the last level before throughput stops growing by at
+least --min-gain, or before turns start failing or missing the --slo p95.
+Memory per session is measured separately with tracemalloc.
+
+    python benchmarks/load_test.py --levels 1,2,4,8,16,32 --turns 3
+    python benchmarks/load_test.py --latency-scale 0.5 --think-time 1 --json load.json
+"""
+import argparse
+import contextlib
+import gc
+import io
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import fakes  # noqa: E402
+from bench_assistant import SpanCollector, clear_caches, summarize  # noqa: E402
+
+APP_SCRIPT = os.path.join(fakes.APP_DIR, "streamlit_app.py")
+# streamlit_app.MAX_MESSAGE_COUNT: later messages only get the free-tier notice
+MAX_TURNS = 12
+ERROR_REPLY_PREFIX = "Sorry, I encountered an error"
+# Spans that record how long their work waited for a shared resource
+QUEUE_SPANS = ("groq_request", "assistant_turn")
+
+
+def enable_concurrent_sessions():
+    """
+    Let AppTest instances run at the same time in one process. A Streamlit
+    server shares one Runtime and one script cache across sessions; AppTest
+    assumes it runs alone, so it installs (and on teardown removes) a global
+    Runtime and compiles the script per run, and CPython 3.11's compile() isn't
+    safe to run concurrently.
+    """
+    from unittest.mock import MagicMock
+
+    from streamlit import config
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import app_test, local_script_runner
+
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime._instance = runtime
+
+    class _SessionRuntime(Runtime):
+        """AppTest sets and clears _instance on this subclass instead of the shared Runtime."""
+
+    app_test.Runtime = _SessionRuntime
+    script_cache = ScriptCache()
+    local_script_runner.ScriptCache = lambda: script_cache
+    # AppTest patches this per run; with runs overlapping, the restore would race
+    config.set_option("global.appTest", True)
+
+
+def open_session(location, timeout):
+    """Load the page as a user who has shared their location. Returns (app, seconds)."""
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(APP_SCRIPT, default_timeout=timeout)
+    lat, lon = location["coordinates"]
+    app.query_params["consent"] = "true"
+    app.query_params["location_data"] = f"{lat},{lon}"
+    started = time.perf_counter()
+    app.run()
+    return app, time.perf_counter() - started
+
+
+def turn_failure(app):
+    """Why the last script run didn't produce an answer, or None."""
+    if app.exception:
+        return app.exception[0].value
+    messages = app.session_state["messages"]
+    if not messages or messages[-1]["role"] != "assistant":
+        return "no assistant reply"
+    if messages[-1]["content"].startswith(ERROR_REPLY_PREFIX):
+        return messages[-1]["content"]
+    return None
+
+
+def simulate_session(index, corpus, locations, turns, think_time, timeout):
+    """One user: open the page, then send turns messages. Returns a result dict."""
+    result = {"page_load": None, "latencies": [], "failures": [], "app": None}
+    try:
+        app, result["page_load"] = open_session(locations[index % len(locations)], timeout)
+        result["app"] = app
+        if app.exception:
+            result["failures"].append(f"page load: {app.exception[0].value}")
+            return result
+        for turn in range(turns):
+            if think_time:
+                time.sleep(think_time)
+            prompt = corpus[(index * turns + turn) % len(corpus)]["prompt"]
+            started = time.perf_counter()
+            app.chat_input[0].set_value(prompt).run()
+            result["latencies"].append(time.perf_counter() - started)
+            failure = turn_failure(app)
+            if failure:
+                result["failures"].append(failure)
+    except Exception as e:
+        # A script run timing out (or the app not rendering its chat input) ends the session
+        result["failures"].append(f"{type(e).__name__}: {e}")
+    return result
+
+
+class QueueCollector(SpanCollector):
+    """SpanCollector that also sums each turn's queueing delay across its spans."""
+
+    def __init__(self):
+        super().__init__()
+        self.turn_queue = []
+        self.queue_by_span = {name: [] for name in QUEUE_SPANS}
+
+    def export(self, trace):
+        super().export(trace)
+        waits = [
+            (span.name, span.attributes["queue_ms"] / 1000.0)
+            for span in trace.spans
+            if span.name in QUEUE_SPANS and isinstance(span.attributes.get("queue_ms"), (int, float))
+        ]
+        with self._lock:
+            self.turn_queue.append(sum(wait for _, wait in waits))
+            for name, wait in waits:
+                self.queue_by_span[name].append(wait)
+
+    def reset(self):
+        super().reset()
+        with self._lock:
+            self.turn_queue = []
+            self.queue_by_span = {name: [] for name in QUEUE_SPANS}
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, KiB elsewhere
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_level(sessions, corpus, locations, args, collector):
+    """Run sessions concurrent users to completion; returns the level's stats."""
+    collector.reset()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions, thread_name_prefix="load-session") as pool:
+        results = list(pool.map(
+            lambda index: simulate_session(index, corpus, locations, args.turns, args.think_time, args.timeout),
+            range(sessions),
+        ))
+    wall = time.perf_counter() - started
+
+    latencies = [latency for result in results for latency in result["latencies"]]
+    failures = [failure for result in results for failure in result["failures"]]
+    page_loads = [result["page_load"] for result in results if result["page_load"] is not None]
+    return {
+        "sessions": sessions,
+        "turns": len(latencies),
+        "failures": len(failures),
+        "failure_samples": failures[:3],
+        "wall_seconds": round(wall, 3),
+        "throughput_turns_per_second": round(len(latencies) / wall, 3) if wall else 0.0,
+        "turn_latency": summarize(latencies),
+        "page_load": summarize(page_loads),
+        "queue_delay": summarize(collector.turn_queue),
+        "queue_delay_by_stage": {
+            name: summarize(waits) for name, waits in collector.queue_by_span.items() if waits
+        },
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def saturation_check(previous, level, min_gain, slo_seconds):
+    """Why level is past the saturation point, or None while it still scales."""
+    if level["failures"]:
+        return f"{level['failures']} failed turns"
+    if level["turn_latency"]["p95_ms"] > slo_seconds * 1000:
+        return f"p95 turn latency {level['turn_latency']['p95_ms'] / 1000:.2f}s over the {slo_seconds:g}s SLO"
+    if previous and level["throughput_turns_per_second"] < previous["throughput_turns_per_second"] * (1 + min_gain):
+        return f"throughput grew less than {min_gain:.0%}"
+    return None
+
+
+def measure_session_memory(count, corpus, locations, turns, timeout):
+    """
+    Retained memory per idle session: the session state (chat history and
+    widget state) of count sessions that each had turns turns. One pass over
+    the corpus runs first so the process-wide caches are already populated.
+    """
+    for index in range(0, len(corpus), turns):
+        simulate_session(index // turns, corpus, locations, turns, 0, timeout)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    states = []
+    for index in range(count):
+        result = simulate_session(index, corpus, locations, turns, 0, timeout)
+        if result["app"] is not None:
+            # Keep what a Streamlit server keeps per session; the AppTest element tree is test-only
+            states.append(result["app"].session_state)
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return {
+        "sessions": len(states),
+        "turns_per_session": turns,
+        "kb_per_session": round(retained / max(1, len(states)) / 1024, 1),
+    }
+
+
+def print_report(report):
+    print(f"\n{'sessions':>8}{'turns':>7}{'fail':>6}{'turns/s':>9}{'p50 s':>8}{'p95 s':>8}{'p99 s':>8}"
+          f"{'queue p50 ms':>14}{'queue p95 ms':>14}{'rss MB':>9}")
+    for level in report["levels"]:
+        latency, queue = level["turn_latency"], level["queue_delay"]
+        rss = level["peak_rss_mb"] if level["peak_rss_mb"] is not None else "-"
+        print(f"{level['sessions']:>8}{level['turns']:>7}{level['failures']:>6}"
+              f"{level['throughput_turns_per_second']:>9.2f}{latency['p50_ms'] / 1000:>8.2f}"
+              f"{latency['p95_ms'] / 1000:>8.2f}{latency['p99_ms'] / 1000:>8.2f}"
+              f"{queue['p50_ms']:>14.1f}{queue['p95_ms']:>14.1f}{rss:>9}")
+        for failure in level["failure_samples"]:
+            print(f"{'':>8}failed: {str(failure)[:100]}")
+
+    saturation = report["saturation"]
+    if saturation["sessions"] is not None:
+        print(f"\nSaturation point: {saturation['sessions']} concurrent sessions "
+              f"({saturation['throughput_turns_per_second']:.2f} turns/s); "
+              f"at {saturation['next_level']}: {saturation['reason']}")
+    else:
+        print(f"\nSaturation point: {saturation['reason']}")
+    memory = report.get("memory")
+    if memory:
+        print(f"Memory per session: {memory['kb_per_session']} KiB after {memory['turns_per_session']} turns "
+              f"({memory['sessions']} sessions)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", default="1,2,4,8,16,32,64", help="comma-separated concurrent session counts")
+    parser.add_argument("--turns", type=int, default=3, help=f"messages per session (at most {MAX_TURNS})")
+    parser.add_argument("--think-time", type=float, default=0.0, help="seconds a user waits between messages")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="multiplier for injected latency (0 = none)")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--stream", action="store_true", help="run the app with ENABLE_STREAMING on")
+    parser.add_argument("--slo", type=float, default=10.0, help="p95 turn latency (seconds) a level must meet")
+    parser.add_argument("--min-gain", type=float, default=0.1, help="throughput growth per level that counts as scaling")
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds before a script run counts as hung")
+    parser.add_argument("--full", action="store_true", help="keep ramping past the saturation point")
+    parser.add_argument("--memory-sessions", type=int, default=10, help="sessions for the memory measurement (0 skips it)")
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.add_argument("--verbose", action="store_true", help="keep the app's logging and tool prints")
+    args = parser.parse_args()
+    if not 1 <= args.turns <= MAX_TURNS:
+        parser.error(f"--turns must be between 1 and {MAX_TURNS}")
+    levels = [int(level) for level in args.levels.split(",") if level.strip()]
+
+    fakes.configure_environment({"ENABLE_STREAMING": "true" if args.stream else "false"})
+    fixtures = fakes.load_fixture("prompts.json")
+    corpus, locations = fixtures["prompts"], fixtures["locations"]
+
+    quiet = contextlib.redirect_stdout(io.StringIO()) if not args.verbose else contextlib.nullcontext()
+    with quiet:
+        import tracing
+
+        backends = fakes.install_fakes(fakes.Latency(scale=args.latency_scale, seed=args.seed))
+        enable_concurrent_sessions()
+        if not args.verbose:
+            logging.disable(logging.WARNING)
+        collector = QueueCollector()
+        tracing.tracer.exporter = collector
+
+        # One session first so imports and catalog loading don't land in the first level
+        simulate_session(0, corpus, locations, 1, 0, args.timeout)
+        clear_caches()
+
+        results = []
+        saturation = {"sessions": None, "reason": f"not reached by {levels[-1]} sessions"}
+        for sessions in levels:
+            level = run_level(sessions, corpus, locations, args, collector)
+            results.append(level)
+            print(f"{sessions} sessions: {level['throughput_turns_per_second']:.2f} turns/s", file=sys.stderr)
+            previous = results[-2] if len(results) > 1 else None
+            reason = saturation_check(previous, level, args.min_gain, args.slo)
+            if reason and saturation["sessions"] is None:
+                saturation = {
+                    "sessions": previous["sessions"] if previous else 0,
+                    "throughput_turns_per_second": previous["throughput_turns_per_second"] if previous else 0.0,
+                    "next_level": sessions,
+                    "reason": reason,
+                }
+                if not args.full:
+                    break
+
+        memory = None
+        if args.memory_sessions > 0:
+            # The collector keeps every span; don't count that as session memory
+            tracing.tracer.exporter = None
+            memory = measure_session_memory(args.memory_sessions, corpus, locations, args.turns, args.timeout)
+
+    report = {
+        "turns_per_session": args.turns,
+        "think_time": args.think_time,
+        "latency_scale": args.latency_scale,
+        "stream": args.stream,
+        "levels": results,
+        "saturation": saturation,
+        "memory": memory,
+        "backend_calls": {
+            "groq": backends.async_groq.chat.completions.calls,
+            "tavily": backends.tavily.calls,
+            "nominatim": backends.nominatim.calls,
+        },
+    }
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, default=str)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
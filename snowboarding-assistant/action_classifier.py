@@ -1,74 +1,254 @@
+import json
 import logging
-import time
-from typing import Dict, Any
+import re
+import threading
+from collections import Counter
+from typing import Callable, Dict, Any, Optional
 
 from prompts import get_prompt
+from offline_geocoder import get_offline_geocoder
+from spatial_index import get_resort_index
+from rate_limiter import rate_limited_completion_async
+from retry_policy import default_retry_policy
+from ttl_cache import LRUTTLCache, normalize_text
+from persistent_cache import get_persistent_cache
+from config import (
+    ACTION_CLASSIFIER_MODEL,
+    ENABLE_RULE_BASED_CLASSIFIER,
+    LOCATION_KEYWORDS,
+    CLASSIFIER_CACHE_MAX_ENTRIES,
+    CLASSIFIER_CACHE_TTL_SECONDS,
+    PERSISTENT_CACHE_WARM_START_ENTRIES,
+)
 
 logger = logging.getLogger(__name__)
 
+# ===== TIER 1: COMPILED KEYWORD RULES =====
+# Rules only decide the unambiguous cases (GEO-only, or no tool at all). Anything that
+# needs a web search goes to the LLM, which also writes the optimized search query.
+_GEO_PATTERN = re.compile(
+    r"\b(?:" + "|".join(re.escape(keyword) for keyword in LOCATION_KEYWORDS)
+    + r"|near (?:me|here)|around (?:me|here)|close to (?:me|here)|from here|where i live"
+    + r"|within \d+ ?(?:miles?|mi))\b",
+    re.IGNORECASE,
+)
+_WEB_PATTERN = re.compile(
+    r"\b(?:today|tonight|tomorrow|yesterday|this (?:week|weekend|month|season|year)|next (?:week|weekend|month)"
+    r"|right now|currently|current|latest|recent(?:ly)?|forecast|weather|snow ?report|snowfall|conditions?"
+    r"|open(?:ing)?|clos(?:ed|ing)|price[sd]?|cost|cheap(?:est)?|deals?|sales?|discounts?|tickets?|pass(?:es)?"
+    r"|news|events?|competitions?|results?|reviews?|20\d\d)\b",
+    re.IGNORECASE,
+)
+_NO_TOOL_PATTERN = re.compile(
+    r"^\s*(?:how (?:do|can|should) i|how to|what(?:'s| is| are) (?:a |an |the )?(?:difference|best way)"
+    r"|tips? (?:for|on)|explain|teach me|why (?:do|does|is))\b"
+    r"|\b(?:wax(?:ing)?|technique|stance|carv(?:e|ing)|ollie|butter(?:ing)?|heel ?side|toe ?side|edg(?:e|ing)"
+    r"|binding angles?|layering|falling leaf|goofy|regular footed|linking turns)\b",
+    re.IGNORECASE,
+)
+# Questions about getting somewhere or choosing a resort are never pure technique
+_PLACE_QUESTION_PATTERN = re.compile(
+    r"\b(?:where|resorts?|mountains?|get to|drive|fly(?:ing)?|travel|trip)\b", re.IGNORECASE
+)
 
-def _retry_chat_completion(groq_client, messages, model: str, temperature: float = 0.1, max_retries: int = 3):
-    last_error = None
-    for attempt in range(max_retries):
-        try:
-            if attempt > 0:
-                time.sleep(2 ** attempt)
-            return groq_client.chat.completions.create(
-                messages=messages,
-                model=model,
-                temperature=temperature,
-            )
-        except Exception as exc:
-            last_error = exc
-            logger.warning(f"Action classifier attempt {attempt + 1} failed: {exc}")
-    # Exhausted retries
-    if last_error:
-        raise last_error
+
+def _mentions_place(user_prompt: str) -> bool:
+    """True when the prompt asks about a place or names a resort, town, state or region."""
+    if _PLACE_QUESTION_PATTERN.search(user_prompt):
+        return True
+    return get_resort_index().names_place(user_prompt) or get_offline_geocoder().place_index.names_place(user_prompt)
+
+
+# ===== TIER 2: OPTIONAL LOCAL MODEL =====
+# A callable taking the prompt and returning a classification dict (tool_use, search_query)
+# when it is confident, or None to defer to the LLM. Not set by default.
+_local_classifier: Optional[Callable[[str], Optional[Dict[str, Any]]]] = None
+
+# LLM classifier decisions keyed on (model, normalized prompt), shared by all sessions
+classifier_cache = LRUTTLCache(
+    "action_classifier",
+    max_entries=CLASSIFIER_CACHE_MAX_ENTRIES,
+    ttl_seconds=CLASSIFIER_CACHE_TTL_SECONDS,
+    persistent=get_persistent_cache(),
+    warm_start_entries=PERSISTENT_CACHE_WARM_START_ENTRIES,
+)
+
+# How many prompts each tier decided, to measure the LLM calls saved
+_tier_counts = Counter()
+_tier_counts_lock = threading.Lock()
+
+
+def set_local_classifier(classifier: Optional[Callable[[str], Optional[Dict[str, Any]]]]):
+    """Install (or clear, with None) a lightweight local model tier between the rules and the LLM."""
+    global _local_classifier
+    _local_classifier = classifier
+
+
+def _record_tier(tier: str):
+    with _tier_counts_lock:
+        _tier_counts[tier] += 1
+
+
+def get_classifier_stats() -> Dict[str, Any]:
+    """Return how many prompts each tier decided, how many LLM calls were avoided, and cache counters."""
+    with _tier_counts_lock:
+        counts = dict(_tier_counts)
+    total = sum(counts.values())
+    saved = total - counts.get("llm", 0)
+    return {
+        "tiers": counts,
+        "total": total,
+        "llm_calls_saved": saved,
+        "llm_call_savings_rate": saved / total if total else 0.0,
+        "cache": classifier_cache.stats(),
+    }
+
+
+def rule_based_classify(user_prompt: str) -> Optional[Dict[str, Any]]:
+    """
+    Decide high-confidence prompts with compiled keyword rules.
+    Returns a classification dict, or None if the prompt is ambiguous.
+    """
+    needs_geo = bool(_GEO_PATTERN.search(user_prompt))
+    needs_web = bool(_WEB_PATTERN.search(user_prompt))
+    if needs_web:
+        return None
+    if needs_geo:
+        decision = "GEO"
+    elif _NO_TOOL_PATTERN.search(user_prompt) and not _mentions_place(user_prompt):
+        # NONE only for questions purely about technique; anything tied to a place may need the tools
+        decision = "NONE"
+    else:
+        return None
+    return {
+        "tool_use": {"web_search": False, "geolocation": decision == "GEO"},
+        "search_query": None,
+        "raw_response": f"rules:{decision}",
+    }
 
 
-def classify_actions(
+def _parse_classifier_output(raw: str):
+    """
+    Parse the classifier's JSON reply into (tool_use, search_query).
+    Falls back to keyword matching when the reply isn't valid JSON. Both tools may be requested.
+    """
+    tool_use = {"web_search": False, "geolocation": False}
+    search_query = None
+    try:
+        data = json.loads(raw[raw.find("{"):raw.rfind("}") + 1])
+        tools = [str(tool).upper() for tool in data.get("tools", [])]
+        tool_use["web_search"] = "WEB" in tools
+        tool_use["geolocation"] = "GEO" in tools
+        search_query = (data.get("search_query") or "").strip() or None
+    except (ValueError, AttributeError, TypeError):
+        upper = raw.upper()
+        tool_use["web_search"] = "WEB" in upper
+        tool_use["geolocation"] = "GEO" in upper
+    return tool_use, search_query
+
+
+async def classify_actions_async(
     user_prompt: str,
     groq_client,
-    model: str,
+    model: str = None,
+    deadline=None,
+    session_id: str = None,
 ) -> Dict[str, Any]:
     """
     Call the LLM-based action classifier and return a structured result.
 
+    groq_client is the engine's AsyncGroq. deadline (a retry_policy.Deadline)
+    bounds the LLM call and its retries, and session_id is the caller's place
+    in the rate limiter's fair queue.
+
+    Classification is tiered: compiled keyword rules first, then the optional
+    local model, then the shared cache of earlier LLM decisions, and the Groq
+    LLM only for prompts none of those could answer.
+
     Returns a dict:
       {
         "tool_use": {"web_search": bool, "geolocation": bool},
         "search_query": str | None,
-        "raw_response": str
+        "raw_response": str,
+        "tier": "rules" | "local_model" | "cache" | "llm"
       }
     """
-    system_prompt = get_prompt("action_classifier")
+    model = model or ACTION_CLASSIFIER_MODEL
+    result = _classify_without_llm(user_prompt, model)
+    if result is not None:
+        return result
+
+    async def attempt(timeout):
+        kwargs = {"timeout": timeout} if timeout is not None else {}
+        return await rate_limited_completion_async(
+            groq_client,
+            model,
+            _classifier_messages(user_prompt),
+            max_wait=timeout,
+            session_id=session_id,
+            temperature=0.1,
+            **kwargs,
+        )
+
+    completion = await default_retry_policy.call_async(attempt, deadline=deadline, description="Action classifier")
+    return _record_llm_decision(user_prompt, model, completion)
+
 
-    messages = [
-        {"role": "system", "content": system_prompt},
+def _classify_without_llm(user_prompt: str, model: str) -> Optional[Dict[str, Any]]:
+    """The rules, local model and cache tiers; None when the prompt needs the LLM."""
+    if ENABLE_RULE_BASED_CLASSIFIER:
+        result = rule_based_classify(user_prompt)
+        if result is not None:
+            result["tier"] = "rules"
+            _record_tier("rules")
+            logger.info(f"Action classifier decided by rules: {result['raw_response']}")
+            return result
+
+    if _local_classifier is not None:
+        try:
+            result = _local_classifier(user_prompt)
+        except Exception as exc:
+            logger.warning(f"Local classifier failed, falling back to LLM: {exc}")
+            result = None
+        if result is not None:
+            result.setdefault("search_query", None)
+            result.setdefault("raw_response", "local_model")
+            result["tier"] = "local_model"
+            _record_tier("local_model")
+            return result
+
+    cached = classifier_cache.get((model, normalize_text(user_prompt)))
+    if cached is not None:
+        tool_use, search_query, raw = cached
+        _record_tier("cache")
+        logger.info("Action classifier decision served from cache")
+        return {
+            "tool_use": dict(tool_use),
+            "search_query": search_query,
+            "raw_response": raw,
+            "tier": "cache",
+        }
+    return None
+
+
+def _classifier_messages(user_prompt: str):
+    return [
+        {"role": "system", "content": get_prompt("action_classifier")},
         {"role": "user", "content": user_prompt},
     ]
 
-    completion = _retry_chat_completion(
-        groq_client=groq_client,
-        messages=messages,
-        model=model,
-        temperature=0.1,
-    )
 
+def _record_llm_decision(user_prompt: str, model: str, completion) -> Dict[str, Any]:
+    """Parse the LLM classifier's completion and cache the decision for later prompts."""
+    _record_tier("llm")
     raw = completion.choices[0].message.content.strip()
-    upper = raw.upper()
-
-    tool_use = {"web_search": False, "geolocation": False}
-    search_query = None
-
-    if "WEB" in upper:
-        tool_use["web_search"] = True
-    elif "GEO" in upper:
-        tool_use["geolocation"] = True
+    tool_use, search_query = _parse_classifier_output(raw)
+    classifier_cache.set((model, normalize_text(user_prompt)), (dict(tool_use), search_query, raw))
 
     return {
         "tool_use": tool_use,
         "search_query": search_query,
         "raw_response": raw,
+        "tier": "llm",
     }
 
@@ -0,0 +1,689 @@
+import asyncio
+import logging
+import os
+import time
+
+from config import (
+    GROQ_API_KEY,
+    ACTION_CLASSIFIER_MODEL,
+    RESPONSE_GENERATION_MODEL,
+    RETRY_MAX_ATTEMPTS,
+    TURN_DEADLINE_SECONDS,
+    ENABLE_HEDGED_REQUESTS,
+    HEDGE_FALLBACK_MODEL,
+    ROUTING_MAX_QUEUE_SECONDS,
+    ENABLE_SEMANTIC_CACHE
+)
+from prompts import get_prompt, format_prompt
+from action_classifier import classify_actions_async
+from geolocation_tool import resort_proximity_info
+from groq_client import build_async_groq_client
+from history_packer import pack_messages, count_message_tokens, get_token_budget
+from prompt_prefix import prefix_tracker
+from tavily_quota import tavily_quota
+from rate_limiter import rate_limited_completion_async, RateLimitTimeout
+from retry_policy import (
+    Deadline,
+    RetryPolicy,
+    AsyncPrimedStream,
+    default_retry_policy,
+    hedged_call_async,
+    latency_tracker,
+    classify_error,
+    close_response_async,
+    RATE_LIMITED,
+)
+from model_router import route_turn, model_usage
+from semantic_cache import response_cache
+from tracing import span
+from web_search_tool import AsyncTavilySearch
+
+logger = logging.getLogger(__name__)
+
+
+class AssistantConfigurationError(Exception):
+    """Raised when required configuration (API keys, model names) is missing."""
+
+
+class RequestContext:
+    """
+    Everything a turn needs from its caller, passed explicitly rather than read
+    from Streamlit session state.
+
+    user_location: {"address": str, "coordinates": (lat, lon)}, or None if not shared
+    conversation_history: earlier messages ({"role", "content"}), oldest first
+    quota: the Tavily quota to charge searches to (usage() and try_acquire(), like
+        tavily_quota.TavilyQuotaTracker); the process-wide tracker by default
+    session_id: the conversation's key in the Groq rate limiter's fair queue
+    received_at: time.monotonic() when the request arrived; the wait before the
+        engine starts the turn is recorded as queue_ms on its assistant_turn span
+    """
+
+    def __init__(self, user_location=None, conversation_history=None, quota=None, session_id=None, received_at=None):
+        self.user_location = user_location
+        self.conversation_history = conversation_history or []
+        self.quota = quota if quota is not None else tavily_quota
+        self.session_id = session_id or os.urandom(8).hex()
+        self.received_at = received_at if received_at is not None else time.monotonic()
+
+
+def validate_groq_request(messages, model, temperature=0.7):
+    """
+    Validate the Groq API request before sending
+    """
+    # Check if messages are properly formatted
+    if not messages or not isinstance(messages, list):
+        raise ValueError("Messages must be a non-empty list")
+
+    for message in messages:
+        if not isinstance(message, dict):
+            raise ValueError("Each message must be a dictionary")
+        if 'role' not in message or 'content' not in message:
+            raise ValueError("Each message must have 'role' and 'content' keys")
+        if message['role'] not in ['system', 'user', 'assistant']:
+            raise ValueError("Message role must be 'system', 'user', or 'assistant'")
+        if not isinstance(message['content'], str):
+            raise ValueError("Message content must be a string")
+
+    # Check model name
+    if not model or not isinstance(model, str):
+        raise ValueError("Model must be a non-empty string")
+
+    # Check temperature
+    if not isinstance(temperature, (int, float)) or temperature < 0 or temperature > 2:
+        raise ValueError("Temperature must be a number between 0 and 2")
+
+    # Check prompt size against the model's token budget (pack_messages normally keeps it under)
+    prompt_tokens = count_message_tokens(messages)
+    token_budget = get_token_budget(model)
+    if prompt_tokens > token_budget:
+        logger.warning(f"Prompt is {prompt_tokens} tokens, over the {token_budget}-token budget for {model}")
+
+    return True
+
+def build_system_context():
+    """
+    Build the static system prompt. It must stay byte-identical across users and
+    turns so the provider can reuse its cached prefix; per-turn tool context goes
+    into separate messages after the history (see AssistantEngine._prepare_turn).
+    """
+    return get_prompt("response_generation")
+
+def is_semantic_cache_eligible(tool_use, user_prompt, conversation_history=None):
+    """
+    Only turns with no GEO/WEB tool context and no earlier conversation can share
+    answers: anything else depends on the user's location, fresh results or context.
+    """
+    if not ENABLE_SEMANTIC_CACHE or tool_use["web_search"] or tool_use["geolocation"]:
+        return False
+    earlier = [
+        message for message in (conversation_history or [])
+        if message["role"] in ("user", "assistant")
+    ]
+    if earlier and earlier[-1]["role"] == "user" and earlier[-1]["content"] == user_prompt:
+        earlier = earlier[:-1]
+    return not earlier
+
+def format_location_context(location_info):
+    """
+    The location context message for the prompt, from resort_proximity_info's result.
+    It is sent after the conversation history, keeping the system prompt static.
+    """
+    if location_info is None:
+        return get_prompt("no_location_shared")
+    resort_lines = [
+        f"- {resort}: {distance:.1f} miles" for resort, distance in location_info.get('closest_resorts').items()
+    ]
+    scope = location_info.get('scope')
+    if scope:
+        # The user asked for a radius or a region: say so, including when nothing matched
+        resort_lines = [f"(resorts {scope})"] + (resort_lines or ["- none"])
+    closest_resorts_str = "\n".join(resort_lines)
+    location_context = format_prompt(
+        "location_context",
+        address=location_info.get('address', ''),
+        closest_resorts=closest_resorts_str
+    )
+    logger.info(f"Location data provided: {location_context}")
+    return location_context
+
+def rate_limit_message(rate_limit_error):
+    """User-facing reply when the shared Groq quota is exhausted for longer than we queue."""
+    wait = max(1, round(rate_limit_error.retry_after))
+    return f"We're getting a lot of requests right now and hit our rate limit. Please try again in about {wait} seconds."
+
+def log_groq_error(api_error):
+    """Log as much detail as is available about a failed Groq API call."""
+    logger.error(f"Groq API error: {str(api_error)}")
+    logger.error(f"Error type: {type(api_error).__name__}")
+    # Try to get more details about the error
+    if hasattr(api_error, 'response'):
+        logger.error(f"Response status: {api_error.response.status_code}")
+        logger.error(f"Response text: {api_error.response.text}")
+
+def build_sources_suffix(search_links, search_used):
+    """
+    Build the deterministic text appended after the model's answer: a clean Sources
+    section plus a pointer to any Google search URL among the links.
+    """
+    if not (search_links and search_used):
+        logger.info("No search links available or search not used, skipping sources")
+        return ""
+
+    logger.info("Deterministically appending sources to response")
+    suffix = ""
+    # Check if there's a Google URL in the search links
+    google_url = None
+
+    # Add a clean sources section
+    sources_section = "\n\n**Sources:**\n"
+    used_links = 0
+
+    for i, url in enumerate(search_links[:5]):  # Limit to 5 sources
+        # Extract domain for more descriptive title
+        try:
+            if "google.com" in url:
+                google_url = url
+                logger.info(f"Skipping Google URL: {url}")
+                continue
+            domain = url.split('//')[1].split('/')[0] if '//' in url else url
+            sources_section += f"- [{domain}]({url})\n"
+            used_links += 1
+        except Exception as e:
+            logger.warning(f"Error formatting URL {url}: {str(e)}")
+
+    # Only append if we have valid links
+    if used_links > 0:
+        suffix += sources_section
+        logger.info(f"Added {used_links} sources to response")
+    else:
+        logger.info("No valid sources to add")
+
+    # Append Google search query message if found
+    if google_url:
+        suffix += f"\n\nOh, and I found the following Google search query helpful in thinking through this, check it out: {google_url}"
+        logger.info("Added Google search query reference to response")
+
+    return suffix
+
+async def strip_sources_stream(deltas, marker="Sources:"):
+    """
+    Pass streamed text through, dropping everything from the first "Sources:" marker on.
+    Holds back just enough trailing text to detect a marker split across deltas.
+    """
+    pending = ""
+    async for delta in deltas:
+        pending += delta
+        cut = pending.find(marker)
+        if cut != -1:
+            logger.info("Removing existing Sources section from streamed response")
+            head = pending[:cut].rstrip()
+            if head:
+                yield head
+            return
+        # Keep a possible partial marker and trailing whitespace in the buffer
+        safe = pending[:max(0, len(pending) - (len(marker) - 1))].rstrip()
+        if safe:
+            yield safe
+            pending = pending[len(safe):]
+    if pending:
+        yield pending
+
+async def iter_stream_deltas(stream, usage_reports):
+    """
+    Yield the text deltas of a Groq chat stream. Usage reports (Groq sends one as
+    x_groq.usage on the final chunk) are appended to usage_reports.
+    """
+    async for chunk in stream:
+        x_groq = getattr(chunk, "x_groq", None)
+        usage = getattr(x_groq, "usage", None) if x_groq is not None else None
+        if usage is not None:
+            usage_reports.append(usage)
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+class AssistantEngine:
+    """
+    The assistant's turn pipeline (classifier, tools, routing, completion) as
+    coroutines, independent of any front-end. One engine serves any number of
+    concurrent conversations on one event loop: every call is non-blocking and
+    shares the engine's pooled AsyncGroq and Tavily clients, so in-flight turns
+    cost a task each rather than a thread. Per-conversation state comes in
+    through RequestContext.
+
+    Use the engine from one event loop only (its clients' connections belong to
+    the loop that opened them), and await aclose() when done.
+    """
+
+    def __init__(self, groq_client=None, search_client=None):
+        self._groq_client = groq_client
+        self._search_client = search_client
+
+    @property
+    def groq_client(self):
+        if self._groq_client is None:
+            logger.info("Creating the engine's async Groq client")
+            self._groq_client = build_async_groq_client()
+        return self._groq_client
+
+    @property
+    def search_client(self):
+        if self._search_client is None:
+            self._search_client = AsyncTavilySearch()
+        return self._search_client
+
+    async def aclose(self):
+        """Close the engine's connection pools."""
+        if self._groq_client is not None:
+            await close_response_async(self._groq_client)
+            self._groq_client = None
+        if self._search_client is not None:
+            await close_response_async(self._search_client)
+            self._search_client = None
+
+    async def respond(self, user_prompt, context=None):
+        """
+        Get a response from the AI snowboarding assistant.
+
+        Args:
+            user_prompt (str): The user's question or request
+            context (RequestContext, optional): The caller's location, history and quota
+
+        Returns:
+            str: The AI assistant's response
+        """
+        context = context or RequestContext()
+        with span("assistant_turn", stream=False, queue_ms=_queue_ms(context)) as turn_span:
+            try:
+                try:
+                    turn = await self._prepare_turn(user_prompt, context)
+                except AssistantConfigurationError as config_error:
+                    return f"Configuration error: {config_error}"
+
+                if turn["cached_response"] is not None:
+                    turn_span.set(cache_hit=True)
+                    return turn["cached_response"]
+
+                logger.info("Sending request to Groq API")
+                with span("completion", stream=False) as completion_span:
+                    try:
+                        started = time.monotonic()
+                        model, chat_completion = await self._complete_turn(turn, context)
+
+                        response = chat_completion.choices[0].message.content
+                        logger.info(f"Received response from Groq API ({model})")
+                        usage = getattr(chat_completion, "usage", None)
+                        model_usage.record(model, time.monotonic() - started, usage)
+                        prefix_tracker.record_provider_usage(usage)
+                        completion_span.set(model=model)
+                        completion_span.set_usage(usage)
+                    except Exception as api_error:
+                        log_groq_error(api_error)
+                        raise api_error
+
+                with span("sources_postprocess", search_used=turn["search_used"], links=len(turn["search_links"])):
+                    # Remove any existing sources section if present; ours is appended deterministically
+                    if turn["search_links"] and turn["search_used"] and "Sources:" in response:
+                        logger.info("Removing existing Sources section from response")
+                        response = response.split("Sources:")[0].strip()
+
+                    response += build_sources_suffix(turn["search_links"], turn["search_used"])
+                if turn["cacheable"] and response.strip():
+                    response_cache.set(user_prompt, response)
+                return response
+            except RateLimitTimeout as e:
+                logger.warning(str(e))
+                turn_span.set(error=type(e).__name__)
+                return rate_limit_message(e)
+            except Exception as e:
+                error_message = f"Error getting response: {str(e)}"
+                logger.error(f"Error: {error_message}")
+                turn_span.set(error=type(e).__name__)
+                return f"Sorry, I encountered an error: {error_message}. Please try again later."
+
+    async def stream(self, user_prompt, context=None):
+        """
+        Streaming variant of respond (an async generator).
+
+        Yields:
+            str: Response text deltas as they arrive from Groq, followed by the
+            deterministic Sources section (if web search was used)
+        """
+        context = context or RequestContext()
+        with span("assistant_turn", stream=True, queue_ms=_queue_ms(context)) as turn_span:
+            try:
+                try:
+                    turn = await self._prepare_turn(user_prompt, context)
+                except AssistantConfigurationError as config_error:
+                    yield f"Configuration error: {config_error}"
+                    return
+
+                if turn["cached_response"] is not None:
+                    turn_span.set(cache_hit=True)
+                    yield turn["cached_response"]
+                    return
+
+                logger.info("Sending streaming request to Groq API")
+                with span("completion", stream=True) as completion_span:
+                    try:
+                        started = time.monotonic()
+                        model, stream = await self._complete_turn(turn, context, stream=True)
+                        # Streams are returned once their first chunk has arrived
+                        first_token_latency = time.monotonic() - started
+                    except Exception as api_error:
+                        log_groq_error(api_error)
+                        raise api_error
+                    completion_span.set(model=model, first_token_ms=round(first_token_latency * 1000, 3))
+
+                    usage_reports = []
+                    deltas = iter_stream_deltas(stream, usage_reports)
+                    if turn["search_links"] and turn["search_used"]:
+                        deltas = strip_sources_stream(deltas)
+                    streamed = []
+                    try:
+                        async for delta in deltas:
+                            streamed.append(delta)
+                            yield delta
+                    finally:
+                        # Release the pooled connection even if the consumer stops early
+                        await stream.aclose()
+                    logger.info(f"Finished streaming response from Groq API ({model})")
+                    usage = usage_reports[-1] if usage_reports else None
+                    model_usage.record(model, time.monotonic() - started, usage, first_token_latency=first_token_latency)
+                    prefix_tracker.record_provider_usage(usage)
+                    completion_span.set_usage(usage)
+
+                with span("sources_postprocess", search_used=turn["search_used"], links=len(turn["search_links"])):
+                    suffix = build_sources_suffix(turn["search_links"], turn["search_used"])
+                yield suffix
+                if turn["cacheable"] and "".join(streamed).strip():
+                    # Tool-free turns have no sources suffix, so the streamed text is the whole answer
+                    response_cache.set(user_prompt, "".join(streamed))
+            except RateLimitTimeout as e:
+                logger.warning(str(e))
+                turn_span.set(error=type(e).__name__)
+                yield rate_limit_message(e)
+            except Exception as e:
+                error_message = f"Error getting response: {str(e)}"
+                logger.error(f"Error: {error_message}")
+                turn_span.set(error=type(e).__name__)
+                yield f"Sorry, I encountered an error: {error_message}. Please try again later."
+
+    async def _prepare_turn(self, user_prompt, context):
+        """
+        Run the action classifier and tools, and build the messages for the final completion.
+
+        Returns:
+            dict: {"messages", "search_links", "search_used", "prefix_stats", "deadline", "route",
+                  "cacheable", "cached_response"}; with a semantic cache hit only the
+                  answer (cached_response) and the empty search fields are meaningful
+        """
+        # One time budget for the whole turn: classifier, tools and the final completion
+        deadline = Deadline(TURN_DEADLINE_SECONDS)
+        conversation_history = context.conversation_history
+
+        # Check Groq configuration
+        if not GROQ_API_KEY:
+            error_msg = "GROQ_API_KEY not found in environment variables or Streamlit secrets"
+            logger.error(error_msg)
+            raise AssistantConfigurationError(f"{error_msg}. Please check your API key setup.")
+
+        system_context = build_system_context()
+
+        # LLM based action classifier (to determine if we need to use a tool)
+        logger.info(f"Running action classifier for user prompt (action_classifier_model={ACTION_CLASSIFIER_MODEL})")
+        search_query = None
+        with span("classifier") as classifier_span:
+            try:
+                classification = await classify_actions_async(
+                    user_prompt=user_prompt,
+                    groq_client=self.groq_client,
+                    model=ACTION_CLASSIFIER_MODEL,
+                    deadline=deadline,
+                    session_id=context.session_id,
+                )
+                tool_use = classification["tool_use"]
+                search_query = classification["search_query"]
+                logger.info(f"Classifier ({classification.get('tier')}) decided tool_use={tool_use} search_query='{search_query}'")
+                classifier_span.set(tier=classification.get("tier"))
+            except Exception as intent_error:
+                logger.error(f"Action classifier failed: {str(intent_error)}")
+                tool_use = {"web_search": False, "geolocation": False}
+                classifier_span.set(tier="failed")
+            classifier_span.set(web_search=tool_use["web_search"], geolocation=tool_use["geolocation"])
+
+        # Tool-free first turns don't depend on the user or the conversation: answer
+        # near-duplicates of earlier prompts from the semantic cache without an LLM call
+        cacheable = is_semantic_cache_eligible(tool_use, user_prompt, conversation_history)
+        if cacheable:
+            with span("semantic_cache") as cache_span:
+                cached = response_cache.get(user_prompt)
+                cache_span.set(cache_hit=cached is not None, similarity=cached[1] if cached is not None else None)
+            if cached is not None:
+                return {
+                    "messages": None,
+                    "search_links": [],
+                    "search_used": False,
+                    "cacheable": True,
+                    "cached_response": cached[0],
+                    "deadline": deadline
+                }
+
+        # Start the web search first so it overlaps with the geolocation step; routing and
+        # history packing need its results, so they run after it
+        search_results = ""
+        search_links = []
+        search_task = None
+        if tool_use["web_search"]:
+            if not search_query:
+                search_query = user_prompt # temporary fix until we tune the prompt to never do this
+            logger.info(f"Web search needed for query: '{search_query}'")
+            search_task = asyncio.ensure_future(self._web_search(search_query, context.quota))
+
+        try:
+            location_context = None
+            if tool_use["geolocation"]:
+                with span("geo_tool") as geo_span:
+                    location_info = resort_proximity_info(context.user_location, user_prompt)
+                    geo_span.set(location_found=location_info is not None)
+                location_context = format_location_context(location_info)
+                logger.info(f"Added location context to the prompt")
+
+            if search_task is not None:
+                with span("search_wait"):
+                    search_results, search_links = await search_task
+        finally:
+            if search_task is not None and not search_task.done():
+                search_task.cancel()
+
+        # Validate model name
+        if not RESPONSE_GENERATION_MODEL:
+            error_msg = "RESPONSE_GENERATION_MODEL not configured"
+            logger.error(error_msg)
+            raise AssistantConfigurationError(f"{error_msg}. Please check your model configuration.")
+
+        # Dynamic tool context goes last (after the history), most volatile last, so the
+        # static system prompt and earlier turns form a stable, cacheable prefix
+        context_messages = []
+        if location_context:
+            context_messages.append({
+                "role": "system",
+                "content": location_context
+            })
+
+        search_used = False
+        if search_results:
+            logger.info("Adding search results to the prompt")
+            formatted_links = ""
+            if search_links:
+                formatted_links = "\n\nRelevant sources:\n"
+                for i, link in enumerate(search_links[:5]):  # Limit to 5 sources; TODO: make this a config variable
+                    formatted_links += f"{i+1}. {link}\n"
+
+            formatted_search_message = format_prompt(
+                "web_search_results",
+                search_results=search_results,
+                formatted_links=formatted_links
+            )
+
+            context_messages.append({
+                "role": "system",
+                "content": formatted_search_message
+            })
+
+            search_used = True
+            logger.info("Search was used to gather additional information for the response.")
+
+        # Pick the response model for this turn (fast vs large, skipping rate-limited models)
+        route = route_turn(
+            user_prompt,
+            tool_use,
+            conversation_history,
+            messages=[{"role": "system", "content": system_context}] + context_messages + [{"role": "user", "content": user_prompt}],
+        )
+
+        # History is packed newest-first into the model's token budget; older turns are summarized
+        if conversation_history:
+            logger.info(f"Packing conversation history with {len(conversation_history)} messages")
+        with span("history_build", model=route.model, history_messages=len(conversation_history)) as history_span:
+            messages = pack_messages(
+                route.model,
+                system_context,
+                history=conversation_history,
+                context_messages=context_messages,
+                user_prompt=user_prompt,
+            )
+            prefix_stats = prefix_tracker.record(route.model, messages)
+            history_span.set(
+                messages=len(messages),
+                prompt_tokens=prefix_stats["prompt_tokens"],
+                cached_prefix_tokens=prefix_stats["cached_prefix_tokens"],
+            )
+
+        return {
+            "messages": messages,
+            "search_links": search_links,
+            "search_used": search_used,
+            "prefix_stats": prefix_stats,
+            "deadline": deadline,
+            "route": route,
+            "cacheable": cacheable,
+            "cached_response": None
+        }
+
+    async def _web_search(self, search_query, quota):
+        """
+        Check the Tavily usage limit and run the web search.
+
+        Returns:
+            tuple: (search_results, search_links)
+        """
+        with span("tavily_usage_check") as usage_span:
+            usage_count, limit_exceeded = quota.usage()
+            usage_span.set(usage_count=usage_count, limit_exceeded=limit_exceeded)
+
+        if limit_exceeded:
+            logger.info("Tavily usage limit exceeded, skipping web search")
+            return get_prompt("web_search_unavailable"), []
+
+        logger.info(f"Performing Tavily search with query: '{search_query}'")
+        with span("search", query=search_query) as search_span:
+            results = await self.search_client.web_search(search_query, quota=quota)
+            if results is None:
+                return get_prompt("web_search_unavailable"), []
+            search_results, search_links = results
+            search_span.set(links=len(search_links))
+        logger.info(f"Received {len(search_links)} links from Tavily search")
+        return search_results, list(search_links)
+
+    async def _complete_turn(self, turn, context, stream=False):
+        """
+        Send the turn's final completion to its routed model, moving down the route's
+        fallback chain when a model is rate limited. Returns (model, response), model
+        being the one that answered (the hedge's model if a hedged request won).
+        """
+        last_error = None
+        chain = turn["route"].chain
+        for position, model in enumerate(chain):
+            try:
+                answered_by, response = await self._request(
+                    turn["messages"],
+                    model,
+                    context,
+                    stream=stream,
+                    deadline=turn["deadline"],
+                    # Don't sit out a long rate limit while another model could answer
+                    max_rate_limit_wait=ROUTING_MAX_QUEUE_SECONDS if position < len(chain) - 1 else None
+                )
+                return answered_by, response
+            except Exception as api_error:
+                rate_limited = isinstance(api_error, RateLimitTimeout) or classify_error(api_error) == RATE_LIMITED
+                model_usage.record_failure(model, rate_limited=rate_limited)
+                if not rate_limited or turn["deadline"].expired():
+                    raise
+                logger.warning(f"{model} is rate limited, trying the next model in the fallback chain")
+                last_error = api_error
+        raise last_error
+
+    async def _request(self, messages, model, context, temperature=0.7, max_retries=RETRY_MAX_ATTEMPTS, stream=False,
+                       deadline=None, max_rate_limit_wait=None):
+        """
+        Send a Groq chat request with the shared retry policy (jittered exponential
+        backoff honoring Retry-After, bounded by the turn deadline if given).
+        With stream=True the chunk stream is returned once its first chunk has arrived.
+        With ENABLE_HEDGED_REQUESTS, an attempt slower than the model's recent p95
+        (time to first chunk for streams, to the whole completion otherwise) is hedged with a second request (on HEDGE_FALLBACK_MODEL if set).
+        max_rate_limit_wait caps how long a rate-limited request queues or backs off
+        before the rate limit error is raised to the caller.
+        Returns (model, response), model being the one whose request answered.
+        """
+        # Validate request before sending; invalid requests aren't worth retrying
+        validate_groq_request(messages, model, temperature)
+
+        async def send(target_model, timeout):
+            started = time.monotonic()
+            kwargs = {"timeout": timeout} if timeout is not None else {}
+            max_wait = timeout
+            if max_rate_limit_wait is not None and (max_wait is None or max_rate_limit_wait < max_wait):
+                max_wait = max_rate_limit_wait
+            # Takes quota from the process-wide limiter shared by all sessions
+            response = await rate_limited_completion_async(
+                self.groq_client,
+                target_model,
+                messages,
+                max_wait=max_wait,
+                session_id=context.session_id,
+                temperature=temperature,
+                max_tokens=4000,  # Add explicit token limit
+                stream=stream,
+                **kwargs
+            )
+            if stream:
+                response = await AsyncPrimedStream.prime(response)
+            # First-chunk and whole-completion latencies are tracked separately
+            latency_tracker.record(target_model, time.monotonic() - started, stream=stream)
+            return response
+
+        async def attempt(timeout):
+            logger.info(f"Attempting Groq API request to {model}")
+            if not ENABLE_HEDGED_REQUESTS:
+                return model, await send(model, timeout)
+            hedge_model = HEDGE_FALLBACK_MODEL or model
+            response, hedged = await hedged_call_async(
+                lambda: send(model, timeout),
+                lambda: send(hedge_model, timeout),
+                latency_tracker.hedge_delay(model, stream=stream),
+            )
+            return (hedge_model if hedged else model), response
+
+        policy = default_retry_policy if max_retries == default_retry_policy.max_attempts else RetryPolicy(max_attempts=max_retries)
+        answered_by, response = await policy.call_async(
+            attempt, deadline=deadline, description=f"Groq {model} request", max_rate_limit_wait=max_rate_limit_wait
+        )
+        logger.info(f"Groq API request successful ({answered_by})")
+        return answered_by, response
+
+
+def _queue_ms(context):
+    return round((time.monotonic() - context.received_at) * 1000, 3)
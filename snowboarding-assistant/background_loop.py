@@ -0,0 +1,81 @@
+import asyncio
+import logging
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of an iterate() stream
+_DONE = object()
+
+
+class BackgroundLoop:
+    """
+    An asyncio event loop on a daemon thread, for driving coroutines from
+    synchronous code such as Streamlit script threads. Every caller shares the
+    one loop, so concurrent conversations cost a task each instead of a thread.
+
+    Coroutines run in a copy of the submitting thread's contextvars, so their
+    spans join the caller's trace.
+    """
+
+    def __init__(self, name="background-loop"):
+        self.name = name
+        self._loop = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self):
+        """The event loop, started on first use."""
+        if self._loop is None:
+            with self._lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    threading.Thread(target=loop.run_forever, name=self.name, daemon=True).start()
+                    logger.info(f"Started event loop thread {self.name}")
+                    self._loop = loop
+        return self._loop
+
+    def submit(self, coro):
+        """Schedule coro on the loop and return a concurrent.futures.Future for its result."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro):
+        """Run coro on the loop and block until it finishes; its result or exception is passed through."""
+        future = self.submit(coro)
+        try:
+            return future.result()
+        finally:
+            # The caller gave up (e.g. KeyboardInterrupt): don't leave the coroutine running
+            future.cancel()
+
+    def iterate(self, agen):
+        """
+        Iterate an async generator from synchronous code. The generator runs in
+        a single task (so context managers spanning its yields, like tracing
+        spans, enter and exit in one context) and hands items over through a
+        queue. If the caller stops early, the task is cancelled and the
+        generator's cleanup runs on the loop.
+        """
+        items = queue.Queue()
+
+        async def pump():
+            try:
+                async for item in agen:
+                    items.put(item)
+            finally:
+                try:
+                    await agen.aclose()
+                finally:
+                    items.put(_DONE)
+
+        future = self.submit(pump())
+        try:
+            while True:
+                item = items.get()
+                if item is _DONE:
+                    break
+                yield item
+            future.result()
+        finally:
+            future.cancel()
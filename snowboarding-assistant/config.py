@@ -1,8 +1,5 @@
 import os
 from dotenv import load_dotenv
-import streamlit as st
-import requests
-from datetime import datetime
 
 # Load environment variables from .env file if it exists
 load_dotenv()
@@ -12,6 +9,27 @@ load_dotenv()
 ACTION_CLASSIFIER_MODEL = os.environ.get("INTENT_CLASSIFIER_MODEL", "llama-3.1-8b-instant")
 RESPONSE_GENERATION_MODEL = os.environ.get("RESPONSE_GENERATION_MODEL", "llama-3.1-8b-instant")
 
+# Per-turn routing of the response: simple turns to the fast model, complex trip planning to the large one
+ENABLE_MODEL_ROUTING = os.environ.get("ENABLE_MODEL_ROUTING", "true").lower() == "true"
+FAST_RESPONSE_MODEL = os.environ.get("FAST_RESPONSE_MODEL", RESPONSE_GENERATION_MODEL)
+LARGE_RESPONSE_MODEL = os.environ.get("LARGE_RESPONSE_MODEL", "llama-3.3-70b-versatile")
+# Turns scoring at least this much go to the large model (one point each: trip planning, long prompt, both tools, long conversation)
+ROUTING_LARGE_MODEL_SCORE = int(os.environ.get("ROUTING_LARGE_MODEL_SCORE", "2"))
+ROUTING_LONG_PROMPT_TOKENS = int(os.environ.get("ROUTING_LONG_PROMPT_TOKENS", "150"))
+# Models tried in order when the routed model is rate limited
+MODEL_FALLBACK_CHAIN = [
+    model.strip()
+    for model in os.environ.get("MODEL_FALLBACK_CHAIN", "llama-3.3-70b-versatile,llama-3.1-8b-instant").split(",")
+    if model.strip()
+]
+# Skip a model at routing time if its rate limiter would queue the request longer than this
+ROUTING_MAX_QUEUE_SECONDS = float(os.environ.get("ROUTING_MAX_QUEUE_SECONDS", "2"))
+# USD per million (input, output) tokens, for per-model cost accounting
+MODEL_COSTS_PER_MILLION_TOKENS = {
+    "llama-3.1-8b-instant": (0.05, 0.08),
+    "llama-3.3-70b-versatile": (0.59, 0.79),
+}
+
 # Temperature settings for different tasks
 TEMPERATURE_CONFIGS = {
     "action_classifier": float(os.environ.get("ACTION_CLASSIFIER_TEMPERATURE", "0.1")),
@@ -22,22 +40,132 @@ TEMPERATURE_CONFIGS = {
 MAX_MESSAGE_COUNT = int(os.environ.get("MAX_MESSAGE_COUNT", "12"))
 RATE_LIMIT_PER_MINUTE = int(os.environ.get("RATE_LIMIT_PER_MINUTE", "20"))
 TAVILY_MONTHLY_LIMIT = int(os.environ.get("TAVILY_MONTHLY_LIMIT", "600"))
+# Tavily usage is re-synced in the background; searches in between are counted in memory
+TAVILY_USAGE_URL = "https://api.tavily.com/v1/usage"
+TAVILY_USAGE_REFRESH_SECONDS = float(os.environ.get("TAVILY_USAGE_REFRESH_SECONDS", "3600"))
+TAVILY_USAGE_TIMEOUT_SECONDS = float(os.environ.get("TAVILY_USAGE_TIMEOUT_SECONDS", "5"))
+# Search endpoint for the async engine, which calls it over its own pooled httpx client
+TAVILY_SEARCH_URL = "https://api.tavily.com/search"
+TAVILY_SEARCH_TIMEOUT_SECONDS = float(os.environ.get("TAVILY_SEARCH_TIMEOUT_SECONDS", "30"))
+
+# Groq quotas per model as (requests per minute, tokens per minute), enforced process-wide
+GROQ_DEFAULT_RPM = int(os.environ.get("GROQ_DEFAULT_RPM", "30"))
+GROQ_DEFAULT_TPM = int(os.environ.get("GROQ_DEFAULT_TPM", "6000"))
+GROQ_RATE_LIMITS = {
+    "llama-3.1-8b-instant": (
+        int(os.environ.get("GROQ_RPM_LLAMA_3_1_8B", "30")),
+        int(os.environ.get("GROQ_TPM_LLAMA_3_1_8B", "6000")),
+    ),
+    "llama-3.3-70b-versatile": (
+        int(os.environ.get("GROQ_RPM_LLAMA_3_3_70B", "30")),
+        int(os.environ.get("GROQ_TPM_LLAMA_3_3_70B", "12000")),
+    ),
+}
+# Completion tokens reserved per request until the real usage is known
+GROQ_COMPLETION_TOKEN_ESTIMATE = int(os.environ.get("GROQ_COMPLETION_TOKEN_ESTIMATE", "500"))
+# Longest a request may queue for quota before failing
+GROQ_RATE_LIMIT_MAX_WAIT_SECONDS = float(os.environ.get("GROQ_RATE_LIMIT_MAX_WAIT_SECONDS", "30"))
+
+# ===== GROQ HTTP CONNECTION POOL =====
+GROQ_KEEPALIVE_EXPIRY = float(os.environ.get("GROQ_KEEPALIVE_EXPIRY", "120"))
+GROQ_CONNECT_TIMEOUT = float(os.environ.get("GROQ_CONNECT_TIMEOUT", "5"))
+GROQ_READ_TIMEOUT = float(os.environ.get("GROQ_READ_TIMEOUT", "60"))
+GROQ_POOL_TIMEOUT = float(os.environ.get("GROQ_POOL_TIMEOUT", "10"))
+# Connection pool of each AssistantEngine's async Groq and Tavily clients; one event loop
+# multiplexes every in-flight conversation over it, keeping every connection alive
+ENGINE_MAX_CONNECTIONS = int(os.environ.get("ENGINE_MAX_CONNECTIONS", "100"))
+# Retries inside the Groq SDK; 0 leaves retrying to retry_policy so there is one backoff layer
+GROQ_SDK_MAX_RETRIES = int(os.environ.get("GROQ_SDK_MAX_RETRIES", "0"))
+
+# ===== RETRIES, DEADLINES & HEDGING =====
+RETRY_MAX_ATTEMPTS = int(os.environ.get("RETRY_MAX_ATTEMPTS", "3"))
+RETRY_BASE_DELAY_SECONDS = float(os.environ.get("RETRY_BASE_DELAY_SECONDS", "0.5"))
+RETRY_MAX_DELAY_SECONDS = float(os.environ.get("RETRY_MAX_DELAY_SECONDS", "8"))
+# Overall time budget for one user turn (classifier, tools and the final completion)
+TURN_DEADLINE_SECONDS = float(os.environ.get("TURN_DEADLINE_SECONDS", "45"))
+# Send a second request when the first hasn't produced a token within the recent p95 time-to-first-token
+ENABLE_HEDGED_REQUESTS = os.environ.get("ENABLE_HEDGED_REQUESTS", "false").lower() == "true"
+# Model for the hedged request ("" = same model as the first request)
+HEDGE_FALLBACK_MODEL = os.environ.get("HEDGE_FALLBACK_MODEL", "")
+HEDGE_MIN_DELAY_SECONDS = float(os.environ.get("HEDGE_MIN_DELAY_SECONDS", "0.5"))
+# Used until HEDGE_MIN_SAMPLES latencies have been seen for a model
+HEDGE_DEFAULT_DELAY_SECONDS = float(os.environ.get("HEDGE_DEFAULT_DELAY_SECONDS", "3"))
+HEDGE_MIN_SAMPLES = int(os.environ.get("HEDGE_MIN_SAMPLES", "20"))
+HEDGE_LATENCY_WINDOW = int(os.environ.get("HEDGE_LATENCY_WINDOW", "200"))
 
 # ===== CONVERSATION & HISTORY LIMITS =====
 MAX_HISTORY_MESSAGES = int(os.environ.get("MAX_HISTORY_MESSAGES", "8"))
+# Prompt token budgets (system prompt + tool context + history + user prompt), counted with tiktoken.
+# Kept well under the context window: Groq's per-minute token quotas are the tighter limit.
+TOKENIZER_ENCODING = os.environ.get("TOKENIZER_ENCODING", "cl100k_base")
+DEFAULT_PROMPT_TOKEN_BUDGET = int(os.environ.get("PROMPT_TOKEN_BUDGET", "6000"))
+PROMPT_TOKEN_BUDGETS = {
+    "llama-3.1-8b-instant": int(os.environ.get("PROMPT_TOKEN_BUDGET_LLAMA_3_1_8B", "6000")),
+    "llama-3.3-70b-versatile": int(os.environ.get("PROMPT_TOKEN_BUDGET_LLAMA_3_3_70B", "8000")),
+}
+# Older turns that don't fit are replaced by a summary of at most this many tokens
+HISTORY_SUMMARY_MAX_TOKENS = int(os.environ.get("HISTORY_SUMMARY_MAX_TOKENS", "200"))
+# Message prefixes remembered to measure how much of each prompt a provider prefix cache could reuse
+PREFIX_TRACKER_MAX_ENTRIES = int(os.environ.get("PREFIX_TRACKER_MAX_ENTRIES", "8192"))
 MAX_SOURCES_TO_SHOW = int(os.environ.get("MAX_SOURCES_TO_SHOW", "5"))
 MAX_SEARCH_RESULTS = int(os.environ.get("MAX_SEARCH_RESULTS", "3"))
 
+# ===== CACHING =====
+# Process-wide cache of LLM action classifier decisions (shared across sessions)
+CLASSIFIER_CACHE_MAX_ENTRIES = int(os.environ.get("CLASSIFIER_CACHE_MAX_ENTRIES", "2048"))
+CLASSIFIER_CACHE_TTL_SECONDS = float(os.environ.get("CLASSIFIER_CACHE_TTL_SECONDS", "21600"))
+
+# Process-wide Tavily search cache; TTL (seconds) depends on how quickly the topic goes stale
+SEARCH_CACHE_MAX_ENTRIES = int(os.environ.get("SEARCH_CACHE_MAX_ENTRIES", "1024"))
+SEARCH_CACHE_TTLS = {
+    "conditions": float(os.environ.get("SEARCH_CACHE_TTL_CONDITIONS", "600")),  # weather, snow reports
+    "news": float(os.environ.get("SEARCH_CACHE_TTL_NEWS", "3600")),  # prices, deals, events
+    "evergreen": float(os.environ.get("SEARCH_CACHE_TTL_EVERGREEN", "86400")),  # gear reviews, guides
+    "default": float(os.environ.get("SEARCH_CACHE_TTL_DEFAULT", "10800")),
+}
+
+# Optional on-disk (SQLite) layer under the caches above, so a restarted process starts warm
+ENABLE_PERSISTENT_CACHE = os.environ.get("ENABLE_PERSISTENT_CACHE", "false").lower() == "true"
+PERSISTENT_CACHE_PATH = os.environ.get(
+    "PERSISTENT_CACHE_PATH", os.path.join(os.path.dirname(__file__), ".cache", "assistant_cache.sqlite3")
+)
+PERSISTENT_CACHE_MAX_MB = float(os.environ.get("PERSISTENT_CACHE_MAX_MB", "64"))
+PERSISTENT_CACHE_WARM_START_ENTRIES = int(os.environ.get("PERSISTENT_CACHE_WARM_START_ENTRIES", "512"))
+
+# Semantic cache of final answers for tool-free, first-turn prompts (hashed n-gram embeddings, cosine similarity)
+ENABLE_SEMANTIC_CACHE = os.environ.get("ENABLE_SEMANTIC_CACHE", "true").lower() == "true"
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.environ.get("SEMANTIC_CACHE_MAX_ENTRIES", "1024"))
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.85"))
+SEMANTIC_CACHE_TTL_SECONDS = float(os.environ.get("SEMANTIC_CACHE_TTL_SECONDS", "86400"))
+SEMANTIC_CACHE_DIMENSIONS = int(os.environ.get("SEMANTIC_CACHE_DIMENSIONS", "2048"))
+
 # ===== LOCATION & SEARCH CONFIGURATION =====
 LOCATION_KEYWORDS = [
     "near me", "nearby", "closest", "nearest", 
     "my location", "my area", "distance", "how far"
 ]
 
+# Reverse geocoding (Nominatim) cache and throttle
+NOMINATIM_USER_AGENT = os.environ.get("NOMINATIM_USER_AGENT", "snowboarding_assistant")
+NOMINATIM_MIN_INTERVAL_SECONDS = float(os.environ.get("NOMINATIM_MIN_INTERVAL_SECONDS", "1.0"))
+GEOCODE_COORDINATE_PRECISION = int(os.environ.get("GEOCODE_COORDINATE_PRECISION", "3"))
+GEOCODE_CACHE_MAX_ENTRIES = int(os.environ.get("GEOCODE_CACHE_MAX_ENTRIES", "4096"))
+GEOCODE_CACHE_TTL_SECONDS = float(os.environ.get("GEOCODE_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+# The offline geocoder answers immediately; Nominatim refines the address in the background
+ENABLE_NOMINATIM_REFINEMENT = os.environ.get("ENABLE_NOMINATIM_REFINEMENT", "true").lower() == "true"
+# How long the script thread may wait for the Nominatim refinement (0 = never block)
+GEOCODE_WAIT_SECONDS = float(os.environ.get("GEOCODE_WAIT_SECONDS", "0"))
+
 # ===== FEATURE FLAGS =====
 ENABLE_WEB_SEARCH = os.environ.get("ENABLE_WEB_SEARCH", "true").lower() == "true"
 ENABLE_LOCATION_SERVICES = os.environ.get("ENABLE_LOCATION_SERVICES", "true").lower() == "true"
 ENABLE_SOURCE_LINKS = os.environ.get("ENABLE_SOURCE_LINKS", "true").lower() == "true"
+# Decide obvious prompts with keyword rules before calling the LLM action classifier
+ENABLE_RULE_BASED_CLASSIFIER = os.environ.get("ENABLE_RULE_BASED_CLASSIFIER", "true").lower() == "true"
+# Stream the final response token-by-token into the chat bubble
+ENABLE_STREAMING = os.environ.get("ENABLE_STREAMING", "true").lower() == "true"
+# Reload prompt templates when files in prompts/ change (watchdog observer)
+ENABLE_PROMPT_HOT_RELOAD = os.environ.get("ENABLE_PROMPT_HOT_RELOAD", "true").lower() == "true"
 COMPRESS_IMAGES = os.environ.get("COMPRESS_IMAGES", "false").lower() == "true"
 DEBUG_MODE = os.environ.get("DEBUG_MODE", "false").lower() == "true"
 
@@ -50,6 +178,12 @@ EVAL_CONFIG = {
     "track_response_times": True
 }
 
+# Per-stage tracing of each turn (recorded when EVAL_CONFIG["track_response_times"] is on).
+# Traces are appended to TRACE_EXPORT_PATH as "jsonl" (one span per line) or "otlp" (OTLP/JSON, one trace per line)
+TRACE_EXPORT_FORMAT = os.environ.get("TRACE_EXPORT_FORMAT", "jsonl").lower()
+TRACE_EXPORT_PATH = os.environ.get("TRACE_EXPORT_PATH", "")
+TRACE_STATS_WINDOW = int(os.environ.get("TRACE_STATS_WINDOW", "500"))
+
 # Function to get API keys from either environment variables or Streamlit secrets
 def get_api_key(key_name):
     env_value = os.environ.get(key_name)
@@ -57,8 +191,10 @@ def get_api_key(key_name):
         print(f"Found {key_name} in environment variables")
         return env_value
     
-    # First try to get from Streamlit secrets
+    # First try to get from Streamlit secrets (imported here so the engine runs without Streamlit)
     try:
+        import streamlit as st
+
         if key_name in st.secrets:
             print(f"Found {key_name} in Streamlit secrets")
             return st.secrets[key_name]
@@ -72,61 +208,6 @@ def get_api_key(key_name):
 TAVILY_API_KEY = get_api_key("TAVILY_API_KEY")
 GROQ_API_KEY = get_api_key("GROQ_API_KEY")
 
-# Function to check Tavily API usage
-def check_tavily_usage():
-    """
-    Check the current Tavily API usage for the month.
-    Returns:
-        tuple: (usage_count, is_limit_exceeded)
-    """
-    # Initialize session state for Tavily usage if not exists
-    if 'tavily_usage_count' not in st.session_state:
-        st.session_state.tavily_usage_count = 0
-        st.session_state.tavily_last_check = None
-    
-    # Only check once per hour to avoid excessive API calls
-    current_time = datetime.now()
-    if (st.session_state.tavily_last_check is None or 
-        (current_time - st.session_state.tavily_last_check).total_seconds() > 3600):
-        
-        try:
-            # Make API request to Tavily usage endpoint
-            headers = {
-                "Authorization": f"Bearer {TAVILY_API_KEY}"
-            }
-            response = requests.get(
-                "https://api.tavily.com/v1/usage",
-                headers=headers
-            )
-            
-            if response.status_code == 200:
-                usage_data = response.json()
-                # Extract the current month's usage
-                current_month = current_time.strftime("%Y-%m")
-                monthly_usage = 0
-                
-                # Parse the usage data - structure may vary based on Tavily's API
-                if "usage" in usage_data:
-                    for period, count in usage_data["usage"].items():
-                        if period.startswith(current_month):
-                            monthly_usage += count
-                
-                # Update session state
-                st.session_state.tavily_usage_count = monthly_usage
-                st.session_state.tavily_last_check = current_time
-                
-                print(f"Tavily API usage for current month: {monthly_usage}")
-            else:
-                print(f"Failed to get Tavily usage data: {response.status_code} - {response.text}")
-        
-        except Exception as e:
-            print(f"Error checking Tavily usage: {str(e)}")
-    
-    # Check if usage exceeds limit
-    is_limit_exceeded = st.session_state.tavily_usage_count >= TAVILY_MONTHLY_LIMIT
-    
-    return (st.session_state.tavily_usage_count, is_limit_exceeded)
-
 def get_config_summary():
     """Get a summary of current configuration for debugging/evaluation"""
     return {
@@ -1,66 +1,81 @@
-from langchain.tools import Tool
-import streamlit as st
-from geopy.distance import geodesic
+from tool_wrapper import Tool
 from tool_config import get_tool_version, get_tool_description
 from prompts import get_prompt
-import pandas as pd
-import os
+from resort_catalog import get_resort_catalog
+from spatial_index import get_resort_index
 import logging
+import re
 
 # Configure the logger
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def load_ski_resorts_data():
-    """Load ski resorts data from CSV file."""
-    csv_path = os.path.join(os.path.dirname(__file__), "ski_resorts.csv")
+# Number of closest resorts returned by the tool
+CLOSEST_RESORTS_COUNT = 5
+# Most resorts listed for a radius request ("within 100 miles")
+MAX_RADIUS_RESORTS = 15
 
-    try:
-        df = pd.read_csv(csv_path)
-        # Convert to dictionary with resort name as key and (lat, lon) as value
-        ski_resorts = {}
-        for _, row in df.iterrows():
-            ski_resorts[row['resort_name']] = (row['latitude'], row['longitude'])
-        logger.info(f"Loaded {len(ski_resorts)} ski resorts from CSV")
-        return ski_resorts
-    except Exception as e:
-        logger.error(f"Error loading ski resorts CSV: {e}")
-        # Fallback to a minimal set of resorts if CSV fails
-        return {
-            'Vail': (39.6433, -106.3781),
-            'Breckenridge': (39.4817, -106.0384),
-            'Aspen Snowmass': (39.2084, -106.9490)
-        }
+# "within 50 miles", "less than 100 mi"
+_RADIUS_PATTERN = re.compile(
+    r"\b(?:within|under|less than|inside)\s+(\d+(?:\.\d+)?)\s*(?:miles?|mi)\b", re.IGNORECASE
+)
+
+def load_ski_resorts_data():
+    """Return ski resorts data as {resort_name: (lat, lon)} from the process-wide catalog."""
+    return get_resort_catalog().as_dict()
 
 def get_resort_proximity_info(query: str = "") -> str:
     """Get user's location and return relevant information for snowboarding recommendations."""
-    print(f"🔧 Using tool: resort_distance_tool")  
-    
-    if 'user_location' not in st.session_state or not st.session_state.user_location:
+    import streamlit as st
+
+    return resort_proximity_info(st.session_state.get("user_location"), query)
+
+def proximity_filters(query):
+    """(max_miles, region, country) asked for in query, each None when not mentioned."""
+    if not query:
+        return None, None, None
+    match = _RADIUS_PATTERN.search(query)
+    region, country = get_resort_index().named_filters(query)
+    return (float(match.group(1)) if match else None), region, country
+
+def resort_proximity_info(location_data, query=""):
+    """
+    Closest resorts to location_data ({"address", "coordinates"}, as stored by the app),
+    or None without a location. Takes the location explicitly, so it works outside Streamlit.
+    A query asking for a radius ("within 50 miles") or naming a region or state/province
+    narrows the list; "scope" then describes the narrowing.
+    """
+    logger.info("Using tool: resort_distance_tool")
+
+    if not location_data:
         return None
 
     try:
-        location_data = st.session_state.user_location        
         address = location_data['address']
         
-        # Load ski resorts data from CSV file
-        ski_resorts = load_ski_resorts_data()
-        
-        # Calculate distances to all resorts
-        resort_distances = []
-        for resort, coords in ski_resorts.items():
-            distance = geodesic(location_data['coordinates'], coords).miles
-            resort_distances.append((resort, distance))
-        
-        # Sort by distance and get the 5 closest
-        resort_distances.sort(key=lambda x: x[1])
-        closest_resorts = resort_distances[:5]
+        lat, lon = location_data['coordinates']
+
+        # k-nearest or radius query against the process-wide ball tree over the resort catalog
+        max_miles, region, country = proximity_filters(query)
+        index = get_resort_index()
+        if max_miles is not None:
+            closest_resorts = index.within_radius(lat, lon, max_miles, region, country)[:MAX_RADIUS_RESORTS]
+        else:
+            closest_resorts = index.nearest(lat, lon, k=CLOSEST_RESORTS_COUNT, region=region, country=country)
         
-        # Format distances for the 5 closest resorts
+        # Format distances for the closest resorts
         result = {
             "address": address,
             "closest_resorts": {resort: distance for resort, distance in closest_resorts}
         }
+        scope = " ".join(
+            part for part in (
+                f"within {max_miles:g} miles" if max_miles is not None else None,
+                f"in {country or region}" if (country or region) else None,
+            ) if part
+        )
+        if scope:
+            result["scope"] = scope
         
         return result
     except Exception as e:
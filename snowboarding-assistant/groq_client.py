@@ -0,0 +1,51 @@
+import logging
+
+from config import (
+    GROQ_API_KEY,
+    GROQ_KEEPALIVE_EXPIRY,
+    GROQ_CONNECT_TIMEOUT,
+    GROQ_READ_TIMEOUT,
+    GROQ_POOL_TIMEOUT,
+    GROQ_SDK_MAX_RETRIES,
+    ENGINE_MAX_CONNECTIONS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def pool_settings(max_connections, max_keepalive_connections):
+    """httpx (limits, timeout) for a pooled client."""
+    import httpx
+
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive_connections,
+        keepalive_expiry=GROQ_KEEPALIVE_EXPIRY,
+    )
+    timeout = httpx.Timeout(
+        connect=GROQ_CONNECT_TIMEOUT,
+        read=GROQ_READ_TIMEOUT,
+        write=GROQ_READ_TIMEOUT,
+        pool=GROQ_POOL_TIMEOUT,
+    )
+    return limits, timeout
+
+
+def build_async_groq_client():
+    """
+    Build an AsyncGroq client on its own pooled httpx.AsyncClient. Async
+    connections belong to the event loop that opened them, so each event loop
+    (each AssistantEngine) builds its own rather than sharing a process-wide one.
+    """
+    if not GROQ_API_KEY:
+        raise ValueError("GROQ_API_KEY not found in environment variables or Streamlit secrets")
+    import httpx
+    from groq import AsyncGroq
+
+    # A busy engine keeps its whole pool warm
+    limits, timeout = pool_settings(ENGINE_MAX_CONNECTIONS, ENGINE_MAX_CONNECTIONS)
+    return AsyncGroq(
+        api_key=GROQ_API_KEY,
+        http_client=httpx.AsyncClient(limits=limits, timeout=timeout),
+        max_retries=GROQ_SDK_MAX_RETRIES,
+    )
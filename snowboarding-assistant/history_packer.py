@@ -0,0 +1,161 @@
+import logging
+import threading
+
+from config import (
+    TOKENIZER_ENCODING,
+    DEFAULT_PROMPT_TOKEN_BUDGET,
+    PROMPT_TOKEN_BUDGETS,
+    MAX_HISTORY_MESSAGES,
+    HISTORY_SUMMARY_MAX_TOKENS,
+)
+
+logger = logging.getLogger(__name__)
+
+# Chat formatting adds a few tokens per message (role markers, separators)
+MESSAGE_TOKEN_OVERHEAD = 4
+# Used when the tiktoken encoding can't be loaded (e.g. no network to fetch the BPE file)
+CHARS_PER_TOKEN_ESTIMATE = 4
+# Appended where text was cut to fit a token budget
+TRUNCATION_MARKER = "\n[...truncated]"
+# Each earlier question in a history summary is cut to this many tokens
+SUMMARY_QUESTION_MAX_TOKENS = 40
+
+_encoding = None
+_encoding_failed = False
+_encoding_lock = threading.Lock()
+
+
+def get_encoding():
+    """Return the process-wide tiktoken encoding, or None if it can't be loaded."""
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed:
+        with _encoding_lock:
+            if _encoding is None and not _encoding_failed:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+                except Exception as e:
+                    logger.warning(f"tiktoken encoding '{TOKENIZER_ENCODING}' unavailable, estimating tokens from length: {e}")
+                    _encoding_failed = True
+    return _encoding
+
+
+def count_tokens(text):
+    """
+    Count tokens in text. Llama models use their own tokenizer, so tiktoken's count
+    is an approximation; it is close enough for budgeting.
+    """
+    if not text:
+        return 0
+    encoding = get_encoding()
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN_ESTIMATE)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages):
+    """Count tokens for a list of chat messages, including per-message overhead."""
+    return sum(count_tokens(message.get("content", "")) + MESSAGE_TOKEN_OVERHEAD for message in messages)
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Cut text down to at most max_tokens, marking the cut."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    keep = max(0, max_tokens - count_tokens(TRUNCATION_MARKER))
+    encoding = get_encoding()
+    if encoding is None:
+        return text[:keep * CHARS_PER_TOKEN_ESTIMATE] + TRUNCATION_MARKER
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:keep]) + TRUNCATION_MARKER
+
+
+def get_token_budget(model):
+    """Prompt token budget for a model (PROMPT_TOKEN_BUDGETS, else the default)."""
+    return PROMPT_TOKEN_BUDGETS.get(model, DEFAULT_PROMPT_TOKEN_BUDGET)
+
+
+def summarize_turns(turns, max_tokens=HISTORY_SUMMARY_MAX_TOKENS):
+    """
+    Extractive summary of dropped turns: the user's earlier questions, newest kept
+    when they don't all fit. No LLM call, so packing adds no latency.
+    """
+    questions = [turn["content"].strip() for turn in turns if turn["role"] == "user" and turn["content"].strip()]
+    if not questions or max_tokens <= 0:
+        return None
+    header = "Summary of the conversation before the messages above. The user previously asked:"
+    lines = []
+    used = count_tokens(header)
+    for question in reversed(questions):
+        line = "- " + truncate_to_tokens(" ".join(question.split()), SUMMARY_QUESTION_MAX_TOKENS)
+        cost = count_tokens(line) + 1
+        if used + cost > max_tokens:
+            break
+        lines.append(line)
+        used += cost
+    if not lines:
+        return None
+    return "\n".join([header] + list(reversed(lines)))
+
+
+def pack_messages(model, system_prompt, history=None, context_messages=None, user_prompt=""):
+    """
+    Build the message list [system, history..., (summary), context..., user] within
+    the model's prompt token budget.
+
+    The system prompt, tool context and current prompt are always kept (tool
+    context is truncated, largest first, if they alone exceed the budget). History
+    fills what is left, newest first; older turns that don't fit are replaced by a
+    short summary when there is room for one. The summary goes after the kept
+    history, so the system prompt and history stay a stable, cacheable prefix
+    when it appears or changes.
+    """
+    budget = get_token_budget(model)
+    system_message = {"role": "system", "content": system_prompt}
+    user_message = {"role": "user", "content": user_prompt}
+    context_messages = [dict(message) for message in (context_messages or [])]
+
+    fixed_tokens = count_message_tokens([system_message, user_message] + context_messages)
+    if fixed_tokens > budget and context_messages:
+        overflow = fixed_tokens - budget
+        for message in sorted(context_messages, key=lambda m: count_tokens(m["content"]), reverse=True):
+            if overflow <= 0:
+                break
+            size = count_tokens(message["content"])
+            message["content"] = truncate_to_tokens(message["content"], max(0, size - overflow))
+            overflow -= size - count_tokens(message["content"])
+        fixed_tokens = count_message_tokens([system_message, user_message] + context_messages)
+        logger.warning(f"Tool context truncated to fit the {budget}-token budget for {model}")
+    if fixed_tokens > budget:
+        logger.warning(f"Prompt needs {fixed_tokens} tokens before history, over the {budget}-token budget for {model}")
+
+    turns = [
+        {"role": message["role"], "content": message["content"]}
+        for message in (history or [])
+        if message.get("role") in ("user", "assistant")
+    ]
+    # The current prompt is appended separately; don't send it twice
+    if turns and turns[-1]["role"] == "user" and turns[-1]["content"] == user_prompt:
+        turns.pop()
+
+    remaining = budget - fixed_tokens
+    kept = []
+    for turn in reversed(turns[-MAX_HISTORY_MESSAGES:] if MAX_HISTORY_MESSAGES > 0 else []):
+        cost = count_tokens(turn["content"]) + MESSAGE_TOKEN_OVERHEAD
+        if cost > remaining:
+            break
+        kept.append(turn)
+        remaining -= cost
+    kept.reverse()
+    # Start the history on a user turn so the exchange reads naturally
+    while kept and kept[0]["role"] != "user":
+        remaining += count_tokens(kept.pop(0)["content"]) + MESSAGE_TOKEN_OVERHEAD
+
+    dropped = turns[:len(turns) - len(kept)]
+    summary_messages = []
+    if dropped:
+        summary = summarize_turns(dropped, min(HISTORY_SUMMARY_MAX_TOKENS, remaining - MESSAGE_TOKEN_OVERHEAD))
+        if summary:
+            summary_messages.append({"role": "system", "content": summary})
+        logger.info(f"History packing kept {len(kept)} of {len(turns)} messages for {model} ({budget}-token budget)")
+
+    return [system_message] + kept + summary_messages + context_messages + [user_message]
@@ -0,0 +1,149 @@
+import logging
+import re
+import threading
+
+from config import (
+    FAST_RESPONSE_MODEL,
+    LARGE_RESPONSE_MODEL,
+    ENABLE_MODEL_ROUTING,
+    MODEL_FALLBACK_CHAIN,
+    MODEL_COSTS_PER_MILLION_TOKENS,
+    ROUTING_LONG_PROMPT_TOKENS,
+    ROUTING_LARGE_MODEL_SCORE,
+    ROUTING_MAX_QUEUE_SECONDS,
+)
+from history_packer import count_tokens
+from rate_limiter import get_rate_limiter, estimate_request_tokens
+
+logger = logging.getLogger(__name__)
+
+# Trip planning and comparison questions benefit from the larger model. One keyword is
+# weak evidence ("a board for my trip"), so it only tips a turn that has another signal
+_COMPLEX_PATTERN = re.compile(
+    r"\b(plan|planning|itinerary|trip|vacation|compare|comparison|versus|vs|budget|"
+    r"lodging|hotels?|flights?|which (resort|board|mountain) should)\b",
+    re.IGNORECASE,
+)
+
+
+class RouteDecision:
+    """The model chosen for a turn, the fallback chain behind it, and why."""
+
+    def __init__(self, model, chain, score, reasons):
+        self.model = model
+        self.chain = chain
+        self.score = score
+        self.reasons = reasons
+
+    def as_dict(self):
+        return {"model": self.model, "chain": list(self.chain), "score": self.score, "reasons": list(self.reasons)}
+
+
+def fallback_chain(model):
+    """model followed by the other models of MODEL_FALLBACK_CHAIN, in order."""
+    return [model] + [m for m in MODEL_FALLBACK_CHAIN if m != model]
+
+
+def complexity_score(user_prompt, tool_use, conversation_history=None):
+    """Score a turn from its prompt and classifier output; returns (score, reasons)."""
+    score = 0
+    reasons = []
+    if _COMPLEX_PATTERN.search(user_prompt):
+        score += 1
+        reasons.append("trip planning")
+    if count_tokens(user_prompt) > ROUTING_LONG_PROMPT_TOKENS:
+        score += 1
+        reasons.append("long prompt")
+    if tool_use.get("web_search") and tool_use.get("geolocation"):
+        score += 1
+        reasons.append("search and location")
+    if conversation_history and len(conversation_history) >= 6:
+        score += 1
+        reasons.append("long conversation")
+    return score, reasons
+
+
+def route_turn(user_prompt, tool_use, conversation_history=None, messages=None):
+    """
+    Pick the response model for a turn: FAST_RESPONSE_MODEL unless the turn
+    scores at least ROUTING_LARGE_MODEL_SCORE, then LARGE_RESPONSE_MODEL.
+    A model whose shared rate limiter would queue the request longer than
+    ROUTING_MAX_QUEUE_SECONDS is skipped for the next one in its fallback chain.
+    """
+    if not ENABLE_MODEL_ROUTING:
+        return RouteDecision(FAST_RESPONSE_MODEL, fallback_chain(FAST_RESPONSE_MODEL), 0, ["routing disabled"])
+
+    score, reasons = complexity_score(user_prompt, tool_use, conversation_history)
+    model = LARGE_RESPONSE_MODEL if score >= ROUTING_LARGE_MODEL_SCORE else FAST_RESPONSE_MODEL
+    chain = fallback_chain(model)
+
+    tokens = estimate_request_tokens(messages or [{"role": "user", "content": user_prompt}])
+    for candidate in chain:
+        if get_rate_limiter(candidate).estimated_wait(tokens) <= ROUTING_MAX_QUEUE_SECONDS:
+            if candidate != model:
+                reasons.append(f"{model} rate limited, using {candidate}")
+            model = candidate
+            break
+    chain = [model] + [m for m in chain if m != model]
+
+    logger.info(f"Routed turn to {model} (score={score}, reasons={reasons or ['simple']})")
+    return RouteDecision(model, chain, score, reasons)
+
+
+class ModelUsageStats:
+    """Per-model latency, token and cost accounting for the response models."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models = {}
+
+    def _entry(self, model):
+        return self._models.setdefault(model, {
+            "requests": 0,
+            "failures": 0,
+            "rate_limited": 0,
+            "total_latency": 0.0,
+            "total_first_token_latency": 0.0,
+            "first_token_samples": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "cost_usd": 0.0,
+        })
+
+    def record(self, model, latency, usage=None, first_token_latency=None):
+        prompt_tokens = getattr(usage, "prompt_tokens", None) or 0
+        completion_tokens = getattr(usage, "completion_tokens", None) or 0
+        input_cost, output_cost = MODEL_COSTS_PER_MILLION_TOKENS.get(model, (0.0, 0.0))
+        with self._lock:
+            entry = self._entry(model)
+            entry["requests"] += 1
+            entry["total_latency"] += latency
+            if first_token_latency is not None:
+                entry["total_first_token_latency"] += first_token_latency
+                entry["first_token_samples"] += 1
+            entry["prompt_tokens"] += prompt_tokens
+            entry["completion_tokens"] += completion_tokens
+            entry["cost_usd"] += (prompt_tokens * input_cost + completion_tokens * output_cost) / 1_000_000
+
+    def record_failure(self, model, rate_limited=False):
+        with self._lock:
+            entry = self._entry(model)
+            entry["failures"] += 1
+            if rate_limited:
+                entry["rate_limited"] += 1
+
+    def stats(self):
+        with self._lock:
+            result = {}
+            for model, entry in self._models.items():
+                stats = dict(entry)
+                stats["avg_latency"] = entry["total_latency"] / entry["requests"] if entry["requests"] else 0.0
+                stats["avg_first_token_latency"] = (
+                    entry["total_first_token_latency"] / entry["first_token_samples"]
+                    if entry["first_token_samples"] else 0.0
+                )
+                result[model] = stats
+            return result
+
+
+model_usage = ModelUsageStats()
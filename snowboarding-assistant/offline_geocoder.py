@@ -0,0 +1,70 @@
+import logging
+import os
+import threading
+
+from resort_catalog import ResortCatalog
+from spatial_index import ResortIndex, get_resort_index
+
+logger = logging.getLogger(__name__)
+
+GAZETTEER_CSV_PATH = os.path.join(os.path.dirname(__file__), "places.csv")
+
+# Within this distance the user is described as being "in" the place
+PLACE_NEARBY_MILES = 15.0
+# Within this distance of a resort, the resort is named in the address
+RESORT_NEARBY_MILES = 10.0
+
+
+class OfflineReverseGeocoder:
+    """
+    Reverse geocoder that needs no network: the nearest place from the bundled
+    gazetteer (places.csv) plus the nearest resort from ski_resorts.csv, both
+    looked up in ball-tree indexes.
+    """
+
+    def __init__(self, place_index, resort_index=None):
+        self.place_index = place_index
+        self.resort_index = resort_index
+
+    @classmethod
+    def from_csv(cls, gazetteer_path=GAZETTEER_CSV_PATH, resort_index=None):
+        places = ResortCatalog.from_csv(gazetteer_path, name_column="place_name")
+        logger.info(f"Loaded {len(places)} places from gazetteer")
+        return cls(ResortIndex(places), resort_index)
+
+    def describe_place(self, lat, lon):
+        """Return (locality_text, miles_to_place) for the nearest gazetteer place, or None."""
+        nearest = self.place_index.nearest_positions(lat, lon, k=1)
+        if not nearest:
+            return None
+        position, miles = nearest[0]
+        catalog = self.place_index.catalog
+        name, region, country = catalog.names[position], catalog.regions[position], catalog.countries[position]
+        label = ", ".join(part for part in (name, region, country) if part)
+        if miles <= PLACE_NEARBY_MILES:
+            return label, miles
+        return f"about {miles:.0f} miles from {label}", miles
+
+    def reverse(self, lat, lon):
+        """Return a human-readable address for the coordinates."""
+        place = self.describe_place(lat, lon)
+        locality = place[0] if place else f"{lat:.3f}, {lon:.3f}"
+        if self.resort_index is not None:
+            nearest_resort = self.resort_index.nearest(lat, lon, k=1)
+            if nearest_resort and nearest_resort[0][1] <= RESORT_NEARBY_MILES:
+                return f"Near {nearest_resort[0][0]} ({locality})"
+        return locality
+
+
+_geocoder = None
+_geocoder_lock = threading.Lock()
+
+
+def get_offline_geocoder():
+    """Return the process-wide offline reverse geocoder, building its indexes on first use."""
+    global _geocoder
+    if _geocoder is None:
+        with _geocoder_lock:
+            if _geocoder is None:
+                _geocoder = OfflineReverseGeocoder.from_csv(resort_index=get_resort_index())
+    return _geocoder
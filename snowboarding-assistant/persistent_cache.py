@@ -0,0 +1,205 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+from config import (
+    ENABLE_PERSISTENT_CACHE,
+    PERSISTENT_CACHE_PATH,
+    PERSISTENT_CACHE_MAX_MB,
+)
+
+try:
+    import zstandard
+except ImportError:  # zstandard is optional; fall back to zlib
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Re-check the total stored size after this many writes
+EVICTION_CHECK_INTERVAL = 64
+# When over budget, evict least recently used entries down to this fraction of max_bytes
+EVICTION_TARGET_RATIO = 0.9
+
+
+def encode_key(key):
+    """Serialize a cache key (string or tuple of JSON values) to a stable string."""
+    return json.dumps(key, separators=(",", ":"), sort_keys=True)
+
+
+def decode_key(encoded):
+    """Inverse of encode_key; JSON lists come back as tuples so they match in-memory keys."""
+    key = json.loads(encoded)
+    return tuple(key) if isinstance(key, list) else key
+
+
+class PersistentCache:
+    """
+    SQLite key/value store (WAL mode) for cache entries that should survive restarts.
+
+    Payloads are JSON, compressed with zstandard when available. Entries carry an
+    absolute expiry time, and the store is kept under max_bytes by evicting the
+    least recently accessed entries.
+    """
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = int(max_bytes)
+        self._lock = threading.Lock()
+        self._writes_since_check = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_entries ("
+            " namespace TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " codec TEXT NOT NULL,"
+            " payload BLOB NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL,"
+            " PRIMARY KEY (namespace, key))"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_cache_entries_accessed ON cache_entries (accessed_at)"
+        )
+        self._compressor = zstandard.ZstdCompressor(level=3) if zstandard else None
+        self._decompressor = zstandard.ZstdDecompressor() if zstandard else None
+
+    def _encode(self, value):
+        raw = json.dumps(value, separators=(",", ":")).encode("utf-8")
+        if self._compressor is not None:
+            return "zstd", self._compressor.compress(raw)
+        return "zlib", zlib.compress(raw)
+
+    def _decode(self, codec, payload):
+        if codec == "zstd":
+            if self._decompressor is None:
+                raise ValueError("zstandard is required to read this cache entry")
+            raw = self._decompressor.decompress(payload)
+        elif codec == "zlib":
+            raw = zlib.decompress(payload)
+        else:
+            raw = payload
+        return json.loads(raw)
+
+    def get(self, namespace, key):
+        """Return (value, remaining_ttl_seconds) for a live entry, or None."""
+        now = time.time()
+        encoded_key = encode_key(key)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT codec, payload, expires_at FROM cache_entries WHERE namespace = ? AND key = ?",
+                (namespace, encoded_key),
+            ).fetchone()
+            if row is None:
+                return None
+            codec, payload, expires_at = row
+            if expires_at <= now:
+                self._conn.execute(
+                    "DELETE FROM cache_entries WHERE namespace = ? AND key = ?", (namespace, encoded_key)
+                )
+                return None
+            self._conn.execute(
+                "UPDATE cache_entries SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                (now, namespace, encoded_key),
+            )
+        return self._decode(codec, payload), expires_at - now
+
+    def set(self, namespace, key, value, ttl_seconds):
+        """Store a JSON-serializable value for ttl_seconds."""
+        now = time.time()
+        codec, payload = self._encode(value)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache_entries"
+                " (namespace, key, codec, payload, size, expires_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (namespace, encode_key(key), codec, payload, len(payload), now + ttl_seconds, now),
+            )
+            self._writes_since_check += 1
+            if self._writes_since_check >= EVICTION_CHECK_INTERVAL:
+                self._writes_since_check = 0
+                self._evict_locked(now)
+
+    def _evict_locked(self, now):
+        self._conn.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (now,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache_entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = int(self.max_bytes * EVICTION_TARGET_RATIO)
+        freed = 0
+        doomed = []
+        for namespace, key, size in self._conn.execute(
+            "SELECT namespace, key, size FROM cache_entries ORDER BY accessed_at ASC"
+        ):
+            if total - freed <= target:
+                break
+            doomed.append((namespace, key))
+            freed += size
+        self._conn.executemany("DELETE FROM cache_entries WHERE namespace = ? AND key = ?", doomed)
+        logger.info(f"Persistent cache evicted {len(doomed)} entries ({freed} bytes)")
+
+    def evict(self):
+        """Drop expired entries and enforce the size budget now."""
+        with self._lock:
+            self._evict_locked(time.time())
+
+    def load(self, namespace, limit):
+        """
+        Return up to limit live entries as [(key, value, remaining_ttl_seconds)],
+        most recently accessed first. Used to warm in-memory caches at boot.
+        """
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, codec, payload, expires_at FROM cache_entries"
+                " WHERE namespace = ? AND expires_at > ? ORDER BY accessed_at DESC LIMIT ?",
+                (namespace, now, int(limit)),
+            ).fetchall()
+        entries = []
+        for encoded_key, codec, payload, expires_at in rows:
+            try:
+                entries.append((decode_key(encoded_key), self._decode(codec, payload), expires_at - now))
+            except Exception as e:
+                logger.warning(f"Skipping unreadable persistent cache entry in {namespace}: {e}")
+        return entries
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_persistent_cache = None
+_persistent_cache_failed = False
+_persistent_cache_lock = threading.Lock()
+
+
+def get_persistent_cache():
+    """
+    Return the process-wide persistent cache, or None when it is disabled or
+    can't be opened (the in-memory caches keep working either way).
+    """
+    global _persistent_cache, _persistent_cache_failed
+    if not ENABLE_PERSISTENT_CACHE or _persistent_cache_failed:
+        return None
+    if _persistent_cache is None:
+        with _persistent_cache_lock:
+            if _persistent_cache is None and not _persistent_cache_failed:
+                try:
+                    _persistent_cache = PersistentCache(
+                        PERSISTENT_CACHE_PATH, PERSISTENT_CACHE_MAX_MB * 1024 * 1024
+                    )
+                    logger.info(f"Opened persistent cache at {PERSISTENT_CACHE_PATH}")
+                except Exception as e:
+                    logger.error(f"Could not open persistent cache at {PERSISTENT_CACHE_PATH}: {e}")
+                    _persistent_cache_failed = True
+    return _persistent_cache
@@ -0,0 +1,107 @@
+import hashlib
+import logging
+import threading
+
+from config import PREFIX_TRACKER_MAX_ENTRIES
+from history_packer import count_tokens, MESSAGE_TOKEN_OVERHEAD
+from ttl_cache import LRUTTLCache
+
+logger = logging.getLogger(__name__)
+
+# Prefix caches on the inference side expire within minutes to hours; track reuse over a similar window
+PREFIX_TRACKER_TTL_SECONDS = 3600.0
+
+
+def _message_digest(previous, message):
+    """Chain a message onto the digest of the messages before it."""
+    h = hashlib.blake2b(previous, digest_size=16)
+    h.update(message["role"].encode("utf-8"))
+    h.update(b"\x00")
+    h.update(message["content"].encode("utf-8"))
+    h.update(b"\x00")
+    return h.digest()
+
+
+class PrefixTracker:
+    """
+    Measures how much of each request's prompt repeats a prefix already sent to
+    the same model, i.e. what a provider-side prefix/KV cache could reuse.
+
+    Every message-aligned prefix of a request is remembered by a chained hash, so
+    the reusable prefix of the next request is its longest prefix seen before (by
+    any session). Provider-reported cached tokens are accumulated alongside.
+    """
+
+    def __init__(self, max_entries=PREFIX_TRACKER_MAX_ENTRIES, ttl_seconds=PREFIX_TRACKER_TTL_SECONDS):
+        self._prefixes = LRUTTLCache("prompt_prefixes", max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.cached_prefix_tokens = 0
+        self.provider_prompt_tokens = 0
+        self.provider_cached_tokens = 0
+
+    def record(self, model, messages):
+        """
+        Record a request about to be sent and return its prefix stats:
+        {"prompt_tokens", "cached_prefix_tokens", "cached_prefix_messages", "static_prefix_tokens"}.
+        """
+        digest = hashlib.blake2b(model.encode("utf-8"), digest_size=16).digest()
+        prompt_tokens = 0
+        cached_prefix_tokens = 0
+        cached_prefix_messages = 0
+        matching = True
+        for message in messages:
+            digest = _message_digest(digest, message)
+            tokens = count_tokens(message["content"]) + MESSAGE_TOKEN_OVERHEAD
+            prompt_tokens += tokens
+            if matching and self._prefixes.get(digest) is not None:
+                cached_prefix_tokens += tokens
+                cached_prefix_messages += 1
+            else:
+                matching = False
+            self._prefixes.set(digest, True)
+
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += prompt_tokens
+            self.cached_prefix_tokens += cached_prefix_tokens
+
+        stats = {
+            "prompt_tokens": prompt_tokens,
+            "cached_prefix_tokens": cached_prefix_tokens,
+            "cached_prefix_messages": cached_prefix_messages,
+            "static_prefix_tokens": count_tokens(messages[0]["content"]) + MESSAGE_TOKEN_OVERHEAD if messages else 0,
+        }
+        logger.info(
+            f"Prompt prefix for {model}: {cached_prefix_tokens}/{prompt_tokens} tokens "
+            f"({cached_prefix_messages}/{len(messages)} messages) repeat an earlier request"
+        )
+        return stats
+
+    def record_provider_usage(self, usage):
+        """Add the provider's usage report (prompt_tokens and prompt_tokens_details.cached_tokens, if sent)."""
+        if usage is None:
+            return None
+        prompt_tokens = getattr(usage, "prompt_tokens", None) or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = getattr(details, "cached_tokens", None) or 0
+        with self._lock:
+            self.provider_prompt_tokens += prompt_tokens
+            self.provider_cached_tokens += cached_tokens
+        logger.info(f"Provider reported {cached_tokens}/{prompt_tokens} cached prompt tokens")
+        return cached_tokens
+
+    def stats(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "prompt_tokens": self.prompt_tokens,
+                "cached_prefix_tokens": self.cached_prefix_tokens,
+                "cached_prefix_rate": self.cached_prefix_tokens / self.prompt_tokens if self.prompt_tokens else 0.0,
+                "provider_prompt_tokens": self.provider_prompt_tokens,
+                "provider_cached_tokens": self.provider_cached_tokens,
+            }
+
+
+prefix_tracker = PrefixTracker()
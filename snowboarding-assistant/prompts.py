@@ -1,20 +1,203 @@
 import os
+import json
+import string
+import logging
+import threading
+
+from config import ENABLE_PROMPT_HOT_RELOAD
+
+logger = logging.getLogger(__name__)
 
 PROMPTS_DIR = os.path.join(os.path.dirname(__file__), "prompts")
+PROMPTS_JSON_PATH = os.path.join(os.path.dirname(__file__), "prompts.json")
+
+
+class PromptTemplate:
+    """A prompt loaded into memory, with its str.format fields parsed once at load time."""
+
+    def __init__(self, name, path, text, mtime):
+        self.name = name
+        self.path = path
+        self.text = text
+        self.mtime = mtime
+        self.fields = self._parse_fields(text)
+
+    @staticmethod
+    def _parse_fields(text):
+        """Return the frozenset of str.format field names, or None if the text isn't a format template."""
+        try:
+            fields = frozenset(
+                field_name.split(".")[0].split("[")[0]
+                for _, field_name, _, _ in string.Formatter().parse(text)
+                if field_name
+            )
+        except ValueError:
+            return None
+        # Prompts with literal JSON braces (e.g. action_classifier) are used verbatim
+        if not all(field.isidentifier() for field in fields):
+            return None
+        return fields
+
+    def format(self, **kwargs):
+        if self.fields is None:
+            raise ValueError(f"Prompt '{self.name}' is not a format template")
+        missing = self.fields - kwargs.keys()
+        if missing:
+            raise ValueError(f"Missing fields for prompt '{self.name}': {', '.join(sorted(missing))}")
+        return self.text.format(**kwargs)
+
+
+class PromptRegistry:
+    """
+    All prompt templates held in memory.
+
+    Templates come from prompts.json (name -> file) plus any other .txt file in the
+    prompts directory. Files are re-read only when their mtime changes, which the
+    watchdog observer started by start_watching() detects.
+    """
+
+    def __init__(self, prompts_dir=PROMPTS_DIR, manifest_path=PROMPTS_JSON_PATH):
+        self.prompts_dir = prompts_dir
+        self.manifest_path = manifest_path
+        self._templates = {}
+        self._lock = threading.Lock()
+        self._observer = None
+
+    def _read_manifest(self):
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except ValueError as e:
+            logger.error(f"Invalid prompt manifest {self.manifest_path}: {e}")
+            return {}
+
+    def _prompt_files(self):
+        """Reconcile prompts.json with the .txt files on disk; return {name: path}."""
+        manifest = self._read_manifest()
+        files = {}
+        for name, filename in manifest.items():
+            path = os.path.join(self.prompts_dir, filename)
+            if not os.path.exists(path):
+                logger.warning(f"prompts.json lists '{name}' but {path} does not exist")
+                continue
+            files[name] = path
+
+        mapped_paths = set(files.values())
+        if os.path.isdir(self.prompts_dir):
+            for filename in sorted(os.listdir(self.prompts_dir)):
+                path = os.path.join(self.prompts_dir, filename)
+                if filename.endswith(".txt") and path not in mapped_paths:
+                    logger.debug(f"Prompt file {filename} is not listed in prompts.json")
+                    files.setdefault(filename[:-4], path)
+        return files
+
+    @staticmethod
+    def _load_file(name, path):
+        mtime = os.path.getmtime(path)
+        with open(path, "r", encoding="utf-8") as f:
+            return PromptTemplate(name, path, f.read().strip(), mtime)
+
+    def load_all(self):
+        """(Re)load every template from disk."""
+        templates = {}
+        for name, path in self._prompt_files().items():
+            try:
+                templates[name] = self._load_file(name, path)
+            except OSError as e:
+                logger.error(f"Could not load prompt '{name}' from {path}: {e}")
+        with self._lock:
+            self._templates = templates
+        logger.info(f"Loaded {len(templates)} prompt templates")
+
+    def reload_changed(self):
+        """Re-read templates whose file mtime changed, and pick up added or removed files."""
+        files = self._prompt_files()
+        with self._lock:
+            current = dict(self._templates)
+        changed = False
+        for name, path in files.items():
+            template = current.get(name)
+            try:
+                mtime = os.path.getmtime(path)
+                if template is None or template.path != path or template.mtime != mtime:
+                    current[name] = self._load_file(name, path)
+                    changed = True
+                    logger.info(f"Reloaded prompt '{name}'")
+            except OSError as e:
+                logger.error(f"Could not reload prompt '{name}' from {path}: {e}")
+        for name in set(current) - set(files):
+            del current[name]
+            changed = True
+        if changed:
+            with self._lock:
+                self._templates = current
+
+    def get(self, name):
+        template = self._templates.get(name)
+        if template is None:
+            raise ValueError(f"Prompt file not found: {os.path.join(self.prompts_dir, name + '.txt')}")
+        return template
+
+    def names(self):
+        return list(self._templates)
+
+    def start_watching(self):
+        """Reload templates on file changes using watchdog; a no-op if watchdog is unavailable."""
+        if self._observer is not None:
+            return
+        try:
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            logger.warning("watchdog not installed; prompt hot reload disabled")
+            return
+
+        registry = self
+
+        class _PromptChangeHandler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                paths = [getattr(event, "src_path", ""), getattr(event, "dest_path", "")]
+                if any(str(p).endswith((".txt", ".json")) for p in paths):
+                    registry.reload_changed()
+
+        observer = Observer()
+        observer.daemon = True
+        observer.schedule(_PromptChangeHandler(), self.prompts_dir, recursive=False)
+        manifest_dir = os.path.dirname(self.manifest_path)
+        if os.path.abspath(manifest_dir) != os.path.abspath(self.prompts_dir):
+            observer.schedule(_PromptChangeHandler(), manifest_dir, recursive=False)
+        try:
+            observer.start()
+        except Exception as e:
+            logger.warning(f"Could not start prompt file watcher: {e}")
+            return
+        self._observer = observer
+        logger.info(f"Watching {self.prompts_dir} for prompt changes")
+
+
+registry = PromptRegistry()
+registry.load_all()
+if ENABLE_PROMPT_HOT_RELOAD:
+    registry.start_watching()
+
+
+def get_prompt(prompt_type, version=None):
+    """
+    Get prompt content from the in-memory registry.
+    version is accepted for call-site compatibility; prompts are not versioned yet.
+    """
+    return registry.get(prompt_type).text
+
+def format_prompt(prompt_type, **kwargs):
+    """Fill a prompt's str.format fields, raising ValueError if any are missing."""
+    return registry.get(prompt_type).format(**kwargs)
 
-def get_prompt(prompt_type):
-    """Get prompt content from text file"""
-    file_path = os.path.join(PROMPTS_DIR, f"{prompt_type}.txt")
-    try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            return f.read().strip()
-    except FileNotFoundError:
-        raise ValueError(f"Prompt file not found: {file_path}")
+def get_prompt_fields(prompt_type):
+    """Return the str.format field names a prompt expects (None if it isn't a template)."""
+    return registry.get(prompt_type).fields
 
 def list_prompt_types():
-    """List all available prompt types based on available text files"""
-    if not os.path.exists(PROMPTS_DIR):
-        return []
-    
-    prompt_files = [f for f in os.listdir(PROMPTS_DIR) if f.endswith('.txt')]
-    return [f[:-4] for f in prompt_files]  # Remove .txt extension
\ No newline at end of file
+    """List all available prompt types"""
+    return registry.names()
@@ -0,0 +1,342 @@
+import asyncio
+import itertools
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+
+from config import (
+    GROQ_RATE_LIMITS,
+    GROQ_DEFAULT_RPM,
+    GROQ_DEFAULT_TPM,
+    GROQ_COMPLETION_TOKEN_ESTIMATE,
+    GROQ_RATE_LIMIT_MAX_WAIT_SECONDS,
+)
+from history_packer import count_message_tokens
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Groq reports reset times like "2m59.56s", "7.66s" or "250ms"
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+
+
+class RateLimitTimeout(Exception):
+    """Raised when a request can't get quota within the allowed wait."""
+
+    def __init__(self, model, waited, retry_after):
+        super().__init__(f"Rate limit for {model}: no quota after waiting {waited:.1f}s (retry in {retry_after:.1f}s)")
+        self.model = model
+        self.retry_after = retry_after
+
+
+def parse_duration(value):
+    """Parse a Retry-After / x-ratelimit-reset value into seconds, or None."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts)
+
+
+def current_session_id():
+    """Streamlit session of the calling thread (tool threads carry their caller's context)."""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx(suppress_warning=True)
+    except Exception:
+        ctx = None
+    if ctx is not None:
+        return ctx.session_id
+    return threading.current_thread().name
+
+
+class TokenBucket:
+    """Continuous-refill token bucket. Not thread-safe; ModelRateLimiter holds the lock."""
+
+    def __init__(self, capacity, per_seconds=60.0):
+        self.capacity = float(capacity)
+        self.rate = self.capacity / per_seconds
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """Seconds until amount is available (amounts above capacity only need a full bucket)."""
+        needed = min(amount, self.capacity) - self.level
+        return max(0.0, needed / self.rate) if self.rate > 0 else float("inf")
+
+
+class ModelRateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute buckets for one Groq model, shared
+    by every session in the process.
+
+    Waiters queue per session and sessions are served round-robin, so a session
+    with many requests in flight can't starve the others. Only the ticket at the
+    head of the rotation may take quota, and only it sleeps for the computed wait;
+    everyone else waits on its own future, set when it becomes the head.
+    """
+
+    def __init__(self, model, rpm, tpm):
+        self.model = model
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+        self._queues = OrderedDict()  # session_id -> deque of tickets, in rotation order
+        self._waiters = {}  # ticket -> (loop, future) of a sleeping acquire_async
+        self._tickets = itertools.count()
+        self.granted = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.penalties = 0
+
+    def _enqueue(self, session_id):
+        ticket = next(self._tickets)
+        self._queues.setdefault(session_id, deque()).append(ticket)
+        return ticket
+
+    def _head(self):
+        for session_id, tickets in self._queues.items():
+            return session_id, tickets[0]
+        return None, None
+
+    def _remove(self, session_id, ticket, granted):
+        tickets = self._queues.get(session_id)
+        if tickets is None:
+            return
+        was_head = self._head() == (session_id, ticket)
+        try:
+            tickets.remove(ticket)
+        except ValueError:
+            return
+        if not tickets:
+            del self._queues[session_id]
+        elif granted:
+            # Served: the session goes to the back of the rotation
+            self._queues.move_to_end(session_id)
+        if was_head:
+            self._wake_head()
+
+    def _wake_head(self):
+        """Wake the waiter at the head of the rotation so it can take (or time) its quota."""
+        _, ticket = self._head()
+        waiter = self._waiters.pop(ticket, None)
+        if waiter is not None:
+            loop, woken = waiter
+            loop.call_soon_threadsafe(_set_woken, woken)
+
+    def _poll(self, session_id, ticket, tokens):
+        """Try to grant ticket; return 0.0 if granted, else the suggested wait in seconds."""
+        now = time.monotonic()
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        if self._head() != (session_id, ticket):
+            return None
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        wait = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+        if wait > 0:
+            return wait
+        self.requests.level -= 1
+        self.tokens.level -= tokens
+        self._remove(session_id, ticket, granted=True)
+        return 0.0
+
+    def _record_grant(self, waited):
+        self.granted += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+        if waited > 0.05:
+            logger.info(f"Rate limiter for {self.model} queued a request for {waited:.2f}s")
+
+    async def acquire_async(self, tokens, session_id=None, timeout=GROQ_RATE_LIMIT_MAX_WAIT_SECONDS):
+        """Wait until one request and tokens are available; raise RateLimitTimeout after timeout."""
+        session_id = session_id or current_session_id()
+        loop = asyncio.get_running_loop()
+        start = time.monotonic()
+        with self._lock:
+            ticket = self._enqueue(session_id)
+        try:
+            while True:
+                with self._lock:
+                    wait = self._poll(session_id, ticket, tokens)
+                    waited = time.monotonic() - start
+                    if wait == 0.0:
+                        self._record_grant(waited)
+                        return
+                    if waited >= timeout:
+                        raise RateLimitTimeout(self.model, waited, wait or 0.0)
+                    # Registered under the lock, so a grant or removal can't slip in before us
+                    woken = loop.create_future()
+                    self._waiters[ticket] = (loop, woken)
+                # The head sleeps until its quota refills (or settle() returns tokens early);
+                # everyone else sleeps until it becomes the head
+                sleep = timeout - waited if wait is None else min(timeout - waited, wait)
+                try:
+                    await asyncio.wait_for(woken, sleep)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            # Timed out or cancelled: a ticket left at the head would block every later request
+            with self._lock:
+                self._remove(session_id, ticket, granted=False)
+            raise
+        finally:
+            with self._lock:
+                self._waiters.pop(ticket, None)
+
+    def estimated_wait(self, tokens):
+        """Seconds a new request for tokens would wait right now, ignoring anyone already queued."""
+        with self._lock:
+            now = time.monotonic()
+            self.requests.refill(now)
+            self.tokens.refill(now)
+            return max(
+                self._blocked_until - now,
+                self.requests.wait_time(1),
+                self.tokens.wait_time(tokens),
+            )
+
+    def settle(self, reserved_tokens, actual_tokens):
+        """Correct the token bucket once the real usage of a request is known."""
+        with self._lock:
+            self.tokens.level = min(self.tokens.capacity, self.tokens.level + reserved_tokens - actual_tokens)
+            # Returned tokens may let the head go sooner than it planned
+            self._wake_head()
+
+    def penalize(self, retry_after):
+        """Hold every request for this model until retry_after seconds from now (from a 429)."""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+            self.penalties += 1
+        logger.warning(f"Groq rate limited {self.model}; pausing requests for {retry_after:.1f}s")
+
+    def update_from_headers(self, headers):
+        """Sync the buckets with Groq's x-ratelimit-* response headers."""
+        if not headers:
+            return
+        now = time.monotonic()
+        with self._lock:
+            for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+                remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+                if remaining is None:
+                    continue
+                try:
+                    remaining = float(remaining)
+                except ValueError:
+                    continue
+                bucket.refill(now)
+                # Other processes may share the key: never report more than Groq does
+                bucket.level = min(bucket.level, remaining)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "model": self.model,
+                "granted": self.granted,
+                "waiting": sum(len(tickets) for tickets in self._queues.values()),
+                "avg_wait": self.total_wait / self.granted if self.granted else 0.0,
+                "max_wait": self.max_wait,
+                "penalties": self.penalties,
+                "requests_available": self.requests.level,
+                "tokens_available": self.tokens.level,
+            }
+
+
+def _set_woken(future):
+    if not future.done():
+        future.set_result(None)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(model):
+    """Return the process-wide limiter for a model (quotas from GROQ_RATE_LIMITS)."""
+    limiter = _limiters.get(model)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(model)
+            if limiter is None:
+                rpm, tpm = GROQ_RATE_LIMITS.get(model, (GROQ_DEFAULT_RPM, GROQ_DEFAULT_TPM))
+                limiter = _limiters[model] = ModelRateLimiter(model, rpm, tpm)
+    return limiter
+
+
+def get_rate_limiter_stats():
+    return [limiter.stats() for limiter in list(_limiters.values())]
+
+
+def retry_after_from_error(error):
+    """Seconds to wait according to a failed response's headers (Retry-After, then x-ratelimit-reset-*)."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    for name in ("retry-after", "x-ratelimit-reset-requests", "x-ratelimit-reset-tokens"):
+        seconds = parse_duration(headers.get(name))
+        if seconds is not None:
+            return seconds
+    return None
+
+
+def is_rate_limit_error(error):
+    return getattr(error, "status_code", None) == 429 or getattr(getattr(error, "response", None), "status_code", None) == 429
+
+
+def estimate_request_tokens(messages, max_tokens=None):
+    """Tokens to reserve for a request: the prompt plus an expected completion length."""
+    completion = GROQ_COMPLETION_TOKEN_ESTIMATE if max_tokens is None else min(max_tokens, GROQ_COMPLETION_TOKEN_ESTIMATE)
+    return count_message_tokens(messages) + completion
+
+
+async def rate_limited_completion_async(groq_client, model, messages, max_wait=None, session_id=None, **kwargs):
+    """
+    Await groq_client.chat.completions.create (an AsyncGroq) after taking quota
+    from the model's shared limiter, queueing on the event loop for at most
+    GROQ_RATE_LIMIT_MAX_WAIT_SECONDS (or max_wait, if shorter); the caller's
+    session_id decides its turn in the fair queue. Response headers keep the
+    limiter in sync with Groq, and a 429 pauses the model for the Retry-After the
+    server sent before re-raising.
+    """
+    limiter = get_rate_limiter(model)
+    reserved = estimate_request_tokens(messages, kwargs.get("max_tokens"))
+    if max_wait is None or max_wait > GROQ_RATE_LIMIT_MAX_WAIT_SECONDS:
+        max_wait = GROQ_RATE_LIMIT_MAX_WAIT_SECONDS
+    with span("groq_request", model=model, stream=bool(kwargs.get("stream")), reserved_tokens=reserved) as request_span:
+        queued = time.monotonic()
+        await limiter.acquire_async(reserved, session_id=session_id, timeout=max_wait)
+        request_span.set(queue_ms=round((time.monotonic() - queued) * 1000, 3))
+        completions = groq_client.chat.completions
+        try:
+            raw_api = getattr(completions, "with_raw_response", None)
+            if raw_api is not None:
+                raw = await raw_api.create(messages=messages, model=model, **kwargs)
+                limiter.update_from_headers(raw.headers)
+                response = await raw.parse()
+            else:
+                response = await completions.create(messages=messages, model=model, **kwargs)
+        except Exception as e:
+            if is_rate_limit_error(e):
+                limiter.penalize(retry_after_from_error(e) or 1.0)
+            raise
+        usage = getattr(response, "usage", None)
+        request_span.set_usage(usage)
+    total_tokens = getattr(usage, "total_tokens", None)
+    if isinstance(total_tokens, int):
+        limiter.settle(reserved, total_tokens)
+    return response
@@ -0,0 +1,200 @@
+import csv
+import os
+import logging
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+RESORTS_CSV_PATH = os.path.join(os.path.dirname(__file__), "ski_resorts.csv")
+
+# CSVs from this size up are parsed with pandas (~1000 resort rows); below it the
+# csv module is faster and pandas is never imported
+CSV_PANDAS_MIN_BYTES = 64 * 1024
+
+# Mean Earth radius; haversine on a sphere stays within ~0.5% of the WGS-84 geodesic
+EARTH_RADIUS_MILES = 3958.7613
+
+# Minimal set of resorts used if the CSV can't be read
+FALLBACK_RESORTS = [
+    ("Vail", 39.6433, -106.3781, "Rocky Mountains", "Colorado"),
+    ("Breckenridge", 39.4817, -106.0384, "Rocky Mountains", "Colorado"),
+    ("Aspen Snowmass", 39.2084, -106.9490, "Rocky Mountains", "Colorado"),
+]
+
+
+def _to_unit_vectors(lat_rad, lon_rad):
+    """Convert latitude/longitude in radians to 3D unit vectors (x, y, z)."""
+    cos_lat = np.cos(lat_rad)
+    return np.ascontiguousarray(
+        np.stack([cos_lat * np.cos(lon_rad), cos_lat * np.sin(lon_rad), np.sin(lat_rad)], axis=-1)
+    )
+
+
+def haversine_miles(lat0_rad, lon0_rad, lat_rad, lon_rad, cos_lat=None):
+    """Vectorized haversine distance in miles from one point to arrays of points (all in radians)."""
+    if cos_lat is None:
+        cos_lat = np.cos(lat_rad)
+    sin_dlat = np.sin((lat_rad - lat0_rad) * 0.5)
+    sin_dlon = np.sin((lon_rad - lon0_rad) * 0.5)
+    a = sin_dlat * sin_dlat + np.cos(lat0_rad) * cos_lat * sin_dlon * sin_dlon
+    return 2.0 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+_COORDINATE_COLUMNS = ("latitude", "longitude")
+
+
+def _read_columns_csv(csv_path):
+    """Read a CSV into {column: values}, coordinates as float64 arrays."""
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        rows = list(reader)
+    values = list(zip(*rows)) if rows else [()] * len(header)
+    columns = {name: list(column) for name, column in zip(header, values)}
+    for name in _COORDINATE_COLUMNS:
+        if name in columns:
+            columns[name] = np.array(columns[name], dtype=np.float64)
+    return columns
+
+
+def _read_columns_pandas(csv_path):
+    """Same as _read_columns_csv, parsed by pandas for large files."""
+    import pandas as pd
+
+    # Blank cells stay "" as with the csv module; text columns that parsed as numbers go back to str
+    df = pd.read_csv(csv_path, keep_default_na=False)
+    columns = {}
+    for name in df.columns:
+        if name in _COORDINATE_COLUMNS:
+            columns[name] = df[name].to_numpy(dtype=np.float64)
+        elif df[name].dtype == object:
+            columns[name] = df[name].to_numpy(dtype=object)
+        else:
+            columns[name] = df[name].astype(str).to_numpy(dtype=object)
+    return columns
+
+
+class ResortCatalog:
+    """
+    Ski resorts stored as contiguous NumPy arrays for vectorized distance queries.
+
+    Coordinates are converted to radians once at load time so a nearest-resort
+    query is a handful of array operations, independent of Python-level loops.
+    """
+
+    def __init__(self, names, latitudes, longitudes, regions=None, countries=None):
+        self.names = np.asarray(names, dtype=object)
+        self.latitudes = np.ascontiguousarray(latitudes, dtype=np.float64)
+        self.longitudes = np.ascontiguousarray(longitudes, dtype=np.float64)
+        size = len(self.names)
+        self.regions = np.asarray(regions if regions is not None else [""] * size, dtype=object)
+        self.countries = np.asarray(countries if countries is not None else [""] * size, dtype=object)
+
+        if not (len(self.latitudes) == len(self.longitudes) == len(self.regions) == len(self.countries) == size):
+            raise ValueError("Resort catalog columns must all have the same length")
+
+        # Precomputed trigonometry used by the haversine kernel
+        self.lat_rad = np.radians(self.latitudes)
+        self.lon_rad = np.radians(self.longitudes)
+        self.cos_lat = np.cos(self.lat_rad)
+
+        # Unit vectors on the sphere: ranking by dot product is equivalent to ranking by
+        # great-circle distance and costs a single matrix-vector product
+        self.unit_vectors = _to_unit_vectors(self.lat_rad, self.lon_rad)
+
+    @classmethod
+    def from_csv(cls, csv_path=RESORTS_CSV_PATH, name_column="resort_name"):
+        """
+        Build a catalog from a CSV with name, latitude, longitude, region, country columns.
+        name_column lets other point catalogs (e.g. the place gazetteer) reuse this loader.
+        Small files are read with the csv module, which beats pandas at that size and
+        keeps pandas off the app's cold start; larger ones go through pandas' C parser.
+        """
+        if os.path.getsize(csv_path) >= CSV_PANDAS_MIN_BYTES:
+            columns = _read_columns_pandas(csv_path)
+        else:
+            columns = _read_columns_csv(csv_path)
+        if name_column not in columns or "latitude" not in columns or "longitude" not in columns:
+            raise ValueError(f"{csv_path} needs {name_column}, latitude and longitude columns")
+        return cls(
+            names=columns[name_column],
+            latitudes=columns["latitude"],
+            longitudes=columns["longitude"],
+            regions=columns.get("region"),
+            countries=columns.get("country"),
+        )
+
+    @classmethod
+    def fallback(cls):
+        """Build the minimal built-in catalog."""
+        names, lats, lons, regions, countries = zip(*FALLBACK_RESORTS)
+        return cls(names, lats, lons, regions, countries)
+
+    def __len__(self):
+        return len(self.names)
+
+    def distances_miles(self, lat, lon, idx=None):
+        """
+        Haversine distance in miles from (lat, lon) to every resort, or only to the
+        resorts at positions idx when given.
+        """
+        lat_rad = self.lat_rad if idx is None else self.lat_rad[idx]
+        lon_rad = self.lon_rad if idx is None else self.lon_rad[idx]
+        cos_lat = self.cos_lat if idx is None else self.cos_lat[idx]
+        return haversine_miles(np.radians(lat), np.radians(lon), lat_rad, lon_rad, cos_lat)
+
+    def nearest(self, lat, lon, k=5):
+        """
+        Return the k closest resorts as a list of (resort_name, distance_miles), closest first.
+
+        Candidates are ranked by dot product with the query's unit vector, the top-k is
+        selected with argpartition, and haversine distances are computed for those k only.
+        """
+        size = len(self)
+        if size == 0 or k <= 0:
+            return []
+
+        query = _to_unit_vectors(np.radians(lat), np.radians(lon))
+        similarity = self.unit_vectors @ query
+        if k < size:
+            idx = np.argpartition(-similarity, k - 1)[:k]
+        else:
+            idx = np.arange(size)
+
+        miles = self.distances_miles(lat, lon, idx)
+        order = np.argsort(miles, kind="stable")
+        return [(self.names[idx[i]], float(miles[i])) for i in order]
+
+    def as_dict(self):
+        """Return the catalog as {resort_name: (lat, lon)}."""
+        return {
+            name: (float(lat), float(lon))
+            for name, lat, lon in zip(self.names, self.latitudes, self.longitudes)
+        }
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def load_resort_catalog(csv_path=RESORTS_CSV_PATH):
+    """Load a catalog from CSV, falling back to the built-in minimal set on error."""
+    try:
+        catalog = ResortCatalog.from_csv(csv_path)
+        logger.info(f"Loaded {len(catalog)} ski resorts from CSV")
+        return catalog
+    except Exception as e:
+        logger.error(f"Error loading ski resorts CSV: {e}")
+        return ResortCatalog.fallback()
+
+
+def get_resort_catalog():
+    """Return the process-wide resort catalog, loading it on first use."""
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = load_resort_catalog()
+    return _catalog
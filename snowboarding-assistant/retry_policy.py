@@ -0,0 +1,267 @@
+import asyncio
+import inspect
+import logging
+import random
+import sys
+import threading
+import time
+from collections import deque
+
+from config import (
+    GROQ_READ_TIMEOUT,
+    RETRY_MAX_ATTEMPTS,
+    RETRY_BASE_DELAY_SECONDS,
+    RETRY_MAX_DELAY_SECONDS,
+    HEDGE_MIN_DELAY_SECONDS,
+    HEDGE_DEFAULT_DELAY_SECONDS,
+    HEDGE_MIN_SAMPLES,
+    HEDGE_LATENCY_WINDOW,
+)
+from rate_limiter import RateLimitTimeout, retry_after_from_error
+
+logger = logging.getLogger(__name__)
+
+# Error classes, decided by exception type (never by message text)
+RATE_LIMITED = "rate_limited"
+SERVER_ERROR = "server_error"
+CONNECTION_ERROR = "connection_error"
+TIMEOUT = "timeout"
+FATAL = "fatal"
+RETRYABLE = {RATE_LIMITED, SERVER_ERROR, CONNECTION_ERROR, TIMEOUT}
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a turn's overall time budget runs out before a request succeeds."""
+
+
+class Deadline:
+    """Overall time budget for one user turn, shared by every request the turn makes."""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0.0
+
+
+def classify_error(error):
+    """Map an exception from a Groq call to one of the error classes above."""
+    if isinstance(error, RateLimitTimeout):
+        # The limiter already queued for the longest we allow
+        return FATAL
+    # groq is imported with the first client; before that no error can be a Groq error
+    groq = sys.modules.get("groq")
+    if groq is None:
+        return FATAL
+    if isinstance(error, groq.RateLimitError):
+        return RATE_LIMITED
+    if isinstance(error, groq.APITimeoutError):
+        return TIMEOUT
+    if isinstance(error, groq.APIConnectionError):
+        return CONNECTION_ERROR
+    if isinstance(error, groq.InternalServerError):
+        return SERVER_ERROR
+    if isinstance(error, groq.APIStatusError):
+        # 408 Request Timeout and 409 Conflict are transient; other 4xx won't change on retry
+        if error.status_code in (408, 409):
+            return TIMEOUT
+        return SERVER_ERROR if error.status_code >= 500 else FATAL
+    return FATAL
+
+
+class RetryPolicy:
+    """
+    Retries with full-jitter exponential backoff. A Retry-After from the server
+    takes precedence over the computed delay; only error classes in RETRYABLE are
+    retried, and no retry is started that would end past the deadline.
+    """
+
+    def __init__(self, max_attempts=RETRY_MAX_ATTEMPTS, base_delay=RETRY_BASE_DELAY_SECONDS,
+                 max_delay=RETRY_MAX_DELAY_SECONDS):
+        self.max_attempts = max(1, int(max_attempts))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff(self, attempt):
+        """Delay before retry number attempt (1-based): uniform in [0, min(max_delay, base * 2^attempt)]."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def delay_for(self, attempt, error):
+        retry_after = retry_after_from_error(error)
+        if retry_after is not None:
+            return retry_after
+        return self.backoff(attempt)
+
+    def attempt_timeout(self, attempt, deadline):
+        """
+        Request timeout for attempt (0-based): an even share of the time left on the
+        deadline across the attempts still to come, at most GROQ_READ_TIMEOUT. A hung
+        first attempt then leaves time for the retries. None without a deadline.
+        """
+        if deadline is None:
+            return None
+        return min(deadline.remaining() / (self.max_attempts - attempt), GROQ_READ_TIMEOUT)
+
+    async def call_async(self, fn, deadline=None, description="request", max_rate_limit_wait=None):
+        """
+        Await fn(timeout) until it succeeds, retrying transient failures after an
+        asyncio.sleep. timeout is the attempt_timeout for use as a per-attempt
+        request timeout. A rate limit whose Retry-After exceeds max_rate_limit_wait
+        is raised instead of waited out (the caller has somewhere else to go).
+        """
+        for attempt in range(self.max_attempts):
+            self._check_deadline(deadline, description)
+            try:
+                return await fn(self.attempt_timeout(attempt, deadline))
+            except Exception as e:
+                delay = self._retry_delay(attempt, e, deadline, description, max_rate_limit_wait)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+
+    @staticmethod
+    def _check_deadline(deadline, description):
+        if deadline is not None and deadline.expired():
+            raise DeadlineExceeded(f"{description}: turn deadline of {deadline.seconds:.0f}s exceeded")
+
+    def _retry_delay(self, attempt, error, deadline, description, max_rate_limit_wait):
+        """Seconds to wait before retrying after error on attempt (0-based), or None to raise it."""
+        error_class = classify_error(error)
+        if error_class not in RETRYABLE or attempt == self.max_attempts - 1:
+            return None
+        delay = self.delay_for(attempt + 1, error)
+        if error_class == RATE_LIMITED and max_rate_limit_wait is not None and delay > max_rate_limit_wait:
+            return None
+        if deadline is not None and delay >= deadline.remaining():
+            logger.warning(f"{description} failed ({error_class}); no time left on the deadline to retry")
+            return None
+        logger.warning(
+            f"{description} attempt {attempt + 1}/{self.max_attempts} failed ({error_class}: "
+            f"{type(error).__name__}); retrying in {delay:.2f}s"
+        )
+        return delay
+
+
+default_retry_policy = RetryPolicy()
+
+
+class LatencyTracker:
+    """
+    Recent response latencies per model, kept apart by kind: time to first chunk
+    for streams, time to the whole completion otherwise. The p95 of the window is
+    the hedge delay: a request slower than 95% of recent ones of its kind gets a hedge.
+    """
+
+    def __init__(self, window=HEDGE_LATENCY_WINDOW):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, model, seconds, stream=False):
+        with self._lock:
+            self._samples.setdefault((model, stream), deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, model, q, stream=False):
+        with self._lock:
+            samples = sorted(self._samples.get((model, stream), ()))
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q / 100.0 * len(samples)))]
+
+    def hedge_delay(self, model, stream=False):
+        with self._lock:
+            count = len(self._samples.get((model, stream), ()))
+        if count < HEDGE_MIN_SAMPLES:
+            return HEDGE_DEFAULT_DELAY_SECONDS
+        return max(HEDGE_MIN_DELAY_SECONDS, self.percentile(model, 95, stream))
+
+
+latency_tracker = LatencyTracker()
+
+
+class AsyncPrimedStream:
+    """
+    An AsyncGroq chat stream whose first chunk has already arrived (time to first
+    chunk is known); build it with await AsyncPrimedStream.prime(stream).
+    """
+
+    def __init__(self, stream, iterator, first):
+        self._stream = stream
+        self._iterator = iterator
+        self._first = first
+
+    @classmethod
+    async def prime(cls, stream):
+        iterator = stream.__aiter__()
+        try:
+            first = await iterator.__anext__()
+        except StopAsyncIteration:
+            first = None
+        return cls(stream, iterator, first)
+
+    async def __aiter__(self):
+        if self._first is not None:
+            first, self._first = self._first, None
+            yield first
+        async for chunk in self._iterator:
+            yield chunk
+
+    async def aclose(self):
+        await close_response_async(self._stream)
+
+
+async def close_response_async(response):
+    """Release a response we won't use (e.g. the losing side of a hedge); its close() may be a coroutine."""
+    close = getattr(response, "aclose", None) or getattr(response, "close", None)
+    if close is not None:
+        try:
+            result = close()
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            logger.debug(f"Closing discarded response failed: {e}")
+
+
+hedge_stats = {"hedged": 0, "hedge_wins": 0}
+_hedge_stats_lock = threading.Lock()
+
+
+async def hedged_call_async(primary, hedge, delay):
+    """
+    Await primary(); if it hasn't returned within delay seconds, also start hedge()
+    and return (result, hedged) for whichever succeeds first, hedged being True when
+    hedge() won. Both run as tasks on the caller's event loop, and the loser is
+    cancelled (or its response closed if it also finished).
+    """
+    first = asyncio.ensure_future(primary())
+    done, _ = await asyncio.wait({first}, timeout=delay)
+    if done:
+        return first.result(), False
+
+    logger.info(f"No response after {delay:.2f}s, sending a hedged request")
+    second = asyncio.ensure_future(hedge())
+    with _hedge_stats_lock:
+        hedge_stats["hedged"] += 1
+    pending = {first, second}
+    errors = []
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            winners = [task for task in done if task.exception() is None]
+            errors.extend(task.exception() for task in done if task.exception() is not None)
+            if winners:
+                for loser in winners[1:]:
+                    await close_response_async(loser.result())
+                hedged = winners[0] is second
+                if hedged:
+                    with _hedge_stats_lock:
+                        hedge_stats["hedge_wins"] += 1
+                return winners[0].result(), hedged
+        raise errors[0]
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,151 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+from config import (
+    NOMINATIM_USER_AGENT,
+    NOMINATIM_MIN_INTERVAL_SECONDS,
+    GEOCODE_COORDINATE_PRECISION,
+    GEOCODE_CACHE_MAX_ENTRIES,
+    GEOCODE_CACHE_TTL_SECONDS,
+    GEOCODE_WAIT_SECONDS,
+    ENABLE_NOMINATIM_REFINEMENT,
+    PERSISTENT_CACHE_WARM_START_ENTRIES,
+)
+from persistent_cache import get_persistent_cache
+from ttl_cache import LRUTTLCache
+from offline_geocoder import get_offline_geocoder
+
+logger = logging.getLogger(__name__)
+
+# Addresses keyed on quantized (lat, lon), shared across sessions and persisted when enabled
+geocode_cache = LRUTTLCache(
+    "reverse_geocode",
+    max_entries=GEOCODE_CACHE_MAX_ENTRIES,
+    ttl_seconds=GEOCODE_CACHE_TTL_SECONDS,
+    persistent=get_persistent_cache(),
+    warm_start_entries=PERSISTENT_CACHE_WARM_START_ENTRIES,
+)
+
+# Lookups waiting for the Nominatim worker, keyed like the cache so duplicates share one request
+_pending = {}
+_pending_lock = threading.Lock()
+_requests = queue.Queue()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def quantize_coordinates(lat, lon, precision=GEOCODE_COORDINATE_PRECISION):
+    """Round coordinates so nearby positions share a cache entry (3 decimals is roughly 100 m)."""
+    return (round(float(lat), precision), round(float(lon), precision))
+
+
+def format_coordinates(lat, lon):
+    """Plain-text address used when no place name can be found."""
+    return f"{lat:.3f}, {lon:.3f}"
+
+
+def _make_geolocator():
+    """The geopy Nominatim client, imported on the worker thread so geopy stays off the cold start."""
+    from geopy.geocoders import Nominatim
+
+    return Nominatim(user_agent=NOMINATIM_USER_AGENT, timeout=10)
+
+
+def _nominatim_worker():
+    """
+    Serve queued lookups one at a time, spacing Nominatim requests at least
+    NOMINATIM_MIN_INTERVAL_SECONDS apart (their usage policy allows 1 req/s).
+    """
+    geolocator = None
+    last_request = 0.0
+    while True:
+        key = _requests.get()
+        with _pending_lock:
+            future = _pending.get(key)
+        try:
+            address = geocode_cache.get(key)
+            if address is None:
+                wait = last_request + NOMINATIM_MIN_INTERVAL_SECONDS - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+                # Built on first use inside the try: if geopy can't load, this lookup fails
+                # and the next one tries again, instead of the worker dying with lookups queued
+                if geolocator is None:
+                    geolocator = _make_geolocator()
+                try:
+                    location = geolocator.reverse(key)
+                finally:
+                    last_request = time.monotonic()
+                address = location.address if location is not None else offline_address(*key)
+                geocode_cache.set(key, address)
+            if future is not None:
+                future.set_result(address)
+        except Exception as e:
+            logger.error(f"Reverse geocoding failed for {key}: {e}")
+            if future is not None:
+                future.set_exception(e)
+        finally:
+            with _pending_lock:
+                _pending.pop(key, None)
+
+
+def _ensure_worker():
+    global _worker
+    if _worker is None:
+        with _worker_lock:
+            if _worker is None:
+                _worker = threading.Thread(target=_nominatim_worker, name="nominatim-throttle", daemon=True)
+                _worker.start()
+
+
+def request_reverse_geocode(lat, lon):
+    """Queue a throttled Nominatim lookup (deduplicated) and return a Future for the address."""
+    key = quantize_coordinates(lat, lon)
+    with _pending_lock:
+        future = _pending.get(key)
+        if future is not None:
+            return future
+        future = Future()
+        _pending[key] = future
+    _ensure_worker()
+    _requests.put(key)
+    return future
+
+
+def offline_address(lat, lon):
+    """Address from the bundled gazetteer and resort catalog; no network, microseconds."""
+    try:
+        return get_offline_geocoder().reverse(lat, lon)
+    except Exception as e:
+        logger.error(f"Offline reverse geocoding failed: {e}")
+        return format_coordinates(lat, lon)
+
+
+def reverse_geocode(lat, lon, wait_seconds=GEOCODE_WAIT_SECONDS):
+    """
+    Return a human-readable address for the coordinates.
+
+    Served from the cache when a Nominatim address is already known. Otherwise the
+    offline geocoder answers immediately, and (if ENABLE_NOMINATIM_REFINEMENT) a
+    Nominatim lookup is queued on the process-wide throttled worker as a refinement
+    that lands in the cache for the next rerun. wait_seconds > 0 lets a caller wait
+    that long for the refinement before settling for the offline address.
+    """
+    key = quantize_coordinates(lat, lon)
+    address = geocode_cache.get(key)
+    if address is not None:
+        return address
+
+    if ENABLE_NOMINATIM_REFINEMENT:
+        future = request_reverse_geocode(lat, lon)
+        if wait_seconds > 0:
+            try:
+                return future.result(timeout=wait_seconds)
+            except FutureTimeoutError:
+                logger.info(f"Reverse geocoding for {key} still queued, using offline address for now")
+            except Exception as e:
+                logger.warning(f"Reverse geocoding for {key} failed: {e}")
+    return offline_address(lat, lon)
@@ -0,0 +1,245 @@
+import logging
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+
+import numpy as np
+
+from config import (
+    SEMANTIC_CACHE_MAX_ENTRIES,
+    SEMANTIC_CACHE_THRESHOLD,
+    SEMANTIC_CACHE_TTL_SECONDS,
+    SEMANTIC_CACHE_DIMENSIONS,
+)
+from ttl_cache import normalize_text
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r"[a-z0-9']+")
+# Words that carry no meaning for "is this the same question"
+_STOP_WORDS = frozenset(
+    "a an the i me my we our you your is are am be do does did to of for on in at it this that "
+    "what whats what's how can could should would will any some please".split()
+)
+# Contractions that negate the question ("don't", "isn't") count as "not"; not, no, never
+# and without are never stop words
+_NEGATED_CONTRACTION = re.compile(r"n't$")
+_NEGATIONS = frozenset({"not", "no", "never", "without"})
+# A prompt comparing two things: the order of the things compared matters
+_COMPARATORS = frozenset({"vs", "versus", "than", "over", "compared", "instead"})
+# Alternatives a question picks one of. Two prompts that differ in which one they name, or
+# where only one names any, ask different questions
+_CONTRAST_GROUPS = (
+    {"regular", "goofy", "switch"},
+    {"camber", "rocker", "flat", "hybrid"},
+    {"beginner", "intermediate", "advanced", "expert"},
+    {"soft", "medium", "stiff"},
+    {"heelside", "toeside", "heel", "toe"},
+    {"powder", "park", "groomer", "groomed", "backcountry", "tree", "pipe"},
+    {"men", "man", "women", "woman", "kid", "child", "adult"},
+    {"uphill", "downhill", "left", "right", "front", "back"},
+    {"spring", "summer", "fall", "winter"},
+    {"boot", "binding", "goggle", "helmet", "jacket", "pant", "glove", "mitten", "leash", "wax"},
+    {"more", "less", "better", "worse", "longer", "shorter", "wider", "narrower"},
+)
+_CONTRAST_TERMS = frozenset().union(*_CONTRAST_GROUPS)
+
+
+def _singular(word):
+    """Fold a plural to the singular ("beginners", "skis", "boxes", "skies"); crude, but the same on both sides."""
+    if len(word) <= 3 or word.endswith(("ss", "us")):
+        return word
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith(("ches", "shes", "xes", "zes")):
+        return word[:-2]
+    return word[:-1] if word.endswith("s") else word
+
+
+def content_words(text):
+    """
+    The words of text that carry its meaning: lowercased, singular, stop words
+    dropped, negations kept.
+    """
+    words = []
+    for word in _WORD.findall(normalize_text(text)):
+        if _NEGATED_CONTRACTION.search(word):
+            word = "not"
+        if word not in _STOP_WORDS:
+            words.append(_singular(word))
+    return words
+
+
+def conflict(words, other_words):
+    """
+    Why two prompts (their content_words) ask different questions despite similar
+    wording, or None. Embeddings rate "wax" and "not wax", "camber over rocker" and
+    "rocker over camber", or "regular" and "goofy" versions of a question as near-duplicates.
+    Other rewording (word order, plurals, filler words) is left to the similarity threshold.
+    """
+    if Counter(w for w in words if w in _NEGATIONS) != Counter(w for w in other_words if w in _NEGATIONS):
+        return "negation"
+    if _COMPARATORS.intersection(words) or _COMPARATORS.intersection(other_words):
+        shared = set(words) & set(other_words)
+        if [w for w in words if w in shared] != [w for w in other_words if w in shared]:
+            return "swapped comparison"
+    if _CONTRAST_TERMS.intersection(set(words) ^ set(other_words)):
+        return "contrasting term"
+    return None
+
+
+class HashedNgramVectorizer:
+    """
+    CPU-only text embedding: word unigrams/bigrams and per-word character 3-5 grams hashed
+    (crc32, signed) into a fixed number of dimensions, L2-normalized so a dot
+    product is the cosine similarity.
+    """
+
+    def __init__(self, dimensions=SEMANTIC_CACHE_DIMENSIONS, char_ngrams=(3, 5)):
+        self.dimensions = int(dimensions)
+        self.char_ngrams = char_ngrams
+
+    def features(self, text):
+        words = content_words(text)
+        features = list(words)
+        features.extend(f"{a} {b}" for a, b in zip(words, words[1:]))
+        # Character n-grams within each word, so rewording ("best beginner board", "best
+        # board for a beginner") only changes the bigrams
+        low, high = self.char_ngrams
+        for word in words:
+            padded = f" {word} "
+            for n in range(low, high + 1):
+                features.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+        return features
+
+    def transform(self, text):
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for feature in self.features(text):
+            h = zlib.crc32(feature.encode("utf-8"))
+            vector[h % self.dimensions] += 1.0 if h & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector
+
+
+class SemanticCache:
+    """
+    Answers to earlier prompts, looked up by cosine similarity of their embeddings.
+
+    Embeddings live in a preallocated (max_entries x dimensions) matrix, so a
+    lookup is one matrix-vector product. A match above the threshold is not
+    served when conflict() finds the two prompts ask different things. When full,
+    the least recently used (or an expired) entry is overwritten. Entries expire
+    after ttl_seconds.
+    """
+
+    def __init__(self, max_entries=SEMANTIC_CACHE_MAX_ENTRIES, threshold=SEMANTIC_CACHE_THRESHOLD,
+                 ttl_seconds=SEMANTIC_CACHE_TTL_SECONDS, vectorizer=None):
+        self.max_entries = max(1, int(max_entries))
+        self.threshold = float(threshold)
+        self.ttl_seconds = float(ttl_seconds)
+        self.vectorizer = vectorizer or HashedNgramVectorizer()
+        self._vectors = np.zeros((self.max_entries, self.vectorizer.dimensions), dtype=np.float32)
+        self._expires_at = np.zeros(self.max_entries, dtype=np.float64)
+        self._last_used = np.zeros(self.max_entries, dtype=np.float64)
+        self._prompts = [None] * self.max_entries
+        self._words = [None] * self.max_entries
+        self._answers = [None] * self.max_entries
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+        self.stores = 0
+        self.evictions = 0
+        self._hit_similarity_total = 0.0
+
+    def _best_match(self, vector, now):
+        """(slot, similarity) of the most similar live entry, or (None, 0.0). Caller holds the lock."""
+        if self._size == 0:
+            return None, 0.0
+        similarities = self._vectors[:self._size] @ vector
+        similarities[self._expires_at[:self._size] <= now] = -1.0
+        slot = int(np.argmax(similarities))
+        return slot, float(similarities[slot])
+
+    def get(self, prompt):
+        """Return (answer, similarity) for the closest earlier prompt above the threshold, or None."""
+        vector = self.vectorizer.transform(prompt)
+        words = content_words(prompt)
+        now = time.monotonic()
+        with self._lock:
+            slot, similarity = self._best_match(vector, now)
+            if slot is None or similarity < self.threshold:
+                self.misses += 1
+                return None
+            reason = conflict(words, self._words[slot])
+            if reason is not None:
+                self.misses += 1
+                self.rejected += 1
+                logger.debug(f"Semantic cache rejected ({similarity:.3f}, {reason}) '{prompt}' vs '{self._prompts[slot]}'")
+                return None
+            self._last_used[slot] = now
+            self.hits += 1
+            self._hit_similarity_total += similarity
+            answer = self._answers[slot]
+            matched_prompt = self._prompts[slot]
+        logger.info(f"Semantic cache hit ({similarity:.3f}) for '{prompt}' matching '{matched_prompt}'")
+        return answer, similarity
+
+    def set(self, prompt, answer):
+        vector = self.vectorizer.transform(prompt)
+        if not vector.any():
+            return
+        words = content_words(prompt)
+        now = time.monotonic()
+        with self._lock:
+            slot, similarity = self._best_match(vector, now)
+            if slot is None or similarity < 0.999:
+                if self._size < self.max_entries:
+                    slot = self._size
+                    self._size += 1
+                else:
+                    # Reuse an expired slot if there is one, else evict the least recently used entry
+                    expired = np.flatnonzero(self._expires_at <= now)
+                    slot = int(expired[0]) if expired.size else int(np.argmin(self._last_used))
+                    self.evictions += 1
+            self._vectors[slot] = vector
+            self._expires_at[slot] = now + self.ttl_seconds
+            self._last_used[slot] = now
+            self._prompts[slot] = prompt
+            self._words[slot] = words
+            self._answers[slot] = answer
+            self.stores += 1
+
+    def clear(self):
+        with self._lock:
+            self._size = 0
+            self._prompts = [None] * self.max_entries
+            self._words = [None] * self.max_entries
+            self._answers = [None] * self.max_entries
+
+    def __len__(self):
+        return self._size
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": self._size,
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "rejected": self.rejected,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "avg_hit_similarity": self._hit_similarity_total / self.hits if self.hits else 0.0,
+                "stores": self.stores,
+                "evictions": self.evictions,
+            }
+
+
+response_cache = SemanticCache()
@@ -0,0 +1,311 @@
+import heapq
+import logging
+import re
+import threading
+
+import numpy as np
+
+from resort_catalog import EARTH_RADIUS_MILES, get_resort_catalog, _to_unit_vectors
+
+logger = logging.getLogger(__name__)
+
+# Points per leaf; leaves are scanned with vectorized NumPy, so they can be fairly large
+DEFAULT_LEAF_SIZE = 32
+# Below this many points a single vectorized scan beats walking the tree in Python
+BRUTE_FORCE_MAX_POINTS = 1024
+# Trailing words people leave out when naming a point ("Mammoth" for "Mammoth Mountain")
+_GENERIC_NAME_SUFFIX = re.compile(r"\s+(?:ski (?:area|resort)|mountain resort|mountains?|resort)$", re.IGNORECASE)
+
+
+def miles_to_chord(miles):
+    """Convert a great-circle distance in miles to a chord length on the unit sphere."""
+    angle = min(float(miles) / EARTH_RADIUS_MILES, np.pi)
+    return 2.0 * np.sin(angle * 0.5)
+
+
+class BallTree:
+    """
+    Ball tree over points on the unit sphere, using chord (Euclidean) distance.
+
+    Chord distance is monotonic in great-circle distance, so nearest-neighbour and
+    radius queries on the chord metric give the same answers as on the sphere while
+    pruning with simple triangle-inequality bounds.
+    """
+
+    def __init__(self, unit_vectors, leaf_size=DEFAULT_LEAF_SIZE):
+        self.points = np.ascontiguousarray(unit_vectors, dtype=np.float64)
+        self.leaf_size = max(1, int(leaf_size))
+        # Point positions reordered so every node owns a contiguous slice [start, end)
+        self.order = np.arange(len(self.points))
+
+        self._start = []
+        self._end = []
+        self._center = []
+        self._radius = []
+        self._left = []
+        self._right = []
+        if len(self.points):
+            self._build()
+        self._center = np.asarray(self._center, dtype=np.float64).reshape(-1, 3)
+        self._radius = np.asarray(self._radius, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.points)
+
+    def _new_node(self, start, end):
+        pts = self.points[self.order[start:end]]
+        center = pts.mean(axis=0)
+        radius = float(np.sqrt(((pts - center) ** 2).sum(axis=1).max()))
+        self._start.append(start)
+        self._end.append(end)
+        self._center.append(center)
+        self._radius.append(radius)
+        self._left.append(-1)
+        self._right.append(-1)
+        return len(self._start) - 1
+
+    def _build(self):
+        root = self._new_node(0, len(self.points))
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            start, end = self._start[node], self._end[node]
+            if end - start <= self.leaf_size:
+                continue
+            # Split on the axis with the widest spread at the median point
+            segment = self.order[start:end]
+            pts = self.points[segment]
+            axis = int(np.argmax(pts.max(axis=0) - pts.min(axis=0)))
+            mid = (end - start) // 2
+            part = np.argpartition(pts[:, axis], mid)
+            self.order[start:end] = segment[part]
+            left = self._new_node(start, start + mid)
+            right = self._new_node(start + mid, end)
+            self._left[node] = left
+            self._right[node] = right
+            stack.extend((left, right))
+
+    def _lower_bound(self, node, query):
+        gap = np.sqrt(((self._center[node] - query) ** 2).sum()) - self._radius[node]
+        return gap if gap > 0.0 else 0.0
+
+    def query_knn(self, query, k):
+        """Return (positions, chord_distances) of the k points closest to query, closest first."""
+        if not len(self.points) or k <= 0:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+
+        if len(self.points) <= BRUTE_FORCE_MAX_POINTS:
+            dists = np.sqrt(((self.points - query) ** 2).sum(axis=1))
+            if k < len(dists):
+                positions = np.argpartition(dists, k - 1)[:k]
+            else:
+                positions = np.arange(len(dists))
+            positions = positions[np.argsort(dists[positions], kind="stable")]
+            return positions, dists[positions]
+
+        best = []  # max-heap of (-distance, position)
+        frontier = [(0.0, 0)]
+        while frontier:
+            bound, node = heapq.heappop(frontier)
+            if len(best) == k and bound >= -best[0][0]:
+                break
+            left = self._left[node]
+            if left != -1:
+                right = self._right[node]
+                heapq.heappush(frontier, (self._lower_bound(left, query), left))
+                heapq.heappush(frontier, (self._lower_bound(right, query), right))
+                continue
+
+            positions = self.order[self._start[node]:self._end[node]]
+            dists = np.sqrt(((self.points[positions] - query) ** 2).sum(axis=1))
+            for pos, dist in zip(positions.tolist(), dists.tolist()):
+                if len(best) < k:
+                    heapq.heappush(best, (-dist, pos))
+                elif dist < -best[0][0]:
+                    heapq.heapreplace(best, (-dist, pos))
+
+        best.sort(key=lambda item: -item[0])
+        positions = np.fromiter((pos for _, pos in best), dtype=np.intp, count=len(best))
+        dists = np.fromiter((-neg for neg, _ in best), dtype=np.float64, count=len(best))
+        return positions, dists
+
+    def query_radius(self, query, chord):
+        """Return the positions of all points within the given chord distance of query."""
+        if not len(self.points):
+            return np.empty(0, dtype=np.intp)
+
+        if len(self.points) <= BRUTE_FORCE_MAX_POINTS:
+            dists = np.sqrt(((self.points - query) ** 2).sum(axis=1))
+            return np.flatnonzero(dists <= chord)
+
+        found = []
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            center_dist = np.sqrt(((self._center[node] - query) ** 2).sum())
+            if center_dist - self._radius[node] > chord:
+                continue
+            positions = self.order[self._start[node]:self._end[node]]
+            if center_dist + self._radius[node] <= chord:
+                # Whole ball is inside the query radius
+                found.append(positions)
+                continue
+            left = self._left[node]
+            if left != -1:
+                stack.extend((left, self._right[node]))
+                continue
+            dists = np.sqrt(((self.points[positions] - query) ** 2).sum(axis=1))
+            found.append(positions[dists <= chord])
+
+        if not found:
+            return np.empty(0, dtype=np.intp)
+        return np.concatenate(found)
+
+
+class ResortIndex:
+    """
+    Spatial index over the resort catalog for k-nearest and radius queries.
+
+    Region/country filters are served from per-filter sub-trees built lazily on
+    first use, so filtered queries stay logarithmic in the size of the subset.
+    named_filters finds the filters a free-text request names.
+    """
+
+    def __init__(self, catalog, leaf_size=DEFAULT_LEAF_SIZE):
+        self.catalog = catalog
+        self.leaf_size = leaf_size
+        self._regions = np.array([str(r).strip().lower() for r in catalog.regions], dtype=object)
+        self._countries = np.array([str(c).strip().lower() for c in catalog.countries], dtype=object)
+        self._trees = {(None, None): (BallTree(catalog.unit_vectors, leaf_size), np.arange(len(catalog)))}
+        self._trees_lock = threading.Lock()
+        self._place_names = None
+        self._point_names = None
+
+    def _tree_for(self, region=None, country=None):
+        """Return (tree, catalog_positions) for the given filters, building it if needed."""
+        key = (
+            region.strip().lower() if region else None,
+            country.strip().lower() if country else None,
+        )
+        entry = self._trees.get(key)
+        if entry is None:
+            with self._trees_lock:
+                entry = self._trees.get(key)
+                if entry is None:
+                    selected = np.ones(len(self.catalog), dtype=bool)
+                    if key[0] is not None:
+                        selected &= self._regions == key[0]
+                    if key[1] is not None:
+                        selected &= self._countries == key[1]
+                    positions = np.flatnonzero(selected)
+                    entry = (BallTree(self.catalog.unit_vectors[positions], self.leaf_size), positions)
+                    self._trees[key] = entry
+                    logger.info(f"Built resort sub-index for region={region} country={country} ({len(positions)} resorts)")
+        return entry
+
+    def _build_place_names(self):
+        """(pattern, {lowercased name: (region, country)}) over the catalog's region and country names."""
+        filters = {}
+        for region in self.catalog.regions:
+            region = str(region).strip()
+            if region:
+                # "Western US - Pacific Northwest" is also found as "Pacific Northwest"
+                for name in (region, region.split(" - ")[-1]):
+                    filters.setdefault(name.lower(), (region, None))
+        for country in self.catalog.countries:
+            country = str(country).strip()
+            if country:
+                # A country (the catalog's states and provinces) wins over a region of the same name
+                filters[country.lower()] = (None, country)
+        if not filters:
+            return None, filters
+        names = sorted(filters, key=len, reverse=True)
+        pattern = re.compile(r"\b(" + "|".join(re.escape(name) for name in names) + r")\b", re.IGNORECASE)
+        return pattern, filters
+
+    def named_filters(self, text):
+        """
+        (region, country) filter values named in text, e.g. "resorts in Utah" gives
+        (None, "Utah"); (None, None) when it names neither.
+        """
+        if self._place_names is None:
+            with self._trees_lock:
+                if self._place_names is None:
+                    self._place_names = self._build_place_names()
+        pattern, filters = self._place_names
+        match = pattern.search(text) if pattern is not None and text else None
+        return filters[match.group(1).lower()] if match else (None, None)
+
+    def _build_point_names(self):
+        """Pattern matching the catalog's point names, with and without a generic suffix."""
+        names = set()
+        for name in self.catalog.names:
+            name = str(name).strip()
+            if name:
+                names.add(name.lower())
+                names.add(_GENERIC_NAME_SUFFIX.sub("", name).lower())
+        if not names:
+            return None
+        alternation = "|".join(re.escape(name) for name in sorted(names, key=len, reverse=True))
+        return re.compile(r"\b(?:" + alternation + r")\b", re.IGNORECASE)
+
+    def names_place(self, text):
+        """True when text names one of the catalog's points (e.g. a resort), regions or countries."""
+        if not text:
+            return False
+        if self.named_filters(text) != (None, None):
+            return True
+        if self._point_names is None:
+            with self._trees_lock:
+                if self._point_names is None:
+                    self._point_names = (self._build_point_names(),)
+        pattern = self._point_names[0]
+        return pattern is not None and pattern.search(text) is not None
+
+    def _results(self, lat, lon, positions):
+        """Return [(catalog_position, distance_miles)] sorted closest first."""
+        if not len(positions):
+            return []
+        miles = self.catalog.distances_miles(lat, lon, positions)
+        order = np.argsort(miles, kind="stable")
+        return [(int(positions[i]), float(miles[i])) for i in order]
+
+    def nearest_positions(self, lat, lon, k=5, region=None, country=None):
+        """
+        Like nearest, but returns [(catalog_position, distance_miles)] so callers can
+        read other catalog columns (region, country) for each hit.
+        """
+        tree, positions = self._tree_for(region, country)
+        query = _to_unit_vectors(np.radians(lat), np.radians(lon))
+        found, _ = tree.query_knn(query, k)
+        return self._results(lat, lon, positions[found])
+
+    def nearest(self, lat, lon, k=5, region=None, country=None):
+        """Return the k closest resorts as [(resort_name, distance_miles)], closest first."""
+        return [
+            (self.catalog.names[position], miles)
+            for position, miles in self.nearest_positions(lat, lon, k, region, country)
+        ]
+
+    def within_radius(self, lat, lon, miles, region=None, country=None):
+        """Return all resorts within the given number of miles as [(resort_name, distance_miles)], closest first."""
+        tree, positions = self._tree_for(region, country)
+        query = _to_unit_vectors(np.radians(lat), np.radians(lon))
+        found = tree.query_radius(query, miles_to_chord(miles))
+        results = self._results(lat, lon, positions[found])
+        # Chord pruning is exact on the sphere; trim float noise at the boundary
+        return [(self.catalog.names[position], dist) for position, dist in results if dist <= miles]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_resort_index():
+    """Return the process-wide resort index, building it from the catalog on first use."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = ResortIndex(get_resort_catalog())
+    return _index
@@ -1,8 +1,9 @@
 import streamlit as st
 import streamlit.components.v1 as components
-from geopy.geocoders import Nominatim
-from geopy.distance import geodesic
-from main import get_snowboard_assistant_response
+from main import get_snowboard_assistant_response, stream_snowboard_assistant_response
+from config import ENABLE_STREAMING
+from reverse_geocoder import reverse_geocode
+import itertools
 import time
 import logging
 
@@ -12,32 +13,11 @@ logger = logging.getLogger(__name__)
 
 MAX_MESSAGE_COUNT = 12  # Set the maximum number of messages allowed per conversation
 
-if 'prompt_count' not in st.session_state:
-    st.session_state.prompt_count = 0
-    st.session_state.first_prompt_time = time.time()
-
 if 'message_count' not in st.session_state:
     st.session_state.message_count = 0
 if 'free_tier_ended' not in st.session_state:
     st.session_state.free_tier_ended = False
 
-def can_issue_prompt():
-    add_debug_info("Checking if prompt can be issued")
-    current_time = time.time()
-    time_elapsed = current_time - st.session_state.first_prompt_time
-    
-    if time_elapsed > 60:  # Reset the count after a minute
-        st.session_state.prompt_count = 0
-        st.session_state.first_prompt_time = current_time
-    
-    if st.session_state.prompt_count < 20:
-        add_debug_info(f"Prompt count: {st.session_state.prompt_count}")
-        st.session_state.prompt_count += 1
-        return True
-    else:
-        add_debug_info("Rate limit reached, wait a few seconds...")
-        return False
-
 # Get initial query parameters
 initial_location_param = st.query_params.get('location_data')
 initial_consent_param = st.query_params.get('consent', 'false').lower() == 'true'
@@ -225,15 +205,14 @@ if location_param:
             add_debug_info("Processing location data")
             lat, lon = map(float, location_param.split(','))
             
-            # Convert coordinates to location name
+            # Convert coordinates to location name (cached and throttled process-wide)
             add_debug_info("Converting coordinates to location name")
-            geolocator = Nominatim(user_agent="snowboarding_assistant")
-            location_data = geolocator.reverse((lat, lon))
+            address = reverse_geocode(lat, lon)
             
             # Store in session state
             st.session_state.user_location = {
                 'coordinates': (lat, lon),
-                'address': location_data.address
+                'address': address
             }
             
             # Reset the location requested flag
@@ -357,13 +336,12 @@ def process_user_input(prompt):
                             lat, lon = map(float, location_param.split(','))
                             
                             # Convert coordinates to location name
-                            geolocator = Nominatim(user_agent="snowboarding_assistant")
-                            location_data = geolocator.reverse((lat, lon))
+                            address = reverse_geocode(lat, lon)
                             
                             # Store in session state
                             st.session_state.user_location = {
                                 'coordinates': (lat, lon),
-                                'address': location_data.address
+                                'address': address
                             }
                             break
                             
@@ -374,19 +352,26 @@ def process_user_input(prompt):
         with st.chat_message("assistant"):
             with st.spinner("Thinking..."):
                 add_debug_info(f"Getting assistant response for: {prompt}")
-                while not can_issue_prompt():
-                    with st.spinner("Rate limit reached, wait a few seconds..."):
-                        add_debug_info("Rate limit reached, waiting...")
-                        time.sleep(10)
-                
+                # Groq quota is shared process-wide: main's rate limiter queues this
+                # request fairly with other sessions instead of sleeping here
                 # Log location status before getting response
                 if not st.session_state.user_location:
                     add_debug_info("No location data available for response")
                 
                 conversation_history = st.session_state.messages.copy()
-                response = get_snowboard_assistant_response(prompt, conversation_history)
-                add_debug_info("Got assistant response")
-                
+                if ENABLE_STREAMING:
+                    # Keep the spinner up until the first token arrives
+                    response_stream = stream_snowboard_assistant_response(prompt, conversation_history)
+                    first_delta = next(response_stream, "")
+                else:
+                    response = get_snowboard_assistant_response(prompt, conversation_history)
+                    add_debug_info("Got assistant response")
+
+            if ENABLE_STREAMING:
+                # Render deltas as they arrive; write_stream returns the full text
+                response = st.write_stream(itertools.chain([first_delta], response_stream))
+                add_debug_info("Finished streaming assistant response")
+            else:
                 # Display the response immediately
                 st.markdown(response)
         
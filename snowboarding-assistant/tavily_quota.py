@@ -0,0 +1,149 @@
+import logging
+import threading
+from datetime import datetime
+
+from config import (
+    TAVILY_API_KEY,
+    TAVILY_MONTHLY_LIMIT,
+    TAVILY_USAGE_URL,
+    TAVILY_USAGE_REFRESH_SECONDS,
+    TAVILY_USAGE_TIMEOUT_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _current_month():
+    return datetime.now().strftime("%Y-%m")
+
+
+class TavilyQuotaTracker:
+    """
+    Process-wide count of Tavily searches this month.
+
+    The count lives in memory and is bumped atomically on every search; a daemon
+    thread re-syncs it with Tavily's usage endpoint every refresh_seconds, so
+    the request path never waits on HTTP. Until the first sync finishes, only
+    searches made by this process are counted.
+    """
+
+    def __init__(self, limit=TAVILY_MONTHLY_LIMIT, refresh_seconds=TAVILY_USAGE_REFRESH_SECONDS,
+                 timeout=TAVILY_USAGE_TIMEOUT_SECONDS):
+        self.limit = limit
+        self.refresh_seconds = refresh_seconds
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._count = 0
+        self._month = _current_month()
+        self._last_refresh = None
+        self._refresh_failures = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _roll_month(self):
+        """Reset the count when the calendar month changes. Caller holds the lock."""
+        month = _current_month()
+        if month != self._month:
+            self._month = month
+            self._count = 0
+
+    def fetch_monthly_usage(self):
+        """Ask Tavily for this month's usage; returns the count or None on failure."""
+        if not TAVILY_API_KEY:
+            return None
+        import requests
+
+        month = _current_month()
+        try:
+            response = requests.get(
+                TAVILY_USAGE_URL,
+                headers={"Authorization": f"Bearer {TAVILY_API_KEY}"},
+                timeout=self.timeout,
+            )
+            if response.status_code != 200:
+                logger.warning(f"Failed to get Tavily usage data: {response.status_code} - {response.text[:200]}")
+                return None
+            usage_data = response.json()
+        except Exception as e:
+            logger.warning(f"Error checking Tavily usage: {e}")
+            return None
+
+        # Parse the usage data - structure may vary based on Tavily's API
+        monthly_usage = 0
+        for period, count in usage_data.get("usage", {}).items():
+            if period.startswith(month):
+                monthly_usage += count
+        return monthly_usage
+
+    def refresh(self):
+        """Sync the counter with Tavily's reported usage (blocking; run from the refresh thread)."""
+        monthly_usage = self.fetch_monthly_usage()
+        with self._lock:
+            self._roll_month()
+            if monthly_usage is None:
+                self._refresh_failures += 1
+                return False
+            # Searches made while the request was in flight may not be reported yet
+            self._count = max(self._count, monthly_usage)
+            self._last_refresh = datetime.now()
+            count = self._count
+        logger.info(f"Tavily API usage for current month: {count}")
+        return True
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.refresh()
+            self._stop.wait(self.refresh_seconds)
+
+    def start(self):
+        """Start the background refresh thread (idempotent)."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="tavily-quota-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def usage(self):
+        """Return (usage_count, is_limit_exceeded) from memory."""
+        self.start()
+        with self._lock:
+            self._roll_month()
+            return self._count, self._count >= self.limit
+
+    def try_acquire(self):
+        """
+        Charge one search against the quota if any is left.
+        Returns (usage_count, acquired), the count including this search.
+        """
+        self.start()
+        with self._lock:
+            self._roll_month()
+            if self._count >= self.limit:
+                return self._count, False
+            self._count += 1
+            return self._count, True
+
+    def stats(self):
+        with self._lock:
+            return {
+                "month": self._month,
+                "count": self._count,
+                "limit": self.limit,
+                "last_refresh": self._last_refresh.isoformat() if self._last_refresh else None,
+                "refresh_failures": self._refresh_failures,
+            }
+
+
+tavily_quota = TavilyQuotaTracker()
+
+
+def check_tavily_usage():
+    """
+    Check the current Tavily API usage for the month.
+    Returns:
+        tuple: (usage_count, is_limit_exceeded)
+    """
+    return tavily_quota.usage()
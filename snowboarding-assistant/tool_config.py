@@ -6,7 +6,8 @@ TOOL_DESCRIPTIONS_JSON_PATH = os.path.join(os.path.dirname(__file__), "tool_desc
 # Tool description versions for A/B testing
 TOOL_DESCRIPTION_VERSIONS = {
     "web_search": "v1",
-    "resort_distance_calculator": "v1"
+    "resort_distance_calculator": "v1",
+    "resort_distance_tool": "v2"
 }
 
 def get_tool_version(tool_name):
@@ -0,0 +1,28 @@
+class Tool:
+    """
+    A function the assistant can call, with the name and description shown to the model.
+
+    Mirrors langchain's Tool(name, description, func) and run() so tools can be
+    defined without importing LangChain at startup; as_langchain_tool() builds the
+    LangChain version (importing it then) for code that needs an agent tool.
+    """
+
+    def __init__(self, name, description, func):
+        self.name = name
+        self.description = description
+        self.func = func
+
+    def run(self, tool_input="", **kwargs):
+        """Call the tool. Keyword arguments are passed through to func."""
+        return self.func(tool_input, **kwargs)
+
+    def invoke(self, tool_input=""):
+        return self.run(tool_input)
+
+    def as_langchain_tool(self):
+        from langchain.tools import Tool as LangChainTool
+
+        return LangChainTool(name=self.name, description=self.description, func=self.func)
+
+    def __repr__(self):
+        return f"Tool(name={self.name!r})"
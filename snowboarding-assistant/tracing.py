@@ -0,0 +1,270 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from config import (
+    EVAL_CONFIG,
+    TRACE_EXPORT_FORMAT,
+    TRACE_EXPORT_PATH,
+    TRACE_STATS_WINDOW,
+)
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "snowboarding-assistant"
+
+# The span a new span is parented to. Engine tasks inherit it from the turn that starts them.
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """One timed stage of a turn, with attributes such as token counts and cache hits."""
+
+    def __init__(self, name, trace, parent=None, attributes=None):
+        self.name = name
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self._start = time.perf_counter()
+        self.duration = None
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def set_usage(self, usage):
+        """Add a Groq usage report's token counts (when EVAL_CONFIG["log_model_usage"] is on)."""
+        if usage is None or not EVAL_CONFIG.get("log_model_usage"):
+            return
+        for key in ("prompt_tokens", "completion_tokens", "total_tokens"):
+            value = getattr(usage, key, None)
+            if isinstance(value, int):
+                self.attributes[key] = value
+        cached = getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", None)
+        if isinstance(cached, int):
+            self.attributes["cached_tokens"] = cached
+
+    def end(self, error=None):
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self._start
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        self.trace.finish(self)
+
+    def as_dict(self):
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class _NoopSpan:
+    """Stands in for a span when tracing is off, so call sites don't need to check."""
+
+    def set(self, **attributes):
+        pass
+
+    def set_usage(self, usage):
+        pass
+
+    def end(self, error=None):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    """The spans of one turn. Exported together once the root span ends."""
+
+    def __init__(self, tracer):
+        self.tracer = tracer
+        self.trace_id = os.urandom(16).hex()
+        self.root = None
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def finish(self, span):
+        with self._lock:
+            self.spans.append(span)
+        self.tracer.record_duration(span.name, span.duration)
+        if span is self.root:
+            self.tracer.export(self)
+            # Break the span <-> trace cycle so finished traces are freed without waiting for the GC
+            with self._lock:
+                self.spans = []
+                self.root = None
+
+
+class JsonLinesExporter:
+    """One JSON object per span, one line each."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, trace):
+        lines = "".join(json.dumps(span.as_dict(), default=str) + "\n" for span in trace.spans)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [_otlp_value(v) for v in value]}}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(trace):
+    """A trace as an OTLP/JSON ExportTraceServiceRequest (what an OpenTelemetry collector accepts)."""
+    spans = []
+    for span in trace.spans:
+        spans.append({
+            "traceId": trace.trace_id,
+            "spanId": span.span_id,
+            "parentSpanId": span.parent_id or "",
+            "name": span.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.start_ns + int(span.duration * 1e9)),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in span.attributes.items() if v is not None],
+            "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+        })
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": SERVICE_NAME}, "spans": spans}],
+        }]
+    }
+
+
+class OtlpJsonExporter:
+    """One OTLP/JSON request per trace, one line each (the collector's file format)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, trace):
+        line = json.dumps(to_otlp(trace)) + "\n"
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+
+def make_exporter(export_format=TRACE_EXPORT_FORMAT, path=TRACE_EXPORT_PATH):
+    if not path or export_format == "none":
+        return None
+    if export_format == "otlp":
+        return OtlpJsonExporter(path)
+    if export_format == "jsonl":
+        return JsonLinesExporter(path)
+    logger.warning(f"Unknown TRACE_EXPORT_FORMAT '{export_format}', traces won't be exported")
+    return None
+
+
+class Tracer:
+    """
+    Records spans for each stage of a turn when EVAL_CONFIG["track_response_times"]
+    is on. Finished traces go to the exporter (if any); recent span durations are
+    kept per stage name for percentile summaries.
+    """
+
+    def __init__(self, exporter=None, window=TRACE_STATS_WINDOW):
+        self.exporter = exporter
+        self.window = window
+        self._durations = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(EVAL_CONFIG.get("track_response_times"))
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """
+        Time the block as a span, child of the current span (or the root of a new
+        trace). Exceptions are recorded on the span and re-raised.
+        """
+        if not self.enabled:
+            yield NOOP_SPAN
+            return
+        parent = _current_span.get()
+        trace = parent.trace if parent is not None else Trace(self)
+        span = Span(name, trace, parent, attributes)
+        if parent is None:
+            trace.root = span
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            # A generator closed early (GeneratorExit) isn't an error
+            span.end(error=e if isinstance(e, Exception) else None)
+            raise
+        finally:
+            span.end()
+            try:
+                _current_span.reset(token)
+            except ValueError:
+                # Ended from another context, e.g. a stream closed by the garbage collector
+                pass
+
+    def record_duration(self, name, seconds):
+        with self._lock:
+            self._durations.setdefault(name, deque(maxlen=self.window)).append(seconds)
+
+    def export(self, trace):
+        if self.exporter is None:
+            return
+        try:
+            self.exporter.export(trace)
+        except Exception as e:
+            logger.warning(f"Exporting trace {trace.trace_id} failed: {e}")
+
+    def stage_stats(self):
+        """{stage: {"count", "p50_ms", "p95_ms", "max_ms"}} over the recent window."""
+        with self._lock:
+            snapshot = {name: sorted(samples) for name, samples in self._durations.items()}
+        stats = {}
+        for name, samples in snapshot.items():
+            def pct(q):
+                return round(samples[min(len(samples) - 1, int(q / 100.0 * len(samples)))] * 1000, 3)
+            stats[name] = {"count": len(samples), "p50_ms": pct(50), "p95_ms": pct(95), "max_ms": pct(100)}
+        return stats
+
+
+tracer = Tracer(exporter=make_exporter())
+
+
+def span(name, **attributes):
+    """Shortcut for tracer.span()."""
+    return tracer.span(name, **attributes)
+
+
+def current_span():
+    """The active span, or a no-op span outside a trace."""
+    return _current_span.get() or NOOP_SPAN
+
+
+def annotate(**attributes):
+    """Set attributes on the active span (no-op outside a trace)."""
+    current_span().set(**attributes)
@@ -0,0 +1,145 @@
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    """Normalize free text for use as a cache key: lowercase, collapsed whitespace, no trailing punctuation."""
+    return _WHITESPACE.sub(" ", str(text)).strip().lower().rstrip("?!. ")
+
+
+class LRUTTLCache:
+    """
+    Thread-safe, size-bounded LRU cache with per-entry TTL and hit/miss counters.
+
+    Instances are meant to be module-level so every Streamlit session in the
+    process shares them. With a persistent store (see persistent_cache.py) the
+    cache reads through and writes through to disk under its name as namespace,
+    and is warmed from disk at construction.
+    """
+
+    def __init__(self, name, max_entries=1024, ttl_seconds=3600.0, persistent=None, warm_start_entries=0):
+        self.name = name
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = float(ttl_seconds)
+        self.persistent = persistent
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.persistent_hits = 0
+        self.evictions = 0
+        self.expirations = 0
+        if persistent is not None and warm_start_entries:
+            self.warm_start(min(int(warm_start_entries), self.max_entries))
+
+    def warm_start(self, limit):
+        """Load the most recently used live entries from the persistent store into memory."""
+        try:
+            entries = self.persistent.load(self.name, limit)
+        except Exception as e:
+            logger.warning(f"Warm start of cache '{self.name}' failed: {e}")
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            # Oldest first so the most recently used end up at the MRU end
+            for key, value, remaining in reversed(entries):
+                self._entries[key] = (now + remaining, value)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        logger.info(f"Warm-started cache '{self.name}' with {len(entries)} entries")
+        return len(entries)
+
+    def _get_persistent(self, key):
+        try:
+            found = self.persistent.get(self.name, key)
+        except Exception as e:
+            logger.warning(f"Persistent cache read failed for '{self.name}': {e}")
+            return None
+        if found is None:
+            return None
+        value, remaining = found
+        with self._lock:
+            self._entries[key] = (time.monotonic() + remaining, value)
+            self._entries.move_to_end(key)
+            self.persistent_hits += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default if missing or expired."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if self.persistent is None:
+                self.misses += 1
+                return default
+
+        value = self._get_persistent(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+        return value
+
+    def set(self, key, value, ttl_seconds=None):
+        """Store value under key for ttl_seconds (the cache default if None)."""
+        ttl = self.ttl_seconds if ttl_seconds is None else float(ttl_seconds)
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        if self.persistent is not None:
+            try:
+                self.persistent.set(self.name, key, value, ttl)
+            except Exception as e:
+                logger.warning(f"Persistent cache write failed for '{self.name}': {e}")
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """Return size and hit/miss counters for monitoring."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": self.name,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "persistent_hits": self.persistent_hits,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
@@ -1,47 +1,57 @@
-from langchain.tools import Tool
-from tavily import TavilyClient
-import os
-import streamlit as st
-from config import TAVILY_API_KEY, check_tavily_usage
-from prompts import get_prompt
+import asyncio
+import re
+from config import (
+    TAVILY_API_KEY,
+    TAVILY_SEARCH_URL,
+    TAVILY_SEARCH_TIMEOUT_SECONDS,
+    ENGINE_MAX_CONNECTIONS,
+    SEARCH_CACHE_MAX_ENTRIES,
+    SEARCH_CACHE_TTLS,
+    PERSISTENT_CACHE_WARM_START_ENTRIES
+)
+from ttl_cache import LRUTTLCache, normalize_text
+from persistent_cache import get_persistent_cache
+from tavily_quota import tavily_quota
+from tracing import annotate
 import logging
 
 # Configure the logger
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def web_search(query: str, return_links: bool = False) -> str:
-    """
-    Search the web for snowboarding-related information.
-    
-    Args:
-        query (str): The search query
-        return_links (bool): Whether to return links separately
-        
-    Returns:
-        str or dict: Search results summary, or dict with content and links if return_links=True
-    """
-    print(f"🔧 Using tool: web_search with query: {query}")  # Log tool usage
-    
-    # Check if we've exceeded the Tavily usage limit
-    usage_count, limit_exceeded = check_tavily_usage()
-    
-    if limit_exceeded:
-        message = get_prompt("web_search_unavailable", "v1")
-        
-        return {"content": message, "links": []} if return_links else message
-    
-    # Increment the usage count in anticipation of this request
-    st.session_state.tavily_usage_count += 1
-    
-    tavily_client = TavilyClient(api_key=TAVILY_API_KEY)
-    search_results = tavily_client.search(
-        query=query,
-        search_depth="basic",
-        max_results=3
-    )
-    
-    # Format results into a readable summary
+# Freshness topics, checked in order; the first match picks the cache TTL from SEARCH_CACHE_TTLS
+SEARCH_TOPIC_PATTERNS = [
+    ("conditions", re.compile(
+        r"\b(?:weather|forecast|snow ?(?:report|fall|depth)|conditions?|powder|storm|avalanche"
+        r"|today|tonight|tomorrow|right now|currently|open|lifts?|roads?|chains?)\b", re.IGNORECASE)),
+    ("news", re.compile(
+        r"\b(?:news|events?|competitions?|results?|deals?|sales?|discounts?|prices?|tickets?|pass(?:es)?"
+        r"|this (?:week|weekend|month|season))\b", re.IGNORECASE)),
+    ("evergreen", re.compile(
+        r"\b(?:reviews?|best|gear|boards?|bindings?|boots?|jackets?|goggles?|helmets?|how to|guide|beginner)\b",
+        re.IGNORECASE)),
+]
+
+# Search results shared across sessions, keyed on the normalized query
+search_cache = LRUTTLCache(
+    "web_search",
+    max_entries=SEARCH_CACHE_MAX_ENTRIES,
+    ttl_seconds=SEARCH_CACHE_TTLS["default"],
+    persistent=get_persistent_cache(),
+    warm_start_entries=PERSISTENT_CACHE_WARM_START_ENTRIES,
+)
+
+
+def search_topic(query: str) -> str:
+    """Classify a query into a freshness topic used to choose its cache TTL."""
+    for topic, pattern in SEARCH_TOPIC_PATTERNS:
+        if pattern.search(query):
+            return topic
+    return "default"
+
+
+def _format_search_results(search_results):
+    """Format raw Tavily results into (summary, links)."""
     summary = []
     links = []  # Store links separately
     
@@ -59,21 +69,88 @@ def web_search(query: str, return_links: bool = False) -> str:
                 links.append(url)
 
     formatted_summary = "\n".join(summary) if summary else "No results found."
+    return formatted_summary, links
+
+
+def _cache_results(cache_key, query: str, results):
+    topic = search_topic(query)
+    search_cache.set(cache_key, results, ttl_seconds=SEARCH_CACHE_TTLS[topic])
+    logger.info(f"Cached search results for topic '{topic}' ({SEARCH_CACHE_TTLS[topic]:.0f}s)")
+
+
+class AsyncTavilySearch:
+    """
+    Web search for the async engine, cached in search_cache.
+
+    Calls Tavily's search endpoint over one pooled httpx.AsyncClient (tavily's
+    AsyncTavilyClient opens a new client, and connection, for every search).
+    Identical concurrent queries on the engine's event loop share one upstream search.
+    """
+
+    def __init__(self, api_key=TAVILY_API_KEY, http_client=None):
+        self.api_key = api_key
+        self._http_client = http_client
+        self._inflight = {}
+
+    def _client(self):
+        if self._http_client is None:
+            import httpx
+
+            self._http_client = httpx.AsyncClient(
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                limits=httpx.Limits(
+                    max_connections=ENGINE_MAX_CONNECTIONS, max_keepalive_connections=ENGINE_MAX_CONNECTIONS
+                ),
+                timeout=TAVILY_SEARCH_TIMEOUT_SECONDS,
+            )
+        return self._http_client
+
+    async def search(self, query: str, search_depth: str = "basic", max_results: int = 3):
+        """The raw Tavily response, like TavilyClient.search."""
+        response = await self._client().post(
+            TAVILY_SEARCH_URL,
+            json={"query": query, "search_depth": search_depth, "max_results": max_results},
+        )
+        response.raise_for_status()
+        return response.json()
+
+    async def web_search(self, query: str, quota=tavily_quota):
+        """
+        Return (summary, links) for query, or None if quota (a TavilyQuotaTracker)
+        has no searches left this month.
+        """
+        logger.info(f"Using tool: web_search with query: {query}")
+
+        cache_key = normalize_text(query)
+        cached = search_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"Serving web search from cache for query: {query}")
+            annotate(cache_hit=True)
+            return cached
+        annotate(cache_hit=False)
+
+        inflight = self._inflight.get(cache_key)
+        if inflight is not None:
+            logger.info(f"Waiting on in-flight search for query: {query}")
+            annotate(coalesced=True)
+        else:
+            inflight = asyncio.ensure_future(self._upstream_search(cache_key, query, quota))
+            self._inflight[cache_key] = inflight
+            inflight.add_done_callback(lambda _: self._inflight.pop(cache_key, None))
+        # A waiter that is cancelled must not cancel the search the others share
+        return await asyncio.shield(inflight)
+
+    async def _upstream_search(self, cache_key, query: str, quota):
+        usage_count, acquired = quota.try_acquire()
+        if not acquired:
+            logger.info(f"Tavily monthly limit reached ({usage_count}), skipping search")
+            return None
+        results = _format_search_results(await self.search(query, search_depth="basic", max_results=3))
+        _cache_results(cache_key, query, results)
+        return results
+
+    async def aclose(self):
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
 
-    logger.info(f"Links returned from Tavily search: {links}")
-    
-    # Return either just the summary or both summary and links
-    if return_links:
-        return {
-            "content": formatted_summary,
-            "links": links
-        }
-    else:
-        return formatted_summary
-
-# Define the tool
-tavily_search_tool = Tool(
-    name="web_search",
-    description="Useful for searching current information about snowboarding resorts, conditions, gear reviews, and related topics.",
-    func=web_search
-) 
\ No newline at end of file
@@ -0,0 +1,8 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+import fakes  # noqa: E402
+
+# Dummy keys, no prompt watcher and no on-disk cache; also puts the app on sys.path
+fakes.configure_environment()
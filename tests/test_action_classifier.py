@@ -0,0 +1,36 @@
+import pytest
+
+from action_classifier import rule_based_classify
+
+# Technique words, but tied to a place: the LLM decides whether the tools are needed
+PLACE_PROMPTS = [
+    "Which resort near Salt Lake City has the best groomers for carving?",
+    "Where can I take a carving lesson in Colorado?",
+    "Which Utah resorts are best for learning to ollie in the park?",
+    "How do I get to Mammoth from LA?",
+    "Is Heavenly good for practicing heelside turns?",
+    "Tips for carving in the Pacific Northwest",
+]
+
+TECHNIQUE_PROMPTS = [
+    "How do I carve on a snowboard?",
+    "What's the difference between regular and goofy stance?",
+    "Tips for waxing my board at home",
+    "Explain how to link turns on toeside",
+]
+
+
+@pytest.mark.parametrize("prompt", PLACE_PROMPTS)
+def test_technique_question_naming_a_place_defers_to_the_llm(prompt):
+    assert rule_based_classify(prompt) is None
+
+
+@pytest.mark.parametrize("prompt", TECHNIQUE_PROMPTS)
+def test_pure_technique_question_needs_no_tool(prompt):
+    result = rule_based_classify(prompt)
+    assert result is not None and result["raw_response"] == "rules:NONE"
+    assert result["tool_use"] == {"web_search": False, "geolocation": False}
+
+
+def test_location_keywords_still_decide_geo():
+    assert rule_based_classify("What are the closest resorts to me for carving?")["raw_response"] == "rules:GEO"
@@ -0,0 +1,87 @@
+import asyncio
+import contextlib
+import io
+
+import pytest
+
+import fakes
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    fakes.install_fakes(fakes.Latency(scale=0))
+    import rate_limiter
+    from assistant_engine import AssistantEngine
+    from semantic_cache import response_cache
+
+    response_cache.clear()
+    # Fresh limiters at 60 requests per minute: a drained bucket refills one request per second
+    monkeypatch.setattr(rate_limiter, "_limiters", {})
+    monkeypatch.setattr(rate_limiter, "GROQ_RATE_LIMITS", {})
+    monkeypatch.setattr(rate_limiter, "GROQ_DEFAULT_RPM", 60)
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield AssistantEngine()
+
+
+def test_closing_a_stream_queued_for_quota_does_not_block_other_conversations(engine):
+    from assistant_engine import RequestContext
+    from config import FAST_RESPONSE_MODEL
+    from rate_limiter import get_rate_limiter
+
+    limiter = get_rate_limiter(FAST_RESPONSE_MODEL)
+    limiter.requests.level = 0
+
+    async def scenario():
+        # Decided by the classifier's keyword rules, so the completion is the only Groq request
+        stream = engine.stream("How do I carve on a snowboard?", RequestContext(session_id="A"))
+        first_delta = asyncio.ensure_future(stream.__anext__())
+        for _ in range(100):
+            if limiter._queues:
+                break
+            await asyncio.sleep(0.01)
+        assert "A" in limiter._queues
+        # What BackgroundLoop.iterate does when the Streamlit user stops or reruns
+        first_delta.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first_delta
+        await stream.aclose()
+
+        reply = await asyncio.wait_for(
+            engine.respond("How do I wax my snowboard at home?", RequestContext(session_id="B")), timeout=10
+        )
+        await engine.aclose()
+        return reply
+
+    reply = asyncio.run(scenario())
+    assert not reply.startswith(("Sorry", "We're getting a lot of requests"))
+    assert not limiter._queues
+    # B was served by the routed model, not pushed down the fallback chain
+    assert limiter.granted == 1
+
+
+def test_usage_is_recorded_under_the_hedge_model_when_the_hedge_answers(engine, monkeypatch):
+    import assistant_engine
+    from assistant_engine import RequestContext
+    from config import FAST_RESPONSE_MODEL
+    from model_router import model_usage
+
+    async def hedge_wins(primary, hedge, delay):
+        return await hedge(), True
+
+    monkeypatch.setattr(assistant_engine, "ENABLE_HEDGED_REQUESTS", True)
+    monkeypatch.setattr(assistant_engine, "HEDGE_FALLBACK_MODEL", "hedge-model")
+    monkeypatch.setattr(assistant_engine, "hedged_call_async", hedge_wins)
+    before = model_usage.stats()
+
+    async def scenario():
+        reply = await engine.respond("How do I carve on a snowboard?", RequestContext(session_id="A"))
+        await engine.aclose()
+        return reply
+
+    reply = asyncio.run(scenario())
+    assert not reply.startswith("Sorry")
+    after = model_usage.stats()
+    assert after["hedge-model"]["requests"] == 1
+    # The routed model only sent the request the hedge beat
+    routed_requests = before.get(FAST_RESPONSE_MODEL, {}).get("requests", 0)
+    assert after.get(FAST_RESPONSE_MODEL, {}).get("requests", 0) == routed_requests
@@ -0,0 +1,22 @@
+import history_packer
+from history_packer import pack_messages
+
+
+def test_summary_follows_the_kept_history(monkeypatch):
+    # Only the last two exchanges are kept; older ones are summarized
+    monkeypatch.setattr(history_packer, "MAX_HISTORY_MESSAGES", 4)
+    history = []
+    for i in range(20):
+        history.append({"role": "user", "content": f"Question {i} about waxing my board before the trip?"})
+        history.append({"role": "assistant", "content": f"Answer {i}: " + "use a hot wax and scrape it thin. " * 3})
+    context = [{"role": "system", "content": "Closest resorts: Copper Mountain (70 miles)"}]
+
+    messages = pack_messages("test-model", "You are a snowboarding assistant.", history, context, "And after?")
+
+    assert messages[0] == {"role": "system", "content": "You are a snowboarding assistant."}
+    assert messages[-2:] == context + [{"role": "user", "content": "And after?"}]
+    summary = messages[-3]
+    assert summary["role"] == "system" and "Question 17 " in summary["content"]
+    # The system prompt and the newest turns form the cacheable prefix, with nothing between them
+    kept = messages[1:-3]
+    assert kept == history[-4:]
@@ -0,0 +1,41 @@
+import pytest
+
+import model_router
+from config import FAST_RESPONSE_MODEL, LARGE_RESPONSE_MODEL
+from model_router import complexity_score, route_turn
+
+NO_TOOLS = {"web_search": False, "geolocation": False}
+BOTH_TOOLS = {"web_search": True, "geolocation": True}
+LONG_HISTORY = [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello"}] * 3
+
+
+@pytest.fixture(autouse=True)
+def no_queueing(monkeypatch):
+    class IdleLimiter:
+        def estimated_wait(self, tokens):
+            return 0.0
+
+    monkeypatch.setattr(model_router, "get_rate_limiter", lambda model: IdleLimiter())
+
+
+@pytest.mark.parametrize("prompt", [
+    "What's a good board for my trip?",
+    "Is a stiff board better vs a soft one?",
+    "Any tips for a budget snowboard?",
+])
+def test_one_planning_keyword_stays_on_the_fast_model(prompt):
+    assert complexity_score(prompt, NO_TOOLS) == (1, ["trip planning"])
+    assert route_turn(prompt, NO_TOOLS).model == FAST_RESPONSE_MODEL
+
+
+@pytest.mark.parametrize("tool_use, history", [(BOTH_TOOLS, None), (NO_TOOLS, LONG_HISTORY)])
+def test_planning_keyword_with_a_second_signal_uses_the_large_model(tool_use, history):
+    decision = route_turn("Plan a 5 day trip to Whistler", tool_use, history)
+    assert decision.model == LARGE_RESPONSE_MODEL
+    assert decision.score == 2
+
+
+def test_long_prompt_counts_as_a_signal():
+    prompt = "Plan my trip. " + "I like powder days and tree runs. " * 40
+    assert complexity_score(prompt, NO_TOOLS) == (2, ["trip planning", "long prompt"])
+    assert route_turn(prompt, NO_TOOLS).model == LARGE_RESPONSE_MODEL
@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from rate_limiter import ModelRateLimiter, RateLimitTimeout
+
+
+def test_cancelled_waiter_releases_its_place_in_the_queue():
+    limiter = ModelRateLimiter("test-model", rpm=60, tpm=1_000_000)
+    limiter.requests.level = 0  # drained: the next request refills in about a second
+
+    async def scenario():
+        waiter = asyncio.ensure_future(limiter.acquire_async(10, session_id="A", timeout=30))
+        await asyncio.sleep(0.05)
+        assert "A" in limiter._queues
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert not limiter._queues
+        # Session B is served once the bucket refills instead of queueing behind A's dead ticket
+        await limiter.acquire_async(10, session_id="B", timeout=5)
+
+    asyncio.run(scenario())
+    assert limiter.granted == 1
+
+
+def test_timed_out_waiter_releases_its_place_in_the_queue():
+    limiter = ModelRateLimiter("test-model", rpm=60, tpm=1_000_000)
+    limiter.requests.level = 0
+
+    async def scenario():
+        with pytest.raises(RateLimitTimeout):
+            await limiter.acquire_async(10, session_id="A", timeout=0.1)
+        assert not limiter._queues
+        await limiter.acquire_async(10, session_id="B", timeout=5)
+
+    asyncio.run(scenario())
+
+
+def test_sessions_are_served_round_robin():
+    limiter = ModelRateLimiter("test-model", rpm=1_000, tpm=1_000_000)
+    order = []
+
+    async def request(session_id):
+        await limiter.acquire_async(1, session_id=session_id, timeout=5)
+        order.append(session_id)
+
+    async def scenario():
+        limiter.requests.level = 0
+        await asyncio.gather(*(request(session_id) for session_id in ["A", "A", "A", "B"]))
+
+    asyncio.run(scenario())
+    assert order.index("B") <= 1
+
+
+def test_waiters_behind_the_head_sleep_until_it_is_served():
+    limiter = ModelRateLimiter("test-model", rpm=60, tpm=1_000_000)
+    limiter.requests.level = 0
+    polls = []
+    poll = limiter._poll
+    limiter._poll = lambda *args: polls.append(args[0]) or poll(*args)
+
+    async def scenario():
+        waiters = [
+            asyncio.ensure_future(limiter.acquire_async(1, session_id=session_id, timeout=30))
+            for session_id in "ABCD"
+        ]
+        await asyncio.sleep(0.5)
+        # One poll each on entry, and nobody has been woken since: no grant has happened
+        assert sorted(polls) == ["A", "B", "C", "D"]
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+
+    asyncio.run(scenario())
+    assert not limiter._queues and not limiter._waiters
+
+
+def test_settled_tokens_wake_the_head_early():
+    limiter = ModelRateLimiter("test-model", rpm=1_000, tpm=600)
+    limiter.tokens.level = 0  # 100 tokens would take 10 seconds to refill
+
+    async def scenario():
+        waiter = asyncio.ensure_future(limiter.acquire_async(100, session_id="A", timeout=30))
+        await asyncio.sleep(0.05)
+        limiter.settle(reserved_tokens=500, actual_tokens=0)
+        await asyncio.wait_for(waiter, 1)
+
+    asyncio.run(scenario())
+    assert limiter.granted == 1
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+import resort_catalog
+from resort_catalog import ResortCatalog
+
+CSV = """resort_name,latitude,longitude,region,country
+Vail,39.6433,-106.3781,Rocky Mountains,Colorado
+Whistler,50.1163,-122.9574,,British Columbia
+1080,45.0,-110.5,Rocky Mountains,
+"""
+
+
+@pytest.mark.parametrize("pandas_min_bytes", [0, 1 << 30], ids=["pandas", "csv"])
+def test_csv_and_pandas_readers_agree(tmp_path, monkeypatch, pandas_min_bytes):
+    path = tmp_path / "resorts.csv"
+    path.write_text(CSV, encoding="utf-8")
+    monkeypatch.setattr(resort_catalog, "CSV_PANDAS_MIN_BYTES", pandas_min_bytes)
+
+    catalog = ResortCatalog.from_csv(str(path))
+
+    assert list(catalog.names) == ["Vail", "Whistler", "1080"]
+    assert catalog.latitudes.dtype == np.float64
+    np.testing.assert_allclose(catalog.longitudes, [-106.3781, -122.9574, -110.5])
+    assert list(catalog.regions) == ["Rocky Mountains", "", "Rocky Mountains"]
+    assert list(catalog.countries) == ["Colorado", "British Columbia", ""]
+
+
+def test_missing_coordinate_column_is_rejected(tmp_path):
+    path = tmp_path / "resorts.csv"
+    path.write_text("resort_name,latitude\nVail,39.6\n", encoding="utf-8")
+    with pytest.raises(ValueError):
+        ResortCatalog.from_csv(str(path))
@@ -0,0 +1,132 @@
+import asyncio
+
+import groq
+import httpx
+import pytest
+
+import retry_policy
+from retry_policy import Deadline, DeadlineExceeded, LatencyTracker, RetryPolicy
+
+
+def _groq_error(error_type, status_code, headers=None):
+    request = httpx.Request("POST", "https://api.groq.com/openai/v1/chat/completions")
+    response = httpx.Response(status_code, headers=headers or {}, request=request)
+    return error_type(f"HTTP {status_code}", response=response, body=None)
+
+
+def _server_error():
+    return _groq_error(groq.InternalServerError, 500)
+
+
+def _rate_limited(retry_after):
+    return _groq_error(groq.RateLimitError, 429, {"retry-after": str(retry_after)})
+
+
+class FlakyCall:
+    """Raises the given errors in turn, then returns "ok"; records each attempt's timeout."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.timeouts = []
+
+    async def __call__(self, timeout):
+        self.timeouts.append(timeout)
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record the backoff delays instead of sleeping them."""
+    delays = []
+
+    async def fake_sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(retry_policy.asyncio, "sleep", fake_sleep)
+    return delays
+
+
+def test_backoff_is_full_jitter_capped_at_max_delay(monkeypatch):
+    monkeypatch.setattr(retry_policy.random, "uniform", lambda low, high: high)
+    policy = RetryPolicy(max_attempts=6, base_delay=0.5, max_delay=3.0)
+    assert [policy.backoff(attempt) for attempt in range(1, 5)] == [1.0, 2.0, 3.0, 3.0]
+    monkeypatch.setattr(retry_policy.random, "uniform", lambda low, high: low)
+    assert policy.backoff(3) == 0.0
+
+
+def test_transient_errors_are_retried_with_backoff(monkeypatch, sleeps):
+    monkeypatch.setattr(retry_policy.random, "uniform", lambda low, high: high)
+    call = FlakyCall(_server_error(), _server_error())
+    policy = RetryPolicy(max_attempts=3, base_delay=0.5, max_delay=8)
+
+    assert asyncio.run(policy.call_async(call)) == "ok"
+    assert sleeps == [1.0, 2.0]
+    assert call.timeouts == [None, None, None]
+
+
+def test_retry_after_takes_precedence_over_backoff(sleeps):
+    call = FlakyCall(_rate_limited(4))
+    assert asyncio.run(RetryPolicy(base_delay=0.01).call_async(call)) == "ok"
+    assert sleeps == [4.0]
+
+
+def test_rate_limit_longer_than_max_rate_limit_wait_is_raised(sleeps):
+    call = FlakyCall(_rate_limited(30))
+    with pytest.raises(groq.RateLimitError):
+        asyncio.run(RetryPolicy().call_async(call, max_rate_limit_wait=2))
+    assert sleeps == []
+
+
+def test_fatal_errors_are_not_retried(sleeps):
+    call = FlakyCall(_groq_error(groq.BadRequestError, 400), _server_error())
+    with pytest.raises(groq.BadRequestError):
+        asyncio.run(RetryPolicy().call_async(call))
+    assert len(call.timeouts) == 1
+
+
+def test_attempt_timeout_splits_the_deadline_across_remaining_attempts(monkeypatch, sleeps):
+    monkeypatch.setattr(retry_policy.random, "uniform", lambda low, high: 0.0)
+    call = FlakyCall(_server_error(), _server_error())
+    asyncio.run(RetryPolicy(max_attempts=3).call_async(call, deadline=Deadline(30)))
+
+    first, second, last = call.timeouts
+    assert first == pytest.approx(10, abs=0.1)
+    assert second == pytest.approx(15, abs=0.1)
+    assert last == pytest.approx(30, abs=0.1)
+
+
+def test_attempt_timeout_is_capped_at_the_read_timeout(monkeypatch):
+    monkeypatch.setattr(retry_policy, "GROQ_READ_TIMEOUT", 20)
+    policy = RetryPolicy(max_attempts=2)
+    assert policy.attempt_timeout(0, Deadline(600)) == 20
+    assert policy.attempt_timeout(0, None) is None
+
+
+def test_no_retry_that_would_end_past_the_deadline(sleeps):
+    call = FlakyCall(_rate_limited(60))
+    with pytest.raises(groq.RateLimitError):
+        asyncio.run(RetryPolicy().call_async(call, deadline=Deadline(5)))
+    assert sleeps == []
+
+
+def test_expired_deadline_raises_before_calling(sleeps):
+    call = FlakyCall()
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(RetryPolicy().call_async(call, deadline=Deadline(0)))
+    assert call.timeouts == []
+
+
+def test_stream_and_completion_latencies_are_tracked_separately(monkeypatch):
+    monkeypatch.setattr(retry_policy, "HEDGE_MIN_SAMPLES", 3)
+    tracker = LatencyTracker(window=10)
+    for seconds in (0.2, 0.3, 0.4):
+        tracker.record("model", seconds, stream=True)
+    for seconds in (4.0, 5.0, 6.0):
+        tracker.record("model", seconds)
+
+    assert tracker.percentile("model", 95, stream=True) == 0.4
+    assert tracker.percentile("model", 95) == 6.0
+    assert tracker.hedge_delay("model", stream=True) == retry_policy.HEDGE_MIN_DELAY_SECONDS
+    assert tracker.hedge_delay("model") == 6.0
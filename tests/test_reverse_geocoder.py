@@ -0,0 +1,32 @@
+import queue
+from types import SimpleNamespace
+
+import pytest
+
+import reverse_geocoder
+
+
+@pytest.fixture
+def worker(monkeypatch):
+    """A fresh Nominatim worker and queue, with no throttle between lookups."""
+    monkeypatch.setattr(reverse_geocoder, "_worker", None)
+    monkeypatch.setattr(reverse_geocoder, "_requests", queue.Queue())
+    monkeypatch.setattr(reverse_geocoder, "NOMINATIM_MIN_INTERVAL_SECONDS", 0.0)
+    return monkeypatch
+
+
+def test_worker_survives_a_geolocator_that_fails_to_load(worker):
+    def broken_geolocator():
+        raise ImportError("No module named 'geopy'")
+
+    worker.setattr(reverse_geocoder, "_make_geolocator", broken_geolocator)
+    first = reverse_geocoder.request_reverse_geocode(-12.345, 67.891)
+    with pytest.raises(ImportError):
+        first.result(timeout=5)
+    assert not reverse_geocoder._pending
+
+    address = SimpleNamespace(address="Somewhere, Indian Ocean")
+    worker.setattr(reverse_geocoder, "_make_geolocator",
+                   lambda: SimpleNamespace(reverse=lambda key: address))
+    second = reverse_geocoder.request_reverse_geocode(-12.346, 67.892)
+    assert second.result(timeout=5) == "Somewhere, Indian Ocean"
@@ -0,0 +1,72 @@
+import pytest
+
+from semantic_cache import SemanticCache, conflict, content_words
+
+ANSWER = "cached answer"
+
+# Rewordings of the same question: served from the cache
+SAME_QUESTION = [
+    ("How do I wax my snowboard at home?", "how can I wax my snowboard at home"),
+    ("What is the difference between camber and rocker?", "What's the difference between camber and rocker"),
+    ("best beginner board", "what is the best board for a beginner"),
+    ("best beginner snowboard", "best snowboard for beginners"),
+    ("tips for riding powder", "powder riding tips"),
+    ("good snowboard boots for wide feet", "snowboard boots for wide feet"),
+    ("How do I choose a snowboard for my height?", "how to choose snowboard for height"),
+]
+
+# Close in wording, different in meaning: embeddings score these above the threshold,
+# conflict() must keep them apart
+DIFFERENT_QUESTION = [
+    ("Is camber better than rocker for beginners?", "Is rocker better than camber for beginners?"),
+    ("Should I wax my snowboard before every trip?", "Should I not wax my snowboard before every trip?"),
+    ("Should I wax my snowboard before every trip?", "Shouldn't I wax my snowboard before every trip?"),
+    (
+        "Recommended binding angles and stance width for a regular rider on an all mountain snowboard",
+        "Recommended binding angles and stance width for a goofy rider on an all mountain snowboard",
+    ),
+    ("Can I learn to snowboard with rental boots?", "Can I learn to snowboard without rental boots?"),
+    ("What size snowboard should I get?", "What size snowboard boots should I get?"),
+]
+
+
+def _cache_with(prompt):
+    cache = SemanticCache(max_entries=16)
+    cache.set(prompt, ANSWER)
+    return cache
+
+
+@pytest.mark.parametrize("stored, asked", SAME_QUESTION)
+def test_rewording_of_the_same_question_hits(stored, asked):
+    cache = _cache_with(stored)
+    hit = cache.get(asked)
+    assert hit is not None and hit[0] == ANSWER
+
+
+@pytest.mark.parametrize("stored, asked", DIFFERENT_QUESTION)
+def test_similar_wording_with_a_different_meaning_misses(stored, asked):
+    cache = _cache_with(stored)
+    vectorizer = cache.vectorizer
+    assert vectorizer.transform(stored) @ vectorizer.transform(asked) >= cache.threshold
+    assert cache.get(asked) is None
+    assert cache.get(stored) == (ANSWER, pytest.approx(1.0, abs=1e-5))
+
+
+def test_rejections_are_counted_only_above_the_threshold():
+    cache = _cache_with("Is camber better than rocker for beginners?")
+    cache.get("Is rocker better than camber for beginners?")
+    cache.get("Where can I buy lift tickets?")
+    stats = cache.stats()
+    assert stats["misses"] == 2
+    assert stats["rejected"] == 1
+
+
+@pytest.mark.parametrize("text, other, reason", [
+    ("Shouldn't I wax it?", "Should I wax it?", "negation"),
+    ("camber vs rocker", "rocker vs camber", "swapped comparison"),
+    ("binding angles for regular", "binding angles for goofy", "contrasting term"),
+    ("Shouldn't I wax it?", "Should I not wax it?", None),
+    ("best boards for beginners", "best board for a beginner", None),
+])
+def test_conflict(text, other, reason):
+    assert conflict(content_words(text), content_words(other)) == reason
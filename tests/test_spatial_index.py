@@ -0,0 +1,107 @@
+import numpy as np
+import pytest
+
+import geolocation_tool
+import spatial_index
+from assistant_engine import format_location_context
+from resort_catalog import ResortCatalog
+from spatial_index import BRUTE_FORCE_MAX_POINTS, ResortIndex
+
+REGIONS = ["Rockies", "Alps", "Cascades", "Western US - Pacific Northwest"]
+COUNTRIES = ["Colorado", "Utah", "France", "Quebec "]
+# Filters as a caller passes them: any case, stray whitespace
+FILTERS = [(None, None), ("alps", None), (None, "quebec"), ("Rockies", " Colorado")]
+
+
+@pytest.fixture(scope="module")
+def catalog():
+    # Well above BRUTE_FORCE_MAX_POINTS so the tree walk, not the flat scan, is tested
+    size = 4 * BRUTE_FORCE_MAX_POINTS
+    rng = np.random.default_rng(11)
+    return ResortCatalog(
+        names=[f"Resort {i}" for i in range(size)],
+        latitudes=np.degrees(np.arcsin(rng.uniform(-1, 1, size))),
+        longitudes=rng.uniform(-180, 180, size),
+        regions=rng.choice(REGIONS, size),
+        countries=rng.choice(COUNTRIES, size),
+    )
+
+
+def _brute_force(catalog, lat, lon, region, country):
+    """Every resort matching the filters as [(name, miles)], closest first."""
+    selected = np.ones(len(catalog), dtype=bool)
+    if region:
+        selected &= np.array([r.strip().lower() == region.strip().lower() for r in catalog.regions])
+    if country:
+        selected &= np.array([c.strip().lower() == country.strip().lower() for c in catalog.countries])
+    positions = np.flatnonzero(selected)
+    miles = catalog.distances_miles(lat, lon, positions)
+    order = np.argsort(miles, kind="stable")
+    return [(catalog.names[positions[i]], float(miles[i])) for i in order]
+
+
+def _queries(count=25, seed=3):
+    rng = np.random.default_rng(seed)
+    return zip(np.degrees(np.arcsin(rng.uniform(-1, 1, count))), rng.uniform(-180, 180, count))
+
+
+@pytest.mark.parametrize("region, country", FILTERS)
+def test_nearest_matches_brute_force(catalog, region, country):
+    index = ResortIndex(catalog, leaf_size=16)
+    for lat, lon in _queries():
+        expected = _brute_force(catalog, lat, lon, region, country)[:7]
+        found = index.nearest(lat, lon, k=7, region=region, country=country)
+        np.testing.assert_allclose([miles for _, miles in found], [miles for _, miles in expected], rtol=1e-9)
+        assert {name for name, _ in found} == {name for name, _ in expected}
+
+
+@pytest.mark.parametrize("region, country", FILTERS)
+@pytest.mark.parametrize("radius", [50.0, 400.0, 2500.0])
+def test_within_radius_matches_brute_force(catalog, region, country, radius):
+    index = ResortIndex(catalog, leaf_size=16)
+    for lat, lon in _queries():
+        expected = [(name, miles) for name, miles in _brute_force(catalog, lat, lon, region, country) if miles <= radius]
+        found = index.within_radius(lat, lon, radius, region=region, country=country)
+        assert [name for name, _ in found] == [name for name, _ in expected]
+
+
+def test_named_filters_finds_regions_and_countries(catalog):
+    index = ResortIndex(catalog)
+    assert index.named_filters("Best resorts in utah this week?") == (None, "Utah")
+    assert index.named_filters("Anything good in the Pacific Northwest") == ("Western US - Pacific Northwest", None)
+    assert index.named_filters("Somewhere in Quebec") == (None, "Quebec")
+    assert index.named_filters("Where should I ride?") == (None, None)
+
+
+DENVER = {"address": "Denver, Colorado, United States", "coordinates": (39.7392, -104.9903)}
+
+
+@pytest.fixture
+def bundled_index(monkeypatch):
+    monkeypatch.setattr(spatial_index, "_index", ResortIndex(ResortCatalog.from_csv()))
+
+
+def test_tool_answers_radius_and_state_requests(bundled_index):
+    result = geolocation_tool.resort_proximity_info(DENVER, "Which resorts are within 80 miles of me?")
+    assert result["scope"] == "within 80 miles"
+    assert result["closest_resorts"] and all(miles <= 80 for miles in result["closest_resorts"].values())
+
+    result = geolocation_tool.resort_proximity_info(DENVER, "What are the closest resorts in Utah?")
+    assert result["scope"] == "in Utah"
+    assert len(result["closest_resorts"]) == geolocation_tool.CLOSEST_RESORTS_COUNT
+    utah = set(geolocation_tool.get_resort_index().nearest(*DENVER["coordinates"], k=1000, country="Utah"))
+    assert set(result["closest_resorts"].items()) <= utah
+
+
+def test_tool_without_filters_lists_the_closest_resorts(bundled_index):
+    result = geolocation_tool.resort_proximity_info(DENVER, "Any powder nearby?")
+    assert "scope" not in result
+    assert list(result["closest_resorts"].items()) == geolocation_tool.get_resort_index().nearest(
+        *DENVER["coordinates"], k=geolocation_tool.CLOSEST_RESORTS_COUNT
+    )
+
+
+def test_empty_radius_result_is_spelled_out(bundled_index):
+    result = geolocation_tool.resort_proximity_info(DENVER, "anything within 5 miles?")
+    assert result["closest_resorts"] == {}
+    assert "(resorts within 5 miles)\n- none" in format_location_context(result)